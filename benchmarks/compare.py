@@ -0,0 +1,41 @@
+"""Compare two benchmark results written by `run.py`."""
+import json
+
+import click
+
+
+@click.command()
+@click.argument("baseline", type=click.File())
+@click.argument("contender", type=click.File())
+@click.option(
+    "-t",
+    "--threshold",
+    type=float,
+    default=0.1,
+    show_default=True,
+    help="Relative change which is highlighted.",
+)
+def main(baseline, contender, threshold):
+    """Print the speedup of CONTENDER relative to BASELINE per corpus and stage."""
+    baseline = json.load(baseline)
+    contender = json.load(contender)
+    before = {(r["corpus"], r["stage"]): r for r in baseline["results"]}
+
+    click.echo(f"baseline:  {baseline['revision']}")
+    click.echo(f"contender: {contender['revision']}")
+    for result in contender["results"]:
+        key = (result["corpus"], result["stage"])
+        if key not in before:
+            continue
+        speedup = before[key]["seconds"] / result["seconds"]
+        line = f"{key[0]:>24} {key[1]:>8}: {speedup:6.2f}x"
+        if before[key]["peak_memory_bytes"] and result["peak_memory_bytes"]:
+            memory = result["peak_memory_bytes"] / before[key]["peak_memory_bytes"]
+            line += f"  memory {memory:6.2f}x"
+        if abs(speedup - 1) > threshold:
+            line = click.style(line, fg="green" if speedup > 1 else "red")
+        click.echo(line)
+
+
+if __name__ == "__main__":
+    main()
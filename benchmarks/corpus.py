@@ -0,0 +1,141 @@
+"""Deterministic synthetic GRIB corpora for benchmarking gribscan.
+
+Each corpus is a single GRIB file generated from eccodes samples. Files
+contain junk bytes between some messages and a few truncated (broken)
+messages to exercise `find_stream`. The same `scale` and `seed` always
+produce byte-identical files.
+"""
+import pathlib
+
+import click
+import eccodes
+import numpy as np
+
+
+SCALES = {
+    "small": {"steps": 2, "levels": 3, "params": 2, "members": 2, "resolution": 0},
+    "medium": {"steps": 12, "levels": 10, "params": 4, "members": 3, "resolution": 1},
+    "large": {"steps": 48, "levels": 20, "params": 4, "members": 5, "resolution": 2},
+}
+
+PARAMS = [130, 131, 132, 157]  # t, u, v, r
+LEVELS = [1000, 925, 850, 700, 600, 500, 400, 300, 250, 200,
+          150, 100, 70, 50, 30, 20, 10, 7, 5, 3]
+
+
+def _regular_ll(sample, resolution):
+    def setup(h):
+        n = [1, 4, 10][resolution]
+        eccodes.codes_set(h, "Ni", 36 * n)
+        eccodes.codes_set(h, "Nj", 18 * n + 1)
+        eccodes.codes_set(h, "iDirectionIncrementInDegrees", 10 / n)
+        eccodes.codes_set(h, "jDirectionIncrementInDegrees", 10 / n)
+        eccodes.codes_set(h, "latitudeOfFirstGridPointInDegrees", 90.0)
+        eccodes.codes_set(h, "longitudeOfFirstGridPointInDegrees", 0.0)
+        eccodes.codes_set(h, "latitudeOfLastGridPointInDegrees", -90.0)
+        eccodes.codes_set(h, "longitudeOfLastGridPointInDegrees", 360 - 10 / n)
+        eccodes.codes_set_values(h, np.zeros(36 * n * (18 * n + 1)))
+
+    return sample, setup
+
+
+def _reduced_gg(resolution):
+    sample = "reduced_gg_pl_640_grib2" if resolution == 2 else "reduced_gg_pl_32_grib2"
+    return sample, lambda h: None
+
+
+def _healpix(resolution):
+    def setup(h):
+        eccodes.codes_set(h, "gridDefinitionTemplateNumber", 150)
+        eccodes.codes_set(h, "Nside", [16, 64, 256][resolution])
+        eccodes.codes_set(h, "orderingConvention", "nested")
+        eccodes.codes_set(h, "typeOfFirstFixedSurface", 100)
+        eccodes.codes_set_values(h, np.zeros(12 * eccodes.codes_get(h, "Nside") ** 2))
+
+    return "GRIB2", setup
+
+
+GRIDS = {
+    "grib1_regular_ll": lambda r: _regular_ll("regular_ll_pl_grib1", r),
+    "grib2_regular_ll": lambda r: _regular_ll("regular_ll_pl_grib2", r),
+    "grib2_reduced_gg": _reduced_gg,
+    "grib2_healpix": _healpix,
+    "grib2_ensemble": lambda r: _regular_ll("regular_ll_pl_grib2", r),
+}
+
+
+def _template(grid, resolution):
+    sample, setup = GRIDS[grid](resolution)
+    h = eccodes.codes_grib_new_from_samples(sample)
+    setup(h)
+    if grid == "grib2_ensemble":
+        eccodes.codes_set(h, "productDefinitionTemplateNumber", 1)
+        eccodes.codes_set(h, "numberOfForecastsInEnsemble", 50)
+    return h
+
+
+def messages(grid, scale="small", seed=0):
+    """Yield the encoded messages of a corpus."""
+    spec = SCALES[scale]
+    rng = np.random.default_rng(seed)
+    template = _template(grid, spec["resolution"])
+    npoints = eccodes.codes_get_size(template, "values")
+    field = rng.normal(size=npoints).cumsum()
+    members = range(1, spec["members"] + 1) if grid == "grib2_ensemble" else [None]
+
+    try:
+        for step in range(spec["steps"]):
+            for member in members:
+                for level in LEVELS[: spec["levels"]]:
+                    for param in PARAMS[: spec["params"]]:
+                        h = eccodes.codes_clone(template)
+                        eccodes.codes_set(h, "step", step)
+                        eccodes.codes_set(h, "level", level)
+                        eccodes.codes_set(h, "paramId", param)
+                        if member is not None:
+                            eccodes.codes_set(h, "number", member)
+                        eccodes.codes_set_values(
+                            h, field + param + level / 100 + step
+                        )
+                        yield eccodes.codes_get_message(h)
+                        eccodes.codes_release(h)
+    finally:
+        eccodes.codes_release(template)
+
+
+def write_corpus(path, grid, scale="small", seed=0, junk_every=7, broken_every=11):
+    """Write a corpus to `path`, returns the number of valid messages.
+
+    Every `junk_every`th message is preceded by some random bytes, every
+    `broken_every`th message is truncated and followed by a valid one.
+    """
+    rng = np.random.default_rng(seed + 1)
+    count = 0
+    with open(path, "wb") as f:
+        for i, message in enumerate(messages(grid, scale, seed)):
+            if junk_every and i % junk_every == junk_every - 1:
+                f.write(rng.integers(0, 256, rng.integers(1, 512), np.uint8).tobytes())
+            if broken_every and i % broken_every == broken_every - 1:
+                f.write(message[: len(message) // 2])
+            f.write(message)
+            count += 1
+    return count
+
+
+@click.command()
+@click.argument("outdir", type=click.Path(file_okay=False))
+@click.option("-s", "--scale", type=click.Choice(SCALES), default="small")
+@click.option("-g", "--grid", "grids", multiple=True, type=click.Choice(GRIDS))
+@click.option("--seed", type=int, default=0, show_default=True)
+def main(outdir, scale, grids, seed):
+    """Generate synthetic GRIB files in OUTDIR."""
+    outdir = pathlib.Path(outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+    for grid in grids or GRIDS:
+        path = outdir / f"{grid}_{scale}.grib"
+        count = write_corpus(path, grid, scale, seed)
+        click.echo(f"{path}: {count} messages, {path.stat().st_size} bytes")
+
+
+if __name__ == "__main__":
+    main()
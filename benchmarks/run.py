@@ -0,0 +1,151 @@
+"""Time the gribscan pipeline on synthetic corpora.
+
+Stages:
+
+* `index`: `write_index` (splitting the file and scanning the messages)
+* `parse`: `parse_index` of the resulting index file
+* `build`: `grib_magic` from the index file to references
+* `decode`: `RawGribCodec.decode` of every message
+
+The results are written as JSON, such that runs of different commits can be
+compared using `compare.py`.
+"""
+import json
+import pathlib
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import click
+import eccodes
+
+import gribscan
+from gribscan.magician import EnsembleMagician, IFSMagician
+from gribscan.rawgribcodec import RawGribCodec
+
+from corpus import GRIDS, SCALES, write_corpus
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=pathlib.Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _measure(func, repeat, memory):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    peak = None
+    if memory:
+        # separate run, tracing slows down the execution
+        tracemalloc.start()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return min(times), peak
+
+
+def _stages(gribfile, indexfile, magician):
+    def index():
+        gribscan.write_index(str(gribfile), indexfile, force=True)
+
+    def parse():
+        gribscan.parse_index(indexfile, magician.m2key)
+
+    def build():
+        gribscan.grib_magic([indexfile], magician)
+
+    def decode():
+        codec = RawGribCodec()
+        with open(gribfile, "rb") as f:
+            for record in gribscan.iter_index(indexfile):
+                f.seek(record["_offset"])
+                codec.decode(f.read(record["_length"]))
+
+    return {"index": index, "parse": parse, "build": build, "decode": decode}
+
+
+@click.command()
+@click.option("-s", "--scale", "scales", multiple=True, type=click.Choice(SCALES))
+@click.option("-g", "--grid", "grids", multiple=True, type=click.Choice(GRIDS))
+@click.option("-r", "--repeat", type=int, default=3, show_default=True)
+@click.option("--memory/--no-memory", default=True, help="Measure peak memory.")
+@click.option("-o", "--output", type=click.File("w"), default="-")
+@click.option(
+    "--workdir",
+    type=click.Path(file_okay=False),
+    help="Directory for the corpora (kept between runs), default: temporary.",
+)
+def main(scales, grids, repeat, memory, output, workdir):
+    """Benchmark indexing, parsing, building and decoding."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        workdir = pathlib.Path(workdir or tmpdir)
+        workdir.mkdir(parents=True, exist_ok=True)
+
+        results = []
+        for scale in scales or ["small"]:
+            for grid in grids or GRIDS:
+                gribfile = workdir / f"{grid}_{scale}.grib"
+                indexfile = workdir / f"{grid}_{scale}.index"
+                if not gribfile.exists():
+                    write_corpus(gribfile, grid, scale)
+                nbytes = gribfile.stat().st_size
+
+                magician = EnsembleMagician() if "ensemble" in grid else IFSMagician()
+                timings = {
+                    stage: _measure(func, repeat, memory)
+                    for stage, func in _stages(gribfile, indexfile, magician).items()
+                }
+                with open(indexfile) as f:
+                    messages = sum(1 for _ in f)
+
+                for stage, (seconds, peak) in timings.items():
+                    results.append(
+                        {
+                            "corpus": gribfile.stem,
+                            "stage": stage,
+                            "messages": messages,
+                            "bytes": nbytes,
+                            "seconds": seconds,
+                            "messages_per_second": messages / seconds,
+                            "megabytes_per_second": nbytes / seconds / 1e6,
+                            "peak_memory_bytes": peak,
+                        }
+                    )
+                    click.echo(
+                        f"{gribfile.stem:>24} {stage:>8}: {seconds:9.4f}s "
+                        f"{messages / seconds:10.1f} msg/s",
+                        err=True,
+                    )
+
+    json.dump(
+        {
+            "revision": _git_revision(),
+            "gribscan": gribscan.__version__,
+            "eccodes": eccodes.codes_get_api_version(),
+            "python": sys.version.split()[0],
+            "machine": platform.machine(),
+            "results": results,
+        },
+        output,
+        indent=2,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""Cache for decoded GRIB messages.
+
+Reading the same GRIB fields over and over (e.g. when re-rendering the latest
+forecast) requires to read and decode the messages again on every access.
+The `CachingStore` wraps the references created by `grib_magic` into a zarr
+store, which keeps decoded messages in a `ChunkCache`:
+
+>>> cache = ChunkCache(cache_dir="~/.cache/gribscan")
+>>> ds = xr.open_zarr(CachingStore("dataset.json", cache), consolidated=False)
+
+Cached messages are identified by filename, offset, length and a fingerprint
+of the file (size and modification time), so changed files are re-read. The
+fingerprint is checked again when it is older than `fingerprint_ttl` seconds.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import pathlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import fsspec
+import numcodecs
+import numpy as np
+from zarr.storage import FsspecStore, WrapperStore
+
+from .rawgribcodec import RawGribCodec
+
+import logging
+
+logger = logging.getLogger("gribscan")
+
+
+class ChunkCache:
+    """Two-level LRU cache for decoded messages.
+
+    Decoded messages are kept in memory up to a size of `maxsize` bytes. If
+    `cache_dir` is given, they are additionally stored (compressed) on disk,
+    where the least recently used entries are removed once the cache grows
+    beyond `disk_budget` bytes. The disk cache may be shared by multiple
+    processes.
+    """
+
+    def __init__(
+        self,
+        maxsize=512 * 2**20,
+        cache_dir=None,
+        disk_budget=16 * 2**30,
+        compressor=None,
+    ):
+        self.maxsize = maxsize
+        self.disk_budget = disk_budget
+        self.compressor = compressor or numcodecs.Blosc("zstd", clevel=1)
+
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._lock = threading.Lock()
+
+        if cache_dir is None:
+            self.cache_dir = None
+        else:
+            self.cache_dir = pathlib.Path(cache_dir).expanduser()
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_size = sum(size for _, size, _ in self._disk_entries())
+
+    @staticmethod
+    def key(filename, offset, length, fingerprint=""):
+        return hashlib.sha256(
+            f"{filename}\0{offset}\0{length}\0{fingerprint}".encode()
+        ).hexdigest()
+
+    def get(self, key):
+        """Return the cached data for `key` or `None`."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        if self.cache_dir is None:
+            return None
+
+        path = self.cache_dir / key
+        try:
+            with open(path, "rb") as f:
+                data = bytes(self.compressor.decode(f.read()))
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+
+        self._put_memory(key, data)
+        return data
+
+    def put(self, key, data):
+        """Add `data` (bytes) to the cache."""
+        self._put_memory(key, data)
+
+        if self.cache_dir is None:
+            return
+
+        compressed = self.compressor.encode(data)
+        tmp = self.cache_dir / f".{key}.{uuid.uuid4().hex}"
+        with open(tmp, "wb") as f:
+            f.write(compressed)
+
+        path = self.cache_dir / key
+        with self._lock:
+            try:
+                replaced = path.stat().st_size
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(tmp, path)
+            self._disk_size += len(compressed) - replaced
+            if self._disk_size > self.disk_budget:
+                self._evict_disk()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+            if self.cache_dir is not None:
+                for path, _, _ in self._disk_entries():
+                    path.unlink(missing_ok=True)
+                self._disk_size = 0
+
+    def _put_memory(self, key, data):
+        if len(data) > self.maxsize:
+            return
+        with self._lock:
+            if key in self._memory:
+                self._memory_size -= len(self._memory.pop(key))
+            self._memory[key] = data
+            self._memory_size += len(data)
+            while self._memory_size > self.maxsize:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_size -= len(evicted)
+
+    def _disk_entries(self):
+        for path in self.cache_dir.iterdir():
+            if path.name.startswith("."):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:  # removed by another process
+                continue
+            yield path, stat.st_size, stat.st_mtime
+
+    def _evict_disk(self):
+        # other processes may share the directory, so look at the actual state
+        entries = sorted(self._disk_entries(), key=lambda entry: entry[2])
+        self._disk_size = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if self._disk_size <= self.disk_budget:
+                break
+            path.unlink(missing_ok=True)
+            self._disk_size -= size
+
+
+def _decoded_meta(meta):
+    return {**meta, "compressor": None}
+
+
+def _is_rawgrib(meta):
+    return (meta.get("compressor") or {}).get("id") in ("gribscan.rawgrib", "rawgrib")
+
+
+class CachingStore(WrapperStore):
+    """Read-only zarr store serving decoded GRIB messages through a `ChunkCache`.
+
+    `refs` are the references of a single dataset as returned by `grib_magic`
+    or the path to a JSON file containing them. Arrays which are stored as
+    GRIB messages are presented as uncompressed arrays, the decoding is done
+    by the store and its result is cached. The fingerprints of the referenced
+    files are reused for `fingerprint_ttl` seconds, with 0, files are checked
+    on every read.
+    """
+
+    def __init__(self, refs, cache=None, store=None, fingerprint_ttl=1.0):
+        if not isinstance(refs, dict):
+            with fsspec.open(refs, "r") as f:
+                refs = json.load(f)
+        if store is None:
+            fs = fsspec.filesystem("reference", fo=refs)
+            store = FsspecStore.from_mapper(fs.get_mapper(), read_only=True)
+        super().__init__(store)
+
+        self.refs = refs
+        self.cache = ChunkCache() if cache is None else cache
+        self.fingerprint_ttl = fingerprint_ttl
+        self._arrays = {
+            key[: -len("/.zarray")]: meta
+            for key, value in refs.items()
+            if key.endswith("/.zarray") and _is_rawgrib(meta := json.loads(value))
+        }
+        self._fingerprints = {}
+        self._codec = RawGribCodec()
+
+    def _with_store(self, store):
+        return type(self)(self.refs, self.cache, store, self.fingerprint_ttl)
+
+    def _fingerprint(self, filename):
+        checked, fingerprint = self._fingerprints.get(filename, (None, None))
+        now = time.monotonic()
+        if checked is None or now - checked >= self.fingerprint_ttl:
+            fs, path = fsspec.core.url_to_fs(filename)
+            info = fs.info(path)
+            fingerprint = json.dumps(
+                [info.get(k) for k in ("size", "mtime", "ETag", "LastModified")],
+                default=str,
+            )
+            self._fingerprints[filename] = (now, fingerprint)
+        return fingerprint
+
+    def _decode(self, buf, dtype):
+        return np.asarray(self._codec.decode(buf), dtype=dtype).tobytes()
+
+    async def get(self, key, prototype, byte_range=None):
+        array, _, chunk = key.rpartition("/")
+
+        if array in self._arrays and chunk == ".zarray":
+            meta = _decoded_meta(self._arrays[array])
+            return prototype.buffer.from_bytes(json.dumps(meta).encode())
+
+        if key == ".zmetadata" and key in self.refs:
+            zmetadata = json.loads(self.refs[key])
+            for name, meta in self._arrays.items():
+                zmetadata["metadata"][f"{name}/.zarray"] = _decoded_meta(meta)
+            return prototype.buffer.from_bytes(json.dumps(zmetadata).encode())
+
+        ref = self.refs.get(key)
+        if array not in self._arrays or not isinstance(ref, list) or len(ref) != 3:
+            return await self._store.get(key, prototype, byte_range)
+
+        if byte_range is not None:
+            raise NotImplementedError("partial reads of decoded GRIB messages")
+
+        filename, offset, length = ref
+        fingerprint = await asyncio.to_thread(self._fingerprint, filename)
+        cache_key = ChunkCache.key(filename, offset, length, fingerprint)
+
+        if (data := await asyncio.to_thread(self.cache.get, cache_key)) is None:
+            buf = await self._store.get(key, prototype)
+            if buf is None:
+                return None
+            data = await asyncio.to_thread(
+                self._decode, buf.to_bytes(), self._arrays[array]["dtype"]
+            )
+            await asyncio.to_thread(self.cache.put, cache_key, data)
+
+        return prototype.buffer.from_bytes(data)
@@ -0,0 +1,272 @@
+"""SQLite-backed catalogue of GRIB index records.
+
+A catalogue collects the records of many index files in a single SQLite
+database. The most common selection keys are stored in dedicated, indexed
+columns, such that filters can be evaluated by SQLite before any JSON record
+is decoded.
+"""
+import json
+import os
+import pathlib
+import re
+import sqlite3
+
+import logging
+
+logger = logging.getLogger("gribscan")
+
+
+# Columns which are extracted from each record and may be used in filters.
+# The type is used to coerce filter values (e.g. `date` is stored as text).
+CATALOG_COLUMNS = {
+    "filename": str,
+    "param": str,
+    "levtype": str,
+    "level": float,
+    "date": str,
+    "posix_time": float,
+    "member": int,
+}
+
+SQLITE_MAGIC = b"SQLite format 3\x00"
+
+_OPERATORS = {
+    "=": "=",
+    "==": "=",
+    "!=": "!=",
+    "<": "<",
+    "<=": "<=",
+    ">": ">",
+    ">=": ">=",
+    "in": "IN",
+}
+
+_TERM_RE = re.compile(r"^\s*(\w+)\s*(==|!=|<=|>=|=|<|>)\s*(.+?)\s*$")
+
+
+def is_catalog(path):
+    """Check if `path` points to a gribscan catalogue (i.e. an SQLite database)."""
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(SQLITE_MAGIC)) == SQLITE_MAGIC
+    except (FileNotFoundError, IsADirectoryError):
+        return False
+
+
+def _coerce(key, value):
+    if value is None:
+        return None
+    return CATALOG_COLUMNS[key](value)
+
+
+def _parse_value(value):
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError:
+        return value
+
+
+def parse_filter(expr):
+    """Parse a filter expression into a list of `(key, op, value)` conditions.
+
+    The expression may either be a string of whitespace separated terms like
+
+    >>> parse_filter("param=t,u levtype=isobaricInhPa posix_time>=1600000000")
+    [('param', 'in', ['t', 'u']), ('levtype', '=', 'isobaricInhPa'), ('posix_time', '>=', 1600000000.0)]
+
+    or a dict mapping keys to a single value (equality) or a list of values.
+    Only keys listed in `CATALOG_COLUMNS` can be filtered on.
+    """
+    if expr is None:
+        return []
+
+    if isinstance(expr, dict):
+        terms = [
+            (k, "in", list(v)) if isinstance(v, (list, tuple, set)) else (k, "=", v)
+            for k, v in expr.items()
+        ]
+    else:
+        terms = []
+        for term in expr.split():
+            match = _TERM_RE.match(term)
+            if match is None:
+                raise ValueError(f"invalid filter term: {term!r}")
+            key, op, value = match.groups()
+            if op in ("=", "==") and "," in value:
+                terms.append((key, "in", [_parse_value(v) for v in value.split(",")]))
+            else:
+                terms.append((key, op, _parse_value(value)))
+
+    conditions = []
+    for key, op, value in terms:
+        if key not in CATALOG_COLUMNS:
+            raise ValueError(
+                f"can't filter on {key!r}, valid keys are {list(CATALOG_COLUMNS)}"
+            )
+        if op == "in":
+            value = [_coerce(key, v) for v in value]
+        else:
+            value = _coerce(key, value)
+        conditions.append((key, op, value))
+
+    return conditions
+
+
+def _compare(a, op, b):
+    if op in ("=", "=="):
+        return a == b
+    if op == "!=":
+        return a != b
+    if a is None or b is None:
+        return False
+    if op == "<":
+        return a < b
+    if op == "<=":
+        return a <= b
+    if op == ">":
+        return a > b
+    if op == ">=":
+        return a >= b
+    raise ValueError(f"unknown operator {op!r}")
+
+
+def match_filter(meta, conditions):
+    """Check if an index record satisfies all parsed filter `conditions`."""
+    for key, op, value in conditions:
+        v = _coerce(key, meta.get(key))
+        if op == "in":
+            if v not in value:
+                return False
+        elif not _compare(v, op, value):
+            return False
+    return True
+
+
+def _record_to_row(file_id, line):
+    meta = json.loads(line)
+    return (file_id, *(_coerce(k, meta.get(k)) for k in CATALOG_COLUMNS), line)
+
+
+def _conditions_to_sql(conditions):
+    clauses = []
+    params = []
+    # like `match_filter`, missing values (NULL) match `!=` and `None` in lists
+    for key, op, value in conditions:
+        if op == "in":
+            values = [v for v in value if v is not None]
+            clause = f"{key} IN ({', '.join('?' * len(values))})"
+            if len(values) < len(value):
+                clause = f"({clause} OR {key} IS NULL)"
+            clauses.append(clause)
+            params.extend(values)
+        elif value is None and op in ("=", "=="):
+            clauses.append(f"{key} IS NULL")
+        elif value is None and op == "!=":
+            clauses.append(f"{key} IS NOT NULL")
+        elif op == "!=":
+            clauses.append(f"{key} IS NOT ?")
+            params.append(value)
+        else:
+            clauses.append(f"{key} {_OPERATORS[op]} ?")
+            params.append(value)
+    where = " AND ".join(clauses) if clauses else "1"
+    return where, params
+
+
+class Catalog:
+    """A queryable collection of index records stored in an SQLite database.
+
+    Example:
+
+    >>> with Catalog("archive.sqlite") as cat:
+    ...     cat.ingest("a.index")
+    ...     records = list(cat.query("param=t level>=500"))
+    """
+
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self.conn = sqlite3.connect(self.path)
+        self._create_tables()
+
+    def _create_tables(self):
+        columns = ", ".join(CATALOG_COLUMNS)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS indexfiles ("
+                "id INTEGER PRIMARY KEY, path TEXT UNIQUE, mtime REAL)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                f"indexfile INTEGER, {columns}, record TEXT)"
+            )
+            for column in ("indexfile", *CATALOG_COLUMNS):
+                self.conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS messages_{column} "
+                    f"ON messages ({column})"
+                )
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def ingest(self, indexfile, force=False):
+        """Add all records of `indexfile` to the catalogue.
+
+        Index files which have already been ingested are skipped unless they
+        have been modified since or `force` is set, in which case their
+        previous records are replaced.
+        """
+        path = os.path.abspath(indexfile)
+        mtime = os.stat(path).st_mtime
+
+        row = self.conn.execute(
+            "SELECT id, mtime FROM indexfiles WHERE path = ?", (path,)
+        ).fetchone()
+        if row is not None and row[1] == mtime and not force:
+            logger.debug(f"{indexfile} is already part of the catalogue")
+            return
+
+        with self.conn:
+            if row is not None:
+                self.conn.execute("DELETE FROM messages WHERE indexfile = ?", (row[0],))
+                self.conn.execute(
+                    "UPDATE indexfiles SET mtime = ? WHERE id = ?", (mtime, row[0])
+                )
+                file_id = row[0]
+            else:
+                file_id = self.conn.execute(
+                    "INSERT INTO indexfiles (path, mtime) VALUES (?, ?)", (path, mtime)
+                ).lastrowid
+
+            placeholders = ", ".join("?" * (len(CATALOG_COLUMNS) + 2))
+            with open(indexfile, "r") as f:
+                self.conn.executemany(
+                    f"INSERT INTO messages VALUES ({placeholders})",
+                    (_record_to_row(file_id, line) for line in f),
+                )
+
+    def query(self, expr=None):
+        """Yield all records matching the filter expression `expr`.
+
+        Records are returned in ingestion order. See `parse_filter` for the
+        syntax of `expr`.
+        """
+        where, params = _conditions_to_sql(parse_filter(expr))
+        cursor = self.conn.execute(
+            f"SELECT record FROM messages WHERE {where} ORDER BY indexfile, rowid",
+            params,
+        )
+        for (record,) in cursor:
+            yield json.loads(record)
+
+    def count(self, expr=None):
+        """Count all records matching the filter expression `expr`."""
+        where, params = _conditions_to_sql(parse_filter(expr))
+        return self.conn.execute(
+            f"SELECT COUNT(*) FROM messages WHERE {where}", params
+        ).fetchone()[0]
@@ -0,0 +1,134 @@
+"""Export of datasets referencing GRIB messages to native zarr.
+
+The GRIB messages are decoded in parallel and written into compressed zarr
+arrays, which may use larger chunks than a single message (e.g. many time
+steps per chunk) or tile the horizontal dimension. The work is split into
+blocks covering one output chunk along all non-horizontal dimensions, such
+that the memory usage is bounded by the size of these blocks. Finished
+blocks are tracked in a progress file, so interrupted exports can be resumed.
+"""
+import json
+import multiprocessing as mp
+import pathlib
+
+import fsspec
+import numcodecs
+import numpy as np
+import zarr
+from zarr.storage import FsspecStore
+
+from .rawgribcodec import RawGribCodec
+from .refs import grib_arrays, load_refs, output_chunks, plan_blocks, read_messages
+
+import logging
+
+logger = logging.getLogger("gribscan")
+
+PROGRESS_FILE = ".gribscan-export"
+
+
+def _export_block(task):
+    output, name, block, entries = task
+    array = zarr.open_array(output, path=name, mode="r+")
+    nouter = len(block)
+    out_chunks = array.chunks[:nouter]
+    data_shape = array.shape[nouter:]
+
+    slices = tuple(
+        slice(b * c, min((b + 1) * c, n))
+        for b, c, n in zip(block, out_chunks, array.shape)
+    )
+    data = np.full(
+        [s.stop - s.start for s in slices] + list(data_shape),
+        array.fill_value,
+        dtype=array.dtype,
+    )
+
+    codec = RawGribCodec()
+    for i, message in read_messages([ref for _, ref in entries]):
+        data[entries[i][0]] = codec.decode(message).reshape(data_shape)
+
+    array[slices] = data
+    return name, list(block)
+
+
+def copy_array(src, dst, name):
+    """Copy the (small, not GRIB-backed) array `name` between zarr groups."""
+    source = src[name]
+    dst.create_array(
+        name,
+        data=source[...],
+        chunks=source.chunks,
+        fill_value=source.metadata.fill_value,
+        attributes=dict(source.attrs),
+        overwrite=True,
+    )
+
+
+def export_zarr(refs, output, chunks=None, nprocs=1, compressor=None):
+    """Decode a dataset assembled by `grib_magic` into a zarr store at `output`.
+
+    `chunks` maps dimension names to output chunk sizes (e.g.
+    `{"time": 24, "value": 2**20}`), by default each message becomes a chunk.
+    An unfinished export to the same `output` is resumed.
+    """
+    refs = load_refs(refs)
+    chunks = chunks or {}
+    compressor = compressor or numcodecs.Blosc("zstd", clevel=5)
+
+    progress_file = pathlib.Path(output) / PROGRESS_FILE
+    done = set()
+    if progress_file.exists():
+        with open(progress_file) as f:
+            done = {(name, tuple(block)) for name, block in map(json.loads, f)}
+        logger.info(f"resuming export, {len(done)} blocks are already done")
+        dst = zarr.open_group(output, mode="r+", zarr_format=2)
+    else:
+        dst = zarr.open_group(output, mode="w", zarr_format=2)
+
+    fs = fsspec.filesystem("reference", fo=refs)
+    src = zarr.open_group(
+        FsspecStore.from_mapper(fs.get_mapper(), read_only=True), mode="r"
+    )
+    dst.attrs.update(dict(src.attrs))
+
+    arrays = grib_arrays(refs)
+    tasks = []
+    for name in src.array_keys():
+        if name not in arrays:
+            if not done:
+                copy_array(src, dst, name)
+            continue
+
+        info = arrays[name]
+        dims = info["attrs"]["_ARRAY_DIMENSIONS"]
+        out_chunks = output_chunks(dims, info["shape"], info["nouter"], chunks)
+        if not done:
+            dst.create_array(
+                name,
+                shape=info["shape"],
+                chunks=out_chunks,
+                dtype=info["dtype"],
+                compressors=compressor,
+                fill_value=info["fill_value"],
+                attributes=info["attrs"],
+                overwrite=True,
+            )
+        blocks = plan_blocks(refs, name, info, out_chunks[: info["nouter"]])
+        tasks.extend(
+            (str(output), name, block, entries)
+            for block, entries in blocks.items()
+            if (name, block) not in done
+        )
+
+    # follow the order of messages in the files to read them sequentially
+    tasks.sort(key=lambda task: min((ref[0], ref[1]) for _, ref in task[3]))
+
+    logger.info(f"exporting {len(tasks)} blocks")
+    with open(progress_file, "a") as progress, mp.Pool(nprocs) as pool:
+        for name, block in pool.imap_unordered(_export_block, tasks):
+            progress.write(json.dumps([name, block]) + "\n")
+            progress.flush()
+
+    progress_file.unlink()
+    zarr.consolidate_metadata(output)
@@ -0,0 +1,281 @@
+"""Fast scanning of common GRIB2 messages without eccodes.
+
+Creating an eccodes handle and computing the cfgrib keys of every message
+dominates the time needed for indexing. Within a file, most messages only
+differ in a few fields, e.g. the reference time, the forecast step, the
+level or the ensemble member. `Grib2Scanner` parses the sections of GRIB2
+messages with `struct` and masks these fields to obtain a signature of the
+remaining metadata. The first message of each signature is scanned by
+eccodes, all further messages reuse its record and only update the masked
+fields. The first reuse of each signature is cross-validated against eccodes,
+signatures which don't match are always scanned by eccodes.
+
+Supported are grid definition templates 3.0, 3.40 and 3.150 (HEALPix),
+product definition templates 4.0, 4.1, 4.8 and 4.11 and data representation
+template 5.0, all other messages are scanned by eccodes. Varying fields are
+the reference time, the forecast time, the level of isobaric (in whole hPa),
+hybrid and generalVertical levels and the ensemble member.
+"""
+import calendar
+import struct
+import threading
+
+from .gribscan import get_time_offset, scan_message, time_range_units
+
+import logging
+
+logger = logging.getLogger("gribscan")
+
+GRID_TEMPLATES = {0, 40, 150}
+PRODUCT_TEMPLATES = {0, 1, 8, 11}
+DATA_TEMPLATES = {0}
+
+# divisor from the scaled value of the first fixed surface to `level`, other
+# types of levels are part of the signature (e.g. the parameter of some
+# heightAboveGround levels depends on the height, like 2t), as well as values
+# which aren't a multiple of the divisor (eccodes indexes isobaric levels
+# below 100 Pa as isobaricInPa)
+LEVEL_DIVISORS = {
+    100: 100,  # isobaricInhPa (Pa)
+    105: 1,  # hybrid
+    150: 1,  # generalVertical
+}
+
+MISSING = 0xFFFFFFFF
+
+# data representation templates storing values as R + X * 2**E with
+# X < 2**bitsPerValue (simple, JPEG 2000, PNG and CCSDS packing)
+BOUNDED_DATA_TEMPLATES = {0, 40, 41, 42}
+
+
+class UnsupportedMessage(Exception):
+    pass
+
+
+def _sections(data):
+    """Return `{number: (start, end)}` of the sections of a single field message."""
+    if data[:4] != b"GRIB" or data[7] != 2:
+        raise UnsupportedMessage("not GRIB2")
+    sections = {}
+    pos = 16
+    expected = (1, 2, 3, 4, 5, 6, 7)
+    while data[pos : pos + 4] != b"7777":
+        if pos + 5 > len(data):
+            raise UnsupportedMessage("truncated message")
+        (length,) = struct.unpack_from(">I", data, pos)
+        number = data[pos + 4]
+        if number in sections or number not in expected or length < 5:
+            raise UnsupportedMessage("repeated or unknown sections")
+        sections[number] = (pos, pos + length)
+        pos += length
+    if not all(n in sections for n in (1, 3, 4, 5)):
+        raise UnsupportedMessage("missing sections")
+    return sections
+
+
+def parse(data):
+    """Parse the fields of a GRIB2 message which vary between similar messages.
+
+    Returns the signature of all other metadata and the parsed fields.
+    """
+    sections = _sections(data)
+    signature = bytearray(data[6:7])  # discipline
+    fields = {}
+
+    start, end = sections[1]
+    s1 = bytearray(data[start:end])
+    fields["reference"] = struct.unpack_from(">HBBBBB", s1, 12)
+    s1[12:19] = bytes(7)
+    signature += s1
+
+    if 2 in sections:
+        signature += data[slice(*sections[2])]
+
+    start, end = sections[3]
+    if struct.unpack_from(">H", data, start + 12)[0] not in GRID_TEMPLATES:
+        raise UnsupportedMessage("grid definition template")
+    signature += data[start:end]
+
+    start, end = sections[4]
+    s4 = bytearray(data[start:end])
+    (pdt,) = struct.unpack_from(">H", s4, 7)
+    if pdt not in PRODUCT_TEMPLATES:
+        raise UnsupportedMessage("product definition template")
+    fields["productDefinitionTemplateNumber"] = pdt
+    fields["unit"] = s4[17]
+    (forecast_time,) = struct.unpack_from(">I", s4, 18)
+    if forecast_time & 0x80000000:
+        raise UnsupportedMessage("negative forecast time")
+    fields["forecastTime"] = forecast_time
+    s4[18:22] = bytes(4)
+
+    level_type, scale, value = s4[22], s4[23], struct.unpack_from(">I", s4, 24)[0]
+    divisor = LEVEL_DIVISORS.get(level_type)
+    if divisor and scale == 0 and value not in (0, MISSING) and value % divisor == 0:
+        fields["level"] = value // divisor
+        s4[24:28] = bytes(4)
+
+    if pdt in (1, 11):
+        fields["number"] = s4[35]
+        s4[35] = 0
+
+    if pdt in (8, 11):
+        end_time = 34 if pdt == 8 else 37
+        if s4[end_time + 7] != 1:
+            raise UnsupportedMessage("multiple time ranges")
+        time_range = end_time + 12
+        fields["rangeUnit"] = s4[time_range + 2]
+        (length,) = struct.unpack_from(">I", s4, time_range + 3)
+        fields["lengthOfTimeRange"] = length
+        # the length stays in the signature, as parameters may depend on it
+        s4[end_time : end_time + 7] = bytes(7)
+    signature += s4
+
+    start, end = sections[5]
+    if struct.unpack_from(">H", data, start + 9)[0] not in DATA_TEMPLATES:
+        raise UnsupportedMessage("data representation template")
+    signature += data[start + 5 : start + 11]  # number of values and template
+
+    if 6 in sections:
+        signature += data[sections[6][0] + 5 : sections[6][0] + 6]
+
+    return bytes(signature), fields
+
+
+def _signed(value, bits=16):
+    """Decode an integer with a sign bit, as used by GRIB."""
+    sign = 1 << (bits - 1)
+    return -(value & (sign - 1)) if value & sign else value
+
+
+def packing_bounds(data):
+    """Return bounds of the values of a GRIB2 message from its packing parameters.
+
+    Returns `(min, max, bitmap)`, where `min` and `max` are `None` for packings
+    which aren't bounded and `bitmap` tells if a bitmap is present.
+    """
+    sections = _sections(data)
+    start, _ = sections[5]
+    (template,) = struct.unpack_from(">H", data, start + 9)
+    if template in BOUNDED_DATA_TEMPLATES:
+        reference, binary_scale, decimal_scale, nbits = struct.unpack_from(
+            ">fHHB", data, start + 11
+        )
+        decimal_scale = 10.0 ** -_signed(decimal_scale)
+        minimum = reference * decimal_scale
+        maximum = (
+            reference + (2**nbits - 1) * 2.0 ** _signed(binary_scale)
+        ) * decimal_scale
+    else:
+        minimum = maximum = None
+    bitmap = 6 in sections and data[sections[6][0] + 5] != 255
+    return minimum, maximum, bitmap
+
+
+def _update(template, fields, offset, size, kwargs):
+    """Create the record of a message from the record of a similar message."""
+    year, month, day, hour, minute, _ = fields["reference"]
+    # like the keys of cfgrib, which ignore the seconds
+    reference_time = calendar.timegm((year, month, day, hour, minute, 0))
+    timing = {
+        "editionNumber": 2,
+        "productDefinitionTemplateNumber": fields["productDefinitionTemplateNumber"],
+        "indicatorOfUnitOfTimeRange": fields["unit"],
+        "forecastTime": fields["forecastTime"],
+    }
+    step = fields["forecastTime"] * time_range_units[fields["unit"]]
+    if "lengthOfTimeRange" in fields:
+        timing["lengthOfTimeRange"] = fields["lengthOfTimeRange"]
+        step += fields["lengthOfTimeRange"] * time_range_units[fields["rangeUnit"]]
+
+    extra = dict(template["extra"])
+    if extra.get("forecastTime") is not None:
+        extra["forecastTime"] = fields["forecastTime"]
+
+    record = {
+        **template,
+        "posix_time": reference_time + get_time_offset(timing),
+        "member": fields.get("number", template["member"]),
+        "time": f"{hour:02d}{minute:02d}",
+        "date": f"{year:04d}{month:02d}{day:02d}",
+        "level": fields.get("level", template["level"]),
+        "referenceTime": reference_time,
+        "step": step / 3600,
+        "_offset": offset,
+        "_length": size,
+        "extra": extra,
+        **kwargs,
+    }
+    return record
+
+
+class Grib2Scanner:
+    """Create index records like `scan_message`, reusing the records of similar messages.
+
+    A scanner may be shared by threads, its bookkeeping is guarded by a lock
+    while messages are scanned concurrently. A signature is validated by a
+    single thread, other threads use eccodes until it is validated.
+    """
+
+    def __init__(self):
+        self._templates = {}
+        self._validated = set()
+        self._validating = set()
+        self._rejected = set()
+        self._lock = threading.Lock()
+        self.stats = {"parsed": 0, "eccodes": 0}
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _eccodes(self, data, offset, size, kwargs):
+        self._count("eccodes")
+        return scan_message(data, offset, size, **kwargs)
+
+    def _validate(self, signature, record, expected, offset):
+        with self._lock:
+            self._validating.discard(signature)
+            if record != expected:
+                logger.info(f"fast GRIB2 scan differs from eccodes at {offset}")
+                self._rejected.add(signature)
+            else:
+                self._validated.add(signature)
+
+    def scan(self, data, offset, size, **kwargs):
+        try:
+            signature, fields = parse(data)
+        except (UnsupportedMessage, struct.error, IndexError) as e:
+            logger.debug(f"scanning message at {offset} with eccodes: {e}")
+            return self._eccodes(data, offset, size, kwargs)
+
+        with self._lock:
+            template = self._templates.get(signature)
+            validated = signature in self._validated
+            if signature in self._rejected or signature in self._validating:
+                template = None
+            elif template is not None and not validated:
+                self._validating.add(signature)
+
+        if template is None:
+            record = self._eccodes(data, offset, size, kwargs)
+            with self._lock:
+                self._templates.setdefault(signature, record)
+            return record
+
+        try:
+            record = _update(template, fields, offset, size, kwargs)
+        except KeyError as e:  # e.g. unknown time units
+            logger.debug(f"scanning message at {offset} with eccodes: {e}")
+            if not validated:
+                with self._lock:
+                    self._validating.discard(signature)
+            return self._eccodes(data, offset, size, kwargs)
+
+        if not validated:
+            expected = self._eccodes(data, offset, size, kwargs)
+            self._validate(signature, record, expected, offset)
+            return expected
+
+        self._count("parsed")
+        return record
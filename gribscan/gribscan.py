@@ -1,16 +1,28 @@
+import io
 import itertools
 import json
 import base64
+import os
 import pathlib
+import struct
+import tarfile
+import threading
 import uuid
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
 
 import cfgrib
 import eccodes
+import numcodecs
 import numpy as np
 import xarray as xr
 
 from .magician import Magician
+from .gridcodec import GridCoordsCodec
+from .profiling import span
+from .catalog import Catalog, is_catalog, parse_filter, match_filter
+from .records import Interner, MessageRecord
 from . import gridutils as gu
 
 import logging
@@ -97,7 +109,9 @@ def _split_file(f, skip=0):
         indicator = f.peek(16)
         if indicator[:4] != b"GRIB":
             logger.info(f"non-consecutive messages, searching for part {part + 1}")
-            if (start := find_stream(f, b"GRIB")) is None:
+            with span("find_stream"):
+                start = find_stream(f, b"GRIB")
+            if start is None:
                 # Handle non-GRIB data after the last GRIB message in a file
                 return
             indicator = f.peek(16)
@@ -118,7 +132,8 @@ def _split_file(f, skip=0):
         else:
             raise ValueError(f"unknown grib edition: {grib_edition}")
 
-        data = f.read(part_size)
+        with span("read", bytes=part_size):
+            data = f.read(part_size)
         if data[-4:] != b"7777":
             logger.warning(f"part {part + 1} is broken")
             f.seek(start + 1)
@@ -130,6 +145,126 @@ def _split_file(f, skip=0):
             break
 
 
+class _FileRange:
+    """Read-only file-like view of `size` bytes of `f` starting at `start`."""
+
+    def __init__(self, f, start, size):
+        self.f = f
+        self.start = start
+        self.size = size
+        self._pos = 0
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=0):
+        if whence == 0:
+            pos = offset
+        elif whence == 1:
+            pos = self._pos + offset
+        elif whence == 2:
+            pos = self.size + offset
+        else:
+            raise ValueError(f"invalid whence: {whence}")
+        self._pos = max(pos, 0)
+        return self._pos
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            n = self.size - self._pos
+        n = min(n, self.size - self._pos)
+        if n <= 0:
+            return b""
+        self.f.seek(self.start + self._pos)
+        data = self.f.read(n)
+        self._pos += len(data)
+        return data
+
+    def peek(self, n=1):
+        pos = self._pos
+        data = self.read(n)
+        self._pos = pos
+        return data
+
+
+def _split_stream(f, tee=None, buffersize=4 * 1024 * 1024):
+    """
+    splits a forward-only stream of GRIB data into individual messages
+
+    Offsets are counted from the start of the stream. All data read from `f`
+    is written to `tee` (if given), including data between messages.
+    """
+    buf = bytearray()
+    pos = 0  # stream offset of buf[0]
+    eof = False
+    part = 0
+
+    def fill(n):
+        nonlocal eof
+        while len(buf) < n and not eof:
+            with span("read") as s:
+                chunk = f.read(max(buffersize, n - len(buf)))
+                s.add(bytes=len(chunk))
+            if not chunk:
+                eof = True
+            elif tee is not None:
+                tee.write(chunk)
+            buf.extend(chunk)
+        return len(buf) >= n
+
+    def discard(n):
+        nonlocal pos
+        del buf[:n]
+        pos += n
+
+    try:
+        while True:
+            logger.debug(f"extract part {part + 1}")
+            if not fill(16) and not buf:
+                return
+            if (idx := buf.find(b"GRIB")) != 0:
+                logger.info(f"non-consecutive messages, searching for part {part + 1}")
+                with span("find_stream"):
+                    while idx < 0:
+                        discard(max(len(buf) - 3, 0))
+                        if not fill(len(buf) + 1):
+                            # Handle non-GRIB data after the last GRIB message
+                            return
+                        idx = buf.find(b"GRIB")
+                    discard(idx)
+            if not fill(16):
+                logger.info(f"couldn't read indicator, assuming end of stream at {pos}")
+                return
+
+            grib_edition = buf[7]
+
+            if grib_edition == 1:
+                part_size = int.from_bytes(buf[4:7], "big")
+                if part_size & 0x800000:
+                    fill(part_size)
+                    part_size = detect_large_grib1_special_coding(
+                        io.BytesIO(buf), part_size
+                    )
+            elif grib_edition == 2:
+                part_size = int.from_bytes(buf[8:16], "big")
+            else:
+                raise ValueError(f"unknown grib edition: {grib_edition}")
+
+            fill(part_size)
+            if len(buf) < part_size or buf[part_size - 4 : part_size] != b"7777":
+                logger.warning(f"part {part + 1} is broken")
+                discard(1)
+            else:
+                yield pos, part_size, grib_edition, bytes(buf[:part_size])
+                discard(part_size)
+
+            part += 1
+    finally:
+        # copy everything, even if the consumer stops early
+        while tee is not None and fill(len(buf) + 1):
+            discard(len(buf))
+
+
 EXTRA_PARAMETERS = [
     "forecastTime",
     "indicatorOfUnitOfTimeRange",
@@ -300,65 +435,385 @@ def arrays_to_list(o):
         return o
 
 
-def scan_gribfile(filelike, **kwargs):
-    for offset, size, grib_edition, data in _split_file(filelike):
-        mid = eccodes.codes_new_from_message(data)
-        m = cfgrib.cfmessage.CfMessage(mid)
-        t = eccodes.codes_get_native_type(m.codes_id, "values")
-        s = eccodes.codes_get_size(m.codes_id, "values")
+def scan_message(data, offset, size, **kwargs):
+    """Create the index record of a single GRIB message."""
+    mid = eccodes.codes_new_from_message(data)
+    m = cfgrib.cfmessage.CfMessage(mid)
+    t = eccodes.codes_get_native_type(m.codes_id, "values")
+    s = eccodes.codes_get_size(m.codes_id, "values")
 
-        global_attrs = {k: m[k] for k in cfgrib.dataset.GLOBAL_ATTRIBUTES_KEYS}
-        for uuid_key in ["uuidOfHGrid", "uuidOfVGrid"]:
-            try:
-                global_attrs[uuid_key] = str(
-                    uuid.UUID(eccodes.codes_get_string(mid, uuid_key))
-                )
-            except eccodes.KeyValueNotFoundError:
-                pass
-
-        idx = {
-            "globals": global_attrs,
-            "attrs": {
-                k: m.get(k, None)
-                for k in cfgrib.dataset.DATA_ATTRIBUTES_KEYS
-                + cfgrib.dataset.EXTRA_DATA_ATTRIBUTES_KEYS
-            },
-            "parameter_code": {
-                k: m.get(k, None)
-                for k in ["discipline", "parameterCategory", "parameterNumber"]
-            },
-            "posix_time": m["time"] + get_time_offset(m),
-            "domain": m["globalDomain"],
-            "member": m.get("number", None),
-            "time": f"{m['hour']:02d}{m['minute']:02d}",
-            "date": f"{m['year']:04d}{m['month']:02d}{m['day']:02d}",
-            "levtype": m.get("typeOfLevel", None),
-            "level": m.get("level", None),
-            "type": m.get("dataType", None),
-            "referenceTime": m["time"],
-            "step": m["step"],
-            "_offset": offset,
-            "_length": size,
-            "array": {
-                "dtype": np.dtype(t).str,
-                "shape": [s],
-            },
-            "extra": {
-                k: arrays_to_list(m.get(k, None))
-                for k in (EXTRA_PARAMETERS + gu.params_for_gridType(m["gridType"]))
-            },
-            **kwargs,
+    global_attrs = {k: m[k] for k in cfgrib.dataset.GLOBAL_ATTRIBUTES_KEYS}
+    for uuid_key in ["uuidOfHGrid", "uuidOfVGrid"]:
+        try:
+            global_attrs[uuid_key] = str(
+                uuid.UUID(eccodes.codes_get_string(mid, uuid_key))
+            )
+        except eccodes.KeyValueNotFoundError:
+            pass
+
+    idx = {
+        "globals": global_attrs,
+        "attrs": {
+            k: m.get(k, None)
+            for k in cfgrib.dataset.DATA_ATTRIBUTES_KEYS
+            + cfgrib.dataset.EXTRA_DATA_ATTRIBUTES_KEYS
+        },
+        "parameter_code": {
+            k: m.get(k, None)
+            for k in ["discipline", "parameterCategory", "parameterNumber"]
+        },
+        "posix_time": m["time"] + get_time_offset(m),
+        "domain": m["globalDomain"],
+        "member": m.get("number", None),
+        "time": f"{m['hour']:02d}{m['minute']:02d}",
+        "date": f"{m['year']:04d}{m['month']:02d}{m['day']:02d}",
+        "levtype": m.get("typeOfLevel", None),
+        "level": m.get("level", None),
+        "type": m.get("dataType", None),
+        "referenceTime": m["time"],
+        "step": m["step"],
+        "_offset": offset,
+        "_length": size,
+        "array": {
+            "dtype": np.dtype(t).str,
+            "shape": [s],
+        },
+        "extra": {
+            k: arrays_to_list(m.get(k, None))
+            for k in (EXTRA_PARAMETERS + gu.params_for_gridType(m["gridType"]))
+        },
+        **kwargs,
+    }
+
+    if (param := m.get("shortName", "unknown")) != "unknown":
+        idx["param"] = param
+    else:
+        idx["param"] = ".".join(map(str, idx["parameter_code"].values()))
+
+    return idx
+
+
+# packings which store values as R + X * 2**E with X < 2**bitsPerValue
+BOUNDED_PACKING_TYPES = {"grid_simple", "grid_jpeg", "grid_png", "grid_ccsds"}
+
+STATISTICS = ("min", "max", "mean")
+
+
+def message_stats(data, exact=False):
+    """Compute statistics of the values of a single GRIB message.
+
+    Unless `exact`, the values aren't decoded: `min` and `max` are bounds
+    derived from the packing parameters (or `None` for other packings) and
+    `mean` is `None`. `bitmap` tells if the message contains missing values.
+    """
+    stats = dict.fromkeys(STATISTICS)
+    if not exact:
+        from .grib2 import UnsupportedMessage, packing_bounds
+
+        try:
+            stats["min"], stats["max"], stats["bitmap"] = packing_bounds(data)
+            return stats
+        except (UnsupportedMessage, struct.error, IndexError):
+            pass  # e.g. GRIB1, read the packing parameters using eccodes
+
+    mid = eccodes.codes_new_from_message(data)
+    try:
+        if exact:
+            stats["min"] = float(eccodes.codes_get(mid, "minimum"))
+            stats["max"] = float(eccodes.codes_get(mid, "maximum"))
+            stats["mean"] = float(eccodes.codes_get(mid, "average"))
+        elif eccodes.codes_get(mid, "packingType") in BOUNDED_PACKING_TYPES:
+            reference = eccodes.codes_get(mid, "referenceValue")
+            binary_scale = eccodes.codes_get(mid, "binaryScaleFactor")
+            decimal_scale = 10.0 ** -eccodes.codes_get(mid, "decimalScaleFactor")
+            nbits = eccodes.codes_get(mid, "bitsPerValue")
+            stats["min"] = reference * decimal_scale
+            stats["max"] = (
+                reference + (2**nbits - 1) * 2.0**binary_scale
+            ) * decimal_scale
+        stats["bitmap"] = bool(eccodes.codes_get(mid, "bitmapPresent"))
+    finally:
+        eccodes.codes_release(mid)
+    return stats
+
+
+def is_tarfile(filelike):
+    """Check for the header of a POSIX (ustar, pax or GNU) tar archive."""
+    pos = filelike.tell()
+    header = filelike.read(512)
+    filelike.seek(pos)
+    return len(header) == 512 and header[257:262] == b"ustar"
+
+
+def is_gzipfile(filelike):
+    """Check for the header of a gzip file."""
+    pos = filelike.tell()
+    magic = filelike.read(3)
+    filelike.seek(pos)
+    return magic == b"\x1f\x8b\x08"
+
+
+def is_remote(path):
+    """Check whether `path` is the URL of a remote (fsspec) filesystem."""
+    protocol, sep, _ = str(path).partition("://")
+    return bool(sep) and protocol not in ("file", "local")
+
+
+def message_scanner(fast=True, stats=None):
+    """Return a function creating index records like `scan_message`.
+
+    If `fast`, common GRIB2 messages are parsed without eccodes, see `grib2`.
+    With `stats="bounds"` or `stats="exact"`, the records contain the
+    `message_stats` of each message.
+    """
+    if stats not in (None, "bounds", "exact"):
+        raise ValueError(f"unknown statistics: {stats}")
+
+    if fast:
+        from .grib2 import Grib2Scanner
+
+        scan = Grib2Scanner().scan
+    else:
+        scan = scan_message
+    if stats is None:
+        return scan
+
+    def scan_with_stats(data, offset, size, **kwargs):
+        # records of the fast scanner may be shared, don't modify them
+        return {
+            **scan(data, offset, size, **kwargs),
+            "stats": message_stats(data, exact=stats == "exact"),
         }
 
-        if (param := m.get("shortName", "unknown")) != "unknown":
-            idx["param"] = param
+    return scan_with_stats
+
+
+class _ByteBudget:
+    """Limit the bytes of items in flight, allowing at least one item at a time."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self._changed = threading.Condition()
+
+    def acquire(self, nbytes, stop):
+        with self._changed:
+            while self.used and self.used + nbytes > self.limit:
+                if stop.is_set():
+                    return False
+                self._changed.wait(0.1)
+            self.used += nbytes
+            return True
+
+    def release(self, nbytes):
+        with self._changed:
+            self.used -= nbytes
+            self._changed.notify_all()
+
+
+def _prefetch(iterable, budget, sizeof):
+    """Iterate over `iterable` in a background thread, as far ahead as `budget` allows.
+
+    Each item acquires `sizeof(item)` bytes of the budget, which have to be
+    released by the consumer. If the consumer stops early, `iterable` is
+    closed by the reader thread, such that its cleanup (e.g. copying the rest
+    of a stream in `_split_stream`) is done before returning.
+    """
+    items = Queue()
+    stop = threading.Event()
+    end = object()
+
+    def produce():
+        try:
+            for item in iterable:
+                if not budget.acquire(sizeof(item), stop):
+                    return
+                items.put((item, None))
+        except BaseException as e:
+            items.put((end, e))
         else:
-            idx["param"] = ".".join(map(str, idx["parameter_code"].values()))
+            items.put((end, None))
+        finally:
+            if (close := getattr(iterable, "close", None)) is not None:
+                close()
+
+    reader = threading.Thread(target=produce, daemon=True)
+    reader.start()
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is end:
+                return
+            yield item
+    finally:
+        stop.set()
+        reader.join()
 
-        yield idx
+
+def pipelined(items, func, sizeof, nworkers=1, max_bytes=64 * 1024 * 1024):
+    """Yield `func(*item)` for all `items` in order, computed by a pipeline.
+
+    The items are produced by a reader thread (e.g. reading messages from a
+    file), while `nworkers` threads apply `func`. Thus reading, processing and
+    consuming the results (e.g. writing an index) overlap. The reader stays
+    ahead as long as the items which aren't processed yet take up to
+    `max_bytes`, as given by `sizeof(item)`.
+    """
+    budget = _ByteBudget(max_bytes)
+
+    def process(nbytes, item):
+        try:
+            return func(*item)
+        finally:
+            budget.release(nbytes)
+
+    with ThreadPoolExecutor(nworkers) as pool:
+        pending = deque()
+        try:
+            for item in _prefetch(items, budget, sizeof):
+                pending.append(pool.submit(process, sizeof(item), item))
+                while pending and pending[0].done():
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def _scan_parts(parts, scan, threads=0, **kwargs):
+    """Scan `(offset, size, data)` of messages, in a pipeline if `threads` > 0."""
+
+    def scan_part(offset, size, data):
+        with span("parse"):
+            return scan(data, offset, size, **kwargs)
+
+    if threads:
+        yield from pipelined(parts, scan_part, lambda part: part[1], threads)
+    else:
+        for part in parts:
+            yield scan_part(*part)
+
+
+def scan_gribfile(filelike, fast=True, stats=None, threads=0, **kwargs):
+    """Scan the GRIB messages of a file (or an uncompressed tar archive).
+
+    With `threads` > 0, messages are read ahead in a background thread and
+    scanned by `threads` threads, see `pipelined`.
+    """
+    if is_tarfile(filelike):
+        yield from scan_tarfile(filelike, fast, stats, threads, **kwargs)
+        return
+
+    if threads:
+        # the reader reads large blocks ahead instead of seeking to each message
+        filelike.seek(0)
+        messages = _split_stream(filelike)
+    else:
+        messages = _split_file(filelike)
+    parts = ((offset, size, data) for offset, size, _, data in messages)
+    yield from _scan_parts(parts, message_scanner(fast, stats), threads, **kwargs)
+
+
+def _tar_parts(filelike):
+    with tarfile.open(fileobj=filelike, mode="r:") as tar:
+        members = tar.getmembers()
+
+    for member in members:
+        if not member.isfile():
+            continue
+        if member.issparse():
+            logger.warning(f"skipping sparse member {member.name}")
+            continue
+        logger.debug(f"scanning member {member.name}")
+        parts = _split_file(_FileRange(filelike, member.offset_data, member.size))
+        while True:
+            try:
+                offset, size, grib_edition, data = next(parts)
+            except StopIteration:
+                break
+            except ValueError as e:
+                # archives may contain other files, which happen to contain "GRIB"
+                logger.warning(f"skipping rest of member {member.name}: {e}")
+                break
+            yield member.offset_data + offset, size, data
+
+
+def scan_tarfile(filelike, fast=True, stats=None, threads=0, **kwargs):
+    """Scan the GRIB messages in all members of an uncompressed tar archive.
+
+    Offsets refer to the archive, such that messages can be read from it
+    directly without extracting the members.
+    """
+    scan = message_scanner(fast, stats)
+    yield from _scan_parts(_tar_parts(filelike), scan, threads, **kwargs)
 
 
-def write_index(gribfile, idxfile=None, outdir=None, force=False):
+def _find_message(f, start, size):
+    """Find the first complete GRIB message at or after `start`.
+
+    Unlike `find_stream`, occurrences of "GRIB" within the data of another
+    message are skipped, by checking the edition and the end marker.
+    """
+    f.seek(start)
+    while (pos := find_stream(f, b"GRIB")) is not None:
+        f.seek(pos)
+        indicator = f.read(16)
+        part_size = 0
+        if len(indicator) == 16 and indicator[7] == 1:
+            part_size = int.from_bytes(indicator[4:7], "big")
+            if part_size & 0x800000:
+                f.seek(pos)
+                try:
+                    part_size = detect_large_grib1_special_coding(f, part_size)
+                except (AssertionError, IndexError):
+                    part_size = 0
+        elif len(indicator) == 16 and indicator[7] == 2:
+            part_size = int.from_bytes(indicator[8:16], "big")
+        if 16 < part_size <= size - pos:
+            f.seek(pos + part_size - 4)
+            if f.read(4) == b"7777":
+                return pos
+        f.seek(pos + 1)
+    return None
+
+
+def scan_byterange(filelike, start, end, fast=True, stats=None, threads=0, **kwargs):
+    """Scan the GRIB messages of a file which start within `[start, end)`.
+
+    Ranges may start within a message, the last message may extend beyond
+    `end`. Thus, a file can be scanned in parallel using adjacent ranges.
+    """
+    filelike.seek(0, 2)
+    size = filelike.tell()
+    if (first := _find_message(filelike, start, size)) is None or first >= end:
+        return
+
+    view = _FileRange(filelike, first, size - first)
+    parts = itertools.takewhile(
+        lambda part: part[0] < end,
+        (
+            (first + offset, part_size, data)
+            for offset, part_size, _, data in _split_file(view)
+        ),
+    )
+    yield from _scan_parts(parts, message_scanner(fast, stats), threads, **kwargs)
+
+
+def scan_gribstream(stream, tee=None, fast=True, stats=None, threads=0, **kwargs):
+    """Like `scan_gribfile`, but for streams which can't seek (e.g. pipes).
+
+    All data read from `stream` is copied to `tee` (if given).
+    """
+    parts = (
+        (offset, size, data) for offset, size, _, data in _split_stream(stream, tee)
+    )
+    yield from _scan_parts(parts, message_scanner(fast, stats), threads, **kwargs)
+
+
+def _index_path(gribfile, idxfile=None, outdir=None, force=False):
     p = pathlib.Path(gribfile)
     if outdir is None:
         outdir = p.parent
@@ -369,19 +824,21 @@ def write_index(gribfile, idxfile=None, outdir=None, force=False):
         idxfile = pathlib.Path(outdir) / (
             p.with_suffix(suffix_map.get(p.suffix, p.suffix + ".index")).name
         )
+    idxfile = pathlib.Path(idxfile)
 
     if idxfile.exists() and not force:
         raise FileExistsError(f"Index file {idxfile} already exists!")
 
-    # We need to use the gribfile (str) variable because Path() objects
-    # collapse the "/./" notation used to denote subtrees.
-    gen = scan_gribfile(open(p, "rb"), filename=gribfile)
+    return idxfile
+
 
+def _write_records(gen, idxfile, force=False):
     tempfile = idxfile.with_suffix(".index.partial")
     with open(tempfile, "w") as output_file:
         for record in gen:
-            json.dump(record, output_file)
-            output_file.write("\n")
+            with span("json_encode"):
+                json.dump(record, output_file)
+                output_file.write("\n")
 
     if force or not idxfile.exists():
         tempfile.rename(idxfile)
@@ -389,24 +846,163 @@ def write_index(gribfile, idxfile=None, outdir=None, force=False):
         logger.warning(f"Index file {idxfile} got created during runtime.")
 
 
-def parse_index(indexfile, m2key, duplicate="replace"):
+def write_index(
+    gribfile,
+    idxfile=None,
+    outdir=None,
+    force=False,
+    max_concurrency=32,
+    fast=True,
+    stats=None,
+    seek_spacing=None,
+    threads=0,
+):
+    """Write the index of `gribfile`, which may also be a remote URL.
+
+    Remote files are scanned using up to `max_concurrency` concurrent range
+    requests, their index is written to `idxfile` or `outdir`. With `fast`,
+    common GRIB2 messages are parsed without eccodes. See `message_scanner`
+    for `stats`. For gzip-compressed files, a seek table with seek points
+    every `seek_spacing` bytes is written next to the index, see `gzseek`.
+    Local files are read ahead while `threads` threads scan the messages,
+    see `pipelined`.
+    """
+    if is_remote(gribfile):
+        from .remote import scan_remote_gribfile
+
+        if idxfile is None and outdir is None:
+            raise ValueError(f"an idxfile or outdir is required for {gribfile}")
+        idxfile = _index_path(gribfile, idxfile, outdir, force)
+        gen = scan_remote_gribfile(
+            gribfile,
+            max_concurrency=max_concurrency,
+            fast=fast,
+            stats=stats,
+            filename=gribfile,
+        )
+    else:
+        idxfile = _index_path(gribfile, idxfile, outdir, force)
+        f = open(gribfile, "rb")
+        if is_gzipfile(f):
+            from .gzseek import PROTOCOL, scan_gzipfile, seek_table_path
+
+            # references point into the uncompressed data via the seek table
+            gen = scan_gzipfile(
+                f,
+                seek_table_path(gribfile, os.fspath(idxfile.parent)),
+                seek_spacing,
+                fast=fast,
+                stats=stats,
+                threads=threads,
+                filename=f"{PROTOCOL}://{gribfile}",
+            )
+        else:
+            # We need to use the gribfile (str) variable because Path() objects
+            # collapse the "/./" notation used to denote subtrees.
+            gen = scan_gribfile(
+                f, fast=fast, stats=stats, threads=threads, filename=gribfile
+            )
+    _write_records(gen, idxfile, force)
+
+
+def tee_index(
+    stream,
+    gribfile,
+    idxfile=None,
+    outdir=None,
+    force=False,
+    fast=True,
+    stats=None,
+    threads=0,
+):
+    """Copy a stream of GRIB data to `gribfile` and index it in a single pass.
+
+    The stream only needs to support `read`, e.g. a pipe. All bytes (including
+    data between messages) are copied, so offsets in the index refer to
+    `gribfile`.
+    """
+    idxfile = _index_path(gribfile, idxfile, outdir, force)
+    if os.path.exists(gribfile) and not force:
+        raise FileExistsError(f"GRIB file {gribfile} already exists!")
+
+    with open(gribfile, "wb") as tee:
+        gen = scan_gribstream(
+            stream,
+            tee=tee,
+            fast=fast,
+            stats=stats,
+            threads=threads,
+            filename=gribfile,
+        )
+        _write_records(gen, idxfile, force)
+
+
+def iter_index(indexfile, filter_expr=None):
+    """Yield the records of an index file or catalogue matching `filter_expr`.
+
+    For catalogues, the filter is evaluated by SQLite, for plain index files
+    every record is decoded and checked.
+    """
+    if is_catalog(indexfile):
+        with Catalog(indexfile) as catalog:
+            yield from catalog.query(filter_expr)
+    else:
+        conditions = parse_filter(filter_expr)
+        with open(indexfile, "r") as f:
+            for line in f:
+                with span("json_decode"):
+                    meta = json.loads(line)
+                if match_filter(meta, conditions):
+                    yield meta
+
+
+def deduplicate(messages, m2key, duplicate="replace"):
+    return _deduplicate(((m2key(meta), meta) for meta in messages), duplicate)
+
+
+def _deduplicate(keyed, duplicate="replace"):
+    """Deduplicate `(key, meta)` pairs by key, returns the remaining `meta`."""
     index = {}
-    with open(indexfile, "r") as f:
-        for line in f:
-            meta = json.loads(line)
-            tinfo = m2key(meta)
-            if tinfo in index:
-                if duplicate == "replace":
-                    index[tinfo] = meta
-                elif duplicate == "keep":
-                    continue
-                elif duplicate == "error":
-                    raise Exception(f"Duplicate message step: {tinfo}")
-            else:
+    for tinfo, meta in keyed:
+        if tinfo in index:
+            if duplicate == "replace":
                 index[tinfo] = meta
+            elif duplicate == "keep":
+                continue
+            elif duplicate == "error":
+                raise Exception(f"Duplicate message step: {tinfo}")
+        else:
+            index[tinfo] = meta
     return list(index.values())
 
 
+def parse_index(indexfile, m2key, duplicate="replace", filter_expr=None):
+    return deduplicate(iter_index(indexfile, filter_expr), m2key, duplicate)
+
+
+def read_index_tail(indexfile, start=0, filter_expr=None, record=None):
+    """Read the records appended to a plain index file after byte `start`.
+
+    Returns the matching records (converted by `record`, if given) and the
+    position up to which the file has been consumed. An incomplete last line
+    (e.g. one which is currently being written) is left for the next call.
+    """
+    conditions = parse_filter(filter_expr)
+    records = []
+    end = start
+    with open(indexfile, "rb") as f:
+        f.seek(start)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            end += len(line)
+            with span("json_decode"):
+                meta = json.loads(line)
+            if match_filter(meta, conditions):
+                records.append(meta if record is None else record(meta))
+    return records, end
+
+
 def is_value(v):
     if v is None or v == "undef" or v == "unknown":
         return False
@@ -414,7 +1010,40 @@ def is_value(v):
         return True
 
 
-def inspect_grib_indices(messages, magician):
+def magician_keys(messages, magician):
+    """Return `(dataset, varkey, coords)` for each message.
+
+    The keys are computed once per message, using the batch interface
+    `m2keys` of the magician if available.
+    """
+    if hasattr(magician, "m2keys"):
+        keys = magician.m2keys(messages)
+    else:
+        keys = [(magician.m2dataset(m), *magician.m2key(m)) for m in messages]
+
+    # most messages share their dataset and variable
+    shared = {}
+    return [
+        (shared.setdefault(dataset, dataset), shared.setdefault(varkey, varkey), coords)
+        for dataset, varkey, coords in keys
+    ]
+
+
+def _with_keys(messages, magician, keys=None):
+    """Pair messages with their `m2key`, unless precomputed `keys` are given."""
+    if keys is None:
+        return ((msg, magician.m2key(msg)) for msg in messages)
+    else:
+        return zip(messages, keys)
+
+
+def inspect_grib_indices(messages, magician, keys=None, extendable_dimkeys=()):
+    """Collect the variables and coordinates of a dataset.
+
+    `keys` may contain the precomputed `m2key` of each message. Dimensions
+    with a single value are dropped, unless they are listed in
+    `extendable_dimkeys` or the `extendable_dimkeys` of the magician.
+    """
     coords_by_key = defaultdict(lambda: tuple(set() for _ in magician.dimkeys))
     size_by_key = defaultdict(set)
     attrs_by_key = {}
@@ -422,44 +1051,50 @@ def inspect_grib_indices(messages, magician):
     dtype_by_key = {}
     global_attrs = {}
 
-    for msg in messages:
-        varkey, coords = magician.m2key(msg)
+    for msg, (varkey, coords) in _with_keys(messages, magician, keys):
         for existing, new in zip(coords_by_key[varkey], coords):
             existing.add(new)
         size_by_key[varkey].add(msg["array"]["shape"][0])
-        attrs_by_key[varkey] = {k: v for k, v in msg["attrs"].items() if is_value(v)}
-        extra_by_key[varkey] = {k: v for k, v in msg["extra"].items() if is_value(v)}
+        attrs_by_key[varkey] = msg["attrs"]
+        extra_by_key[varkey] = msg["extra"]
         dtype_by_key[varkey] = msg["array"]["dtype"]
         global_attrs = msg["globals"]
 
+    # the attributes of the last message of each variable are used
+    for by_key in (attrs_by_key, extra_by_key):
+        for varkey, attrs in by_key.items():
+            by_key[varkey] = {k: v for k, v in attrs.items() if is_value(v)}
+
     for k, v in size_by_key.items():
         assert len(v) == 1, f"inconsistent shape of {k}"
 
     size_by_key = {k: list(v)[0] for k, v in size_by_key.items()}
 
+    extendable = {*getattr(magician, "extendable_dimkeys", ()), *extendable_dimkeys}
     varinfo = {}
     for varkey, coords in coords_by_key.items():
-        if all(len(c) == 1 for c in coords):
+        varying = [
+            (dim, i, len(values))
+            for i, (dim, values) in enumerate(zip(magician.dimkeys, coords))
+            if len(values) != 1 or dim in extendable
+        ]
+        if not varying:
             dims = ()
             dim_id = ()
             shape = ()
         else:
-            dims, dim_id, shape = map(
-                tuple,
-                zip(
-                    *(
-                        (dim, i, len(coords))
-                        for i, (dim, coords) in enumerate(zip(magician.dimkeys, coords))
-                        if len(coords) != 1
-                    )
-                ),
-            )
+            dims, dim_id, shape = map(tuple, zip(*varying))
 
         info = {
             "dims": dims,
             "shape": shape,
             "dim_id": dim_id,
             "coords": tuple(coords_by_key[varkey][i] for i in dim_id),
+            "fixed": tuple(
+                (i, next(iter(coords[i])))
+                for i in range(len(coords))
+                if i not in dim_id
+            ),
             "dtype": dtype_by_key[varkey],
             "attrs": attrs_by_key[varkey],
             "extra": extra_by_key[varkey],
@@ -499,36 +1134,59 @@ def inspect_grib_indices(messages, magician):
     return global_attrs, coords, varinfo
 
 
-def build_refs(messages, global_attrs, coords, varinfo, magician):
+class RebuildRequired(Exception):
+    """Raised if references can't be extended without a full rebuild."""
+
+
+def build_refs(
+    messages, global_attrs, coords, varinfo, magician, lazy_coords=False, keys=None
+):
+    """Build the reference filesystem of a single dataset.
+
+    With `lazy_coords`, grid coordinates (e.g. `lat` and `lon`) aren't
+    stored but computed from the grid definition when they are read.
+    `keys` may contain the precomputed `m2key` of each message.
+    """
     coords_inv = {
         k: {v: i for i, v in enumerate(vs.values)} for k, vs in coords.items()
     }
 
     refs = {}
-    for msg in messages:
-        key, coord = magician.m2key(msg)
+    stats_by_name = defaultdict(dict)
+    for msg, (key, coord) in _with_keys(messages, magician, keys):
         info = varinfo[key]
         cs = [coord[d] for d in info["dim_id"]]
+        idx = tuple(coords_inv[d][c] for d, c in zip(info["dims"], cs))
         chunk_id = ".".join(
-            itertools.chain(
-                map(str, [coords_inv[d][c] for d, c in zip(info["dims"], cs)]),
-                ["0"] * len(info["data_dims"])
-            )
+            itertools.chain(map(str, idx), ["0"] * len(info["data_dims"]))
         )
         refs[info["name"] + "/" + chunk_id] = [
             msg["filename"],
             msg["_offset"],
             msg["_length"],
         ]
+        if msg.get("stats") is not None:
+            stats_by_name[info["name"]][idx] = msg["stats"]
 
     for varkey, info in varinfo.items():
+        outer_shape = [len(coords[dim]) for dim in info["dims"]]
+        attrs = dict(info["attrs"])
+        if info["name"] in stats_by_name:
+            names = _write_stats(
+                refs,
+                info["name"],
+                info["dims"],
+                outer_shape,
+                stats_by_name[info["name"]],
+            )
+            attrs["ancillary_variables"] = " ".join(names)
         refs[info["name"] + "/.zattrs"] = json.dumps(
             {
-                **info["attrs"],
+                **attrs,
                 "_ARRAY_DIMENSIONS": list(info["dims"]) + list(info["data_dims"]),
             }
         )
-        shape = [len(coords[dim]) for dim in info["dims"]] + list(info["data_shape"])
+        shape = outer_shape + list(info["data_shape"])
         chunks = [1 for _ in info["shape"]] + list(info["data_shape"])
         refs[info["name"] + "/.zarray"] = json.dumps(
             {
@@ -546,6 +1204,9 @@ def build_refs(messages, global_attrs, coords, varinfo, magician):
     for name, cs in coords.items():
         cs, array_meta, compressor = magician.coords_hook(name, cs)
 
+        if lazy_coords and "grid" in cs.encoding:
+            compressor = GridCoordsCodec(coord=name, **cs.encoding["grid"])
+
         if compressor is None:
             compressor_id = None
             data = bytes(cs.values)
@@ -577,10 +1238,78 @@ def build_refs(messages, global_attrs, coords, varinfo, magician):
     return refs
 
 
+def _stats_name(name, stat):
+    return f"{name}_{stat}"
+
+
+def _write_stats(refs, name, dims, shape, stats_by_index, values=None):
+    """Store the message statistics of a variable in (inlined) arrays.
+
+    The arrays span the dimensions across GRIB messages, messages without
+    statistics are NaN. Existing `values` of the arrays may be given to
+    extend them. Returns the names of the arrays.
+    """
+    names = []
+    for stat in STATISTICS:
+        if all(s.get(stat) is None for s in stats_by_index.values()):
+            if values is None or stat not in values:
+                continue
+        data = np.full(shape, np.nan)
+        if values is not None and stat in values:
+            data[tuple(slice(n) for n in values[stat].shape)] = values[stat]
+        for idx, s in stats_by_index.items():
+            if s.get(stat) is not None:
+                data[idx] = s[stat]
+
+        array = _stats_name(name, stat)
+        refs[f"{array}/.zattrs"] = json.dumps(
+            {
+                "long_name": f"{stat} of {name} per message",
+                "_ARRAY_DIMENSIONS": list(dims),
+            }
+        )
+        refs[f"{array}/.zarray"] = json.dumps(
+            {
+                "chunks": list(shape),
+                "compressor": None,
+                "dtype": data.dtype.str,
+                "fill_value": "NaN",
+                "filters": None,
+                "order": "C",
+                "shape": list(shape),
+                "zarr_format": 2,
+            }
+        )
+        refs[f"{array}/{_single_chunk_key(shape)}"] = "base64:" + base64.b64encode(
+            bytes(data)
+        ).decode("ascii")
+        names.append(array)
+    return names
+
+
+def _single_chunk_key(shape):
+    return ".".join("0" for _ in shape) or "0"
+
+
+def _read_stats(refs, array):
+    meta = json.loads(refs[f"{array}/.zarray"])
+    chunk = refs[f"{array}/{_single_chunk_key(meta['shape'])}"]
+    data = base64.b64decode(chunk[len("base64:") :])
+    return np.frombuffer(data, dtype=meta["dtype"]).reshape(meta["shape"])
+
+
 def is_zarr_key(key):
     return key.endswith((".zarray", ".zgroup", ".zattrs"))
 
 
+# Key within `.zmetadata` which keeps the information needed to extend the
+# references incrementally. It is ignored by zarr.
+STATE_KEY = "gribscan"
+
+# dimensions which are kept with a single value for `grib_magic_append`
+APPEND_DIMKEYS = ("posix_time",)
+
+
 def consolidate_metadata(refs):
     return json.dumps(
         {
@@ -616,56 +1345,355 @@ def prepend_path(refs, prefix):
 
     For absolute target paths, the existing target parents are overwritten.
     """
+    def prepend(url):
+        # keep the protocol of e.g. `gzseek://` references
+        protocol, sep, path = url.rpartition("://")
+        return protocol + sep + (pathlib.Path(prefix) / subtree(path)).as_posix()
+
     return {
-        k: [(pathlib.Path(prefix) / subtree(target[0])).as_posix()] + target[1:]
-        if isinstance(target, list) else target
+        k: [prepend(target[0])] + target[1:] if isinstance(target, list) else target
         for k, target in refs.items()
     }
 
 
-def compress_extra_attributes(messages):
-    it = iter(messages)
-    mlast = next(it)
-    yield mlast
-    for m in it:
-        if "extra" in m:
-            lastextra = mlast["extra"]
-            # if extra attribute in this message is large (i.e. a list or dict) and is the same as in previous message, replace it by a reference to the previous one
-            extra = {
-                k: lastextra[k]
-                if k in lastextra and isinstance(v, (list, dict)) and lastextra[k] == v
-                else v
-                for k, v in m["extra"].items()
+def get_state(refs):
+    """Return the build state stored in the references (or `None`)."""
+    return json.loads(refs.get(".zmetadata", "{}")).get(STATE_KEY)
+
+
+def _update_state(refs, **kwargs):
+    zmetadata = json.loads(refs[".zmetadata"])
+    zmetadata[STATE_KEY] = {**zmetadata.get(STATE_KEY, {}), **kwargs}
+    refs[".zmetadata"] = json.dumps(zmetadata)
+
+
+def _dataset_refs(
+    messages,
+    magician,
+    global_prefix,
+    lazy_coords=False,
+    keys=None,
+    extendable_dimkeys=(),
+):
+    with span("inspect_grib_indices", messages=len(messages)):
+        global_attrs, coords, varinfo = inspect_grib_indices(
+            messages, magician, keys, extendable_dimkeys
+        )
+    with span("build_refs", messages=len(messages)):
+        refs = build_refs(
+            messages,
+            global_attrs,
+            coords,
+            varinfo,
+            magician,
+            lazy_coords=lazy_coords,
+            keys=keys,
+        )
+    refs[".zmetadata"] = consolidate_metadata(refs)
+    _update_state(
+        refs,
+        variables={
+            info["name"]: {
+                "varkey": list(varkey),
+                "dim_id": list(info["dim_id"]),
+                "fixed": [list(f) for f in info["fixed"]],
             }
-            m = {**m, "extra": extra}
-        yield m
-        mlast = m
+            for varkey, info in varinfo.items()
+        },
+    )
+    if global_prefix is None:
+        return refs
+    else:
+        return prepend_path(refs, global_prefix)
+
+
+def _read_index(filename, filter_expr=None, record=None):
+    """Return the records of an index file or catalogue and the position read up to."""
+    if is_catalog(filename):
+        # catalogues can't be read incrementally, they are marked by `None`
+        records = iter_index(filename, filter_expr)
+        return [meta if record is None else record(meta) for meta in records], None
+    return read_index_tail(filename, 0, filter_expr, record)
+
+
+def _key_messages(messages, magician):
+    """Return deduplicated `(key, message)` pairs, see `magician_keys`."""
+    return _deduplicate(
+        (key[1:], (key, msg))
+        for key, msg in zip(magician_keys(messages, magician), messages)
+    )
 
 
-def grib_magic(filenames, magician=None, global_prefix=None):
+def _group_by_dataset(keyed):
+    """Group `(key, message)` pairs into `{dataset: (messages, m2keys)}`."""
+    by_dataset = defaultdict(lambda: ([], []))
+    for (dataset, varkey, coords), msg in keyed:
+        messages, keys = by_dataset[dataset]
+        messages.append(msg)
+        keys.append((varkey, coords))
+    return dict(by_dataset)
+
+
+def grib_magic(
+    filenames,
+    magician=None,
+    global_prefix=None,
+    filter_expr=None,
+    lazy_coords=False,
+    extendable_dimkeys=(),
+):
+    """Assemble datasets from index files and/or catalogues.
+
+    Only messages matching `filter_expr` (see `parse_filter`) are considered.
+    See `build_refs` for `lazy_coords` and `inspect_grib_indices` for
+    `extendable_dimkeys`.
+    """
     if magician is None:
         magician = Magician()
 
-    messages = list(
-        compress_extra_attributes(
-            msg
-            for filename in filenames
-            for msg in parse_index(filename, magician.m2key)
+    filenames = [os.fspath(filename) for filename in filenames]
+
+    # compact records, which share equal metadata (e.g. the grid definition)
+    interner = Interner()
+    indexfiles = {}
+    keyed = []
+    for filename in filenames:
+        # the position of the last complete record is where appending resumes
+        records, indexfiles[filename] = _read_index(
+            filename, filter_expr, lambda meta: MessageRecord(meta, interner)
         )
+        keyed.extend(_key_messages(records, magician))
+
+    refs_by_dataset = {}
+    for dataset, (messages, keys) in _group_by_dataset(keyed).items():
+        refs = _dataset_refs(
+            messages, magician, global_prefix, lazy_coords, keys, extendable_dimkeys
+        )
+        _update_state(refs, indexfiles=indexfiles, filter=filter_expr)
+        refs_by_dataset[dataset] = refs
+
+    return refs_by_dataset
+
+
+def _decode_coords(refs, name):
+    meta = json.loads(refs[f"{name}/.zarray"])
+    data = base64.b64decode(refs[f"{name}/0"][len("base64:") :])
+    if meta["compressor"] is not None:
+        data = numcodecs.get_codec(meta["compressor"]).decode(data)
+    return np.frombuffer(data, dtype=meta["dtype"])
+
+
+def _encode_coords(refs, name, values):
+    meta = json.loads(refs[f"{name}/.zarray"])
+    values = np.ascontiguousarray(values, dtype=meta["dtype"])
+    if meta["compressor"] is None:
+        data = bytes(values)
+    else:
+        data = bytes(numcodecs.get_codec(meta["compressor"]).encode(values))
+    refs[f"{name}/.zarray"] = json.dumps(
+        {**meta, "shape": list(values.shape), "chunks": list(values.shape)}
     )
+    refs[f"{name}/0"] = "base64:" + base64.b64encode(data).decode("ascii")
 
-    messages_by_dataset = defaultdict(list)
-    for message in messages:
-        messages_by_dataset[magician.m2dataset(message)].append(message)
 
-    refs_by_dataset = {}
-    for dataset, messages in messages_by_dataset.items():
-        global_attrs, coords, varinfo = inspect_grib_indices(messages, magician)
-        refs = build_refs(messages, global_attrs, coords, varinfo, magician)
-        refs[".zmetadata"] = consolidate_metadata(refs)
-        if global_prefix is None:
-            refs_by_dataset[dataset] = refs
+def extend_refs(refs, messages, magician, global_prefix=None, keys=None):
+    """Add `messages` to the references of an existing dataset in place.
+
+    Coordinates may only grow at their end (e.g. new time steps), variables
+    and dimensions must already be present in `refs`. Otherwise
+    `RebuildRequired` is raised and `refs` is left untouched.
+
+    Note: Coordinate values are compared to the values stored in `refs`,
+    which assumes that `magician.coords_hook` doesn't modify them. `keys` may
+    contain the precomputed `m2key` of each message.
+    """
+    state = get_state(refs)
+    variables = state["variables"]
+    name_by_varkey = {tuple(v["varkey"]): name for name, v in variables.items()}
+    dims_by_array = {
+        key[: -len("/.zattrs")]: json.loads(value)["_ARRAY_DIMENSIONS"]
+        for key, value in refs.items()
+        if key.endswith("/.zattrs")
+    }
+
+    coord_values = {}
+    known_coord_values = {}
+    new_coord_values = defaultdict(set)
+    placed = []
+    for msg, (varkey, coord) in _with_keys(messages, magician, keys):
+        if (name := name_by_varkey.get(tuple(varkey))) is None:
+            raise RebuildRequired(f"new variable {varkey}")
+        var = variables[name]
+        for i, value in var["fixed"]:
+            if coord[i] != value:
+                raise RebuildRequired(
+                    f"{name} gets new values along {magician.dimkeys[i]}"
+                )
+
+        chunks = json.loads(refs[f"{name}/.zarray"])["chunks"]
+        if msg["array"]["shape"][0] != np.prod(chunks[len(var["dim_id"]) :]):
+            raise RebuildRequired(f"inconsistent shape of {name}")
+
+        dims = dims_by_array[name][: len(var["dim_id"])]
+        cs = [coord[i] for i in var["dim_id"]]
+        for dim, c in zip(dims, cs):
+            if dim not in coord_values:
+                coord_values[dim] = _decode_coords(refs, dim)
+                known_coord_values[dim] = set(coord_values[dim].tolist())
+            if c not in known_coord_values[dim]:
+                new_coord_values[dim].add(c)
+        placed.append((name, dims, cs, msg))
+
+    coords_inv = {}
+    extended = {}
+    for dim, values in coord_values.items():
+        new = sorted(new_coord_values.get(dim, ()))
+        if new:
+            if len(values) and new[0] <= values[-1]:
+                raise RebuildRequired(f"new values of {dim} would require reordering")
+            values = np.concatenate([values, np.asarray(new)])
+            extended[dim] = values
+        coords_inv[dim] = {v: i for i, v in enumerate(values.tolist())}
+
+    stats_arrays = {
+        name: {
+            stat: _stats_name(name, stat)
+            for stat in STATISTICS
+            if f"{_stats_name(name, stat)}/.zarray" in refs
+        }
+        for name in variables
+    }
+    for name, dims, cs, msg in placed:
+        for stat, value in (msg.get("stats") or {}).items():
+            if stat in STATISTICS and value is not None:
+                if stat not in stats_arrays[name]:
+                    raise RebuildRequired(f"new statistics of {name}")
+
+    skip = set(extended) | set(variables)
+    skip.update(a for arrays in stats_arrays.values() for a in arrays.values())
+    for array, dims in dims_by_array.items():
+        if array in skip:
+            continue
+        if any(dim in extended for dim in dims):
+            raise RebuildRequired(f"can't extend {array} along {dims}")
+
+    for dim, values in extended.items():
+        _encode_coords(refs, dim, values)
+    for name in variables:
+        dims = dims_by_array[name]
+        if any(dim in extended for dim in dims):
+            meta = json.loads(refs[f"{name}/.zarray"])
+            shape = [
+                len(extended[dim]) if dim in extended else n
+                for dim, n in zip(dims, meta["shape"])
+            ]
+            refs[f"{name}/.zarray"] = json.dumps({**meta, "shape": shape})
+
+    new_refs = {}
+    new_stats = defaultdict(dict)
+    for name, dims, cs, msg in placed:
+        idx = tuple(coords_inv[d][c] for d, c in zip(dims, cs))
+        chunk_id = ".".join(
+            itertools.chain(
+                map(str, idx),
+                ["0"] * (len(dims_by_array[name]) - len(dims)),
+            )
+        )
+        new_refs[name + "/" + chunk_id] = [
+            msg["filename"],
+            msg["_offset"],
+            msg["_length"],
+        ]
+        if msg.get("stats") is not None:
+            new_stats[name][idx] = msg["stats"]
+    if global_prefix is not None:
+        new_refs = prepend_path(new_refs, global_prefix)
+    refs.update(new_refs)
+
+    for name, arrays in stats_arrays.items():
+        if not arrays:
+            continue
+        dims = dims_by_array[next(iter(arrays.values()))]
+        if not (new_stats.get(name) or any(dim in extended for dim in dims)):
+            continue
+        values = {stat: _read_stats(refs, array) for stat, array in arrays.items()}
+        shape = json.loads(refs[f"{name}/.zarray"])["shape"][: len(dims)]
+        _write_stats(refs, name, dims, shape, new_stats.get(name, {}), values)
+
+    refs[".zmetadata"] = consolidate_metadata(refs)
+    _update_state(refs, **state)
+
+
+def grib_magic_append(
+    filenames,
+    refs_by_dataset,
+    magician=None,
+    global_prefix=None,
+    filter_expr=None,
+    lazy_coords=False,
+):
+    """Extend references created by `grib_magic` with new index records.
+
+    Only records which have been added to the index files since the previous
+    build are read. If the new messages can't be appended to the existing
+    coordinates, all datasets are rebuilt from `filenames` and the index
+    files used previously. Datasets built here keep `APPEND_DIMKEYS` even with
+    a single value, such that later values can be appended.
+    """
+    if magician is None:
+        magician = Magician()
+
+    filenames = [os.fspath(filename) for filename in filenames]
+    states = [get_state(refs) or {} for refs in refs_by_dataset.values()]
+    known = {
+        filename: pos
+        for state in states
+        for filename, pos in state.get("indexfiles", {}).items()
+    }
+
+    def rebuild(reason):
+        logger.info(f"rebuilding all datasets: {reason}")
+        return grib_magic(
+            list(dict.fromkeys(list(known) + filenames)),
+            magician=magician,
+            global_prefix=global_prefix,
+            filter_expr=filter_expr,
+            lazy_coords=lazy_coords,
+            extendable_dimkeys=APPEND_DIMKEYS,
+        )
+
+    if not states or not all("indexfiles" in state for state in states):
+        return rebuild("references don't contain a build state")
+    if any(state.get("filter") != filter_expr for state in states):
+        return rebuild("filter expression changed")
+
+    indexfiles = dict(known)
+    messages = []
+    for filename in filenames:
+        start = known.get(filename, 0)
+        if start is None or is_catalog(filename):
+            return rebuild(f"{filename} is a catalogue")
+        if os.path.getsize(filename) < start:
+            return rebuild(f"{filename} got truncated")
+        records, indexfiles[filename] = read_index_tail(filename, start, filter_expr)
+        messages.extend(records)
+
+    refs_by_dataset = {k: dict(refs) for k, refs in refs_by_dataset.items()}
+    keyed = _key_messages(messages, magician)
+    for dataset, (messages, keys) in _group_by_dataset(keyed).items():
+        if dataset in refs_by_dataset:
+            try:
+                extend_refs(
+                    refs_by_dataset[dataset], messages, magician, global_prefix, keys
+                )
+            except RebuildRequired as e:
+                return rebuild(f"{dataset}: {e}")
         else:
-            refs_by_dataset[dataset] = prepend_path(refs, global_prefix)
+            refs_by_dataset[dataset] = _dataset_refs(
+                messages, magician, global_prefix, lazy_coords, keys, APPEND_DIMKEYS
+            )
+
+    for refs in refs_by_dataset.values():
+        _update_state(refs, indexfiles=indexfiles, filter=filter_expr)
 
     return refs_by_dataset
@@ -0,0 +1,31 @@
+import numcodecs
+from numcodecs.compat import ndarray_copy
+
+from . import gridutils as gu
+
+
+class GridCoordsCodec(numcodecs.abc.Codec):
+    """Computes grid coordinates from their grid definition on decode.
+
+    The codec configuration contains the `gridType` and the parameters of the
+    grid (see `gridutils`), so the stored chunk doesn't contain any data.
+    """
+
+    codec_id = "gribscan.gridcoords"
+
+    def __init__(self, gridType, params, coord):
+        self.gridType = gridType
+        self.params = params
+        self.coord = coord
+
+    def encode(self, buf):
+        return b""
+
+    def decode(self, buf, out=None):
+        grid = gu.grids[self.gridType]
+        data = grid.compute_coords(**self.params)[self.coord].values
+
+        if out is not None:
+            return ndarray_copy(data, out)
+        else:
+            return data
@@ -165,4 +165,11 @@ def params_for_gridType(gridType):
 
 def varinfo2coords(varinfo):
     grid = grids[varinfo["attrs"]["gridType"]]
-    return grid.compute_coords(**{k: varinfo["extra"][k] for k in grid.params})
+    params = {k: varinfo["extra"][k] for k in grid.params}
+    coords = grid.compute_coords(**params)
+
+    # remember the grid definition, so coordinates can be recomputed on read
+    for name, coord in getattr(coords, "variables", {}).items():
+        coord.encoding["grid"] = {"gridType": grid.gridType, "params": params}
+
+    return coords
@@ -0,0 +1,458 @@
+"""Random access to the GRIB messages of gzip-compressed files.
+
+Deflate streams can't be decompressed from an arbitrary offset. Like zlib's
+`zran.c` example, a *seek table* is created while a file is decompressed for
+indexing: every `spacing` uncompressed bytes, at the next boundary of a
+deflate block, the position in the compressed file (including the bit within
+its byte) and the last 32 KiB of uncompressed data (the history the following
+blocks may refer to) are stored as a seek point.
+
+The index records of `file.grib.gz` contain offsets in uncompressed
+coordinates and refer to `gzseek://file.grib.gz`. The `gzseek` filesystem
+reads the seek table `file.grib.gz.gzseek` and decompresses ranges starting at
+the nearest preceding seek point, such that a message is read by
+decompressing at most `spacing` bytes in addition to the message itself.
+
+Python's `zlib` module can neither stop at block boundaries nor start
+decompressing within a byte, the corresponding functions of the zlib library
+are used via `ctypes`.
+"""
+import bisect
+import ctypes
+import ctypes.util
+import itertools
+import os
+import posixpath
+import struct
+import uuid
+import zlib
+from collections import namedtuple
+
+import fsspec
+from fsspec.spec import AbstractBufferedFile, AbstractFileSystem
+
+import logging
+
+logger = logging.getLogger("gribscan")
+
+PROTOCOL = "gzseek"
+SUFFIX = ".gzseek"  # of seek table files
+SPACING = 4 * 1024 * 1024  # uncompressed bytes between seek points
+WINDOW = 32 * 1024  # maximum distance of back-references in deflate streams
+CHUNKSIZE = 1024 * 1024  # compressed bytes read at once
+
+Z_OK = 0
+Z_STREAM_END = 1
+Z_NEED_DICT = 2
+Z_BUF_ERROR = -5
+Z_NO_FLUSH = 0
+Z_BLOCK = 5
+
+
+class _ZStream(ctypes.Structure):
+    _fields_ = [
+        ("next_in", ctypes.c_void_p),
+        ("avail_in", ctypes.c_uint),
+        ("total_in", ctypes.c_ulong),
+        ("next_out", ctypes.c_void_p),
+        ("avail_out", ctypes.c_uint),
+        ("total_out", ctypes.c_ulong),
+        ("msg", ctypes.c_char_p),
+        ("state", ctypes.c_void_p),
+        ("zalloc", ctypes.c_void_p),
+        ("zfree", ctypes.c_void_p),
+        ("opaque", ctypes.c_void_p),
+        ("data_type", ctypes.c_int),
+        ("adler", ctypes.c_ulong),
+        ("reserved", ctypes.c_ulong),
+    ]
+
+
+_LIBZ = None
+
+
+def _libz():
+    global _LIBZ
+    if _LIBZ is None:
+        name = ctypes.util.find_library("z") or ctypes.util.find_library("zlib1")
+        if name is None:
+            raise OSError("the zlib library is required for gzip-compressed files")
+        lib = ctypes.CDLL(name)
+        stream = ctypes.POINTER(_ZStream)
+        lib.zlibVersion.restype = ctypes.c_char_p
+        lib.inflateInit2_.argtypes = [stream, ctypes.c_int, ctypes.c_char_p, ctypes.c_int]
+        lib.inflate.argtypes = [stream, ctypes.c_int]
+        lib.inflateEnd.argtypes = [stream]
+        lib.inflateReset.argtypes = [stream]
+        lib.inflatePrime.argtypes = [stream, ctypes.c_int, ctypes.c_int]
+        lib.inflateSetDictionary.argtypes = [stream, ctypes.c_char_p, ctypes.c_uint]
+        _LIBZ = lib
+    return _LIBZ
+
+
+class _Inflater:
+    """Raw deflate decompressor, which can stop at block boundaries."""
+
+    def __init__(self):
+        self._lib = _libz()
+        self._stream = _ZStream()
+        self._check(
+            self._lib.inflateInit2_(
+                ctypes.byref(self._stream),
+                -15,
+                self._lib.zlibVersion(),
+                ctypes.sizeof(_ZStream),
+            )
+        )
+        self._output = ctypes.create_string_buffer(CHUNKSIZE)
+
+    def __del__(self):
+        self._lib.inflateEnd(ctypes.byref(self._stream))
+
+    def _check(self, ret):
+        if ret < 0 and ret != Z_BUF_ERROR:
+            msg = self._stream.msg.decode() if self._stream.msg else f"error {ret}"
+            raise zlib.error(f"error while decompressing data: {msg}")
+        return ret
+
+    def reset(self, bits=0, value=0, window=b""):
+        """Start a new stream, at the given bits of a byte and with the given history."""
+        self._check(self._lib.inflateReset(ctypes.byref(self._stream)))
+        self.feed(b"")
+        if bits:
+            self._check(
+                self._lib.inflatePrime(ctypes.byref(self._stream), bits, value)
+            )
+        if window:
+            self._check(
+                self._lib.inflateSetDictionary(
+                    ctypes.byref(self._stream), window, len(window)
+                )
+            )
+
+    def feed(self, data):
+        self._input = ctypes.c_char_p(data)  # keeps `data` alive
+        self._stream.next_in = ctypes.cast(self._input, ctypes.c_void_p)
+        self._stream.avail_in = len(data)
+
+    @property
+    def avail_in(self):
+        return self._stream.avail_in
+
+    @property
+    def block_boundary(self):
+        """`True` at the end of a block, which isn't the last one of the stream."""
+        return (self._stream.data_type & 0xC0) == 0x80
+
+    @property
+    def bits(self):
+        """Number of unused bits of the last consumed byte."""
+        return self._stream.data_type & 7
+
+    def inflate(self, size, flush=Z_NO_FLUSH):
+        """Decompress up to `size` bytes, returns the data and `True` at the end of the stream."""
+        size = min(size, len(self._output))
+        self._stream.next_out = ctypes.addressof(self._output)
+        self._stream.avail_out = size
+        ret = self._check(self._lib.inflate(ctypes.byref(self._stream), flush))
+        if ret == Z_NEED_DICT:
+            raise zlib.error("error while decompressing data: dictionary required")
+        return self._output.raw[: size - self._stream.avail_out], ret == Z_STREAM_END
+
+
+SeekPoint = namedtuple("SeekPoint", ["uncompressed", "compressed", "bits", "window"])
+
+_MAGIC = b"GZSEEK\x00\x01"
+# magic, number of points, uncompressed size, compressed size
+_HEADER = struct.Struct("<8sQQQ")
+# uncompressed offset, compressed offset, bits, length of the compressed window
+_POINT = struct.Struct("<QQBI")
+
+
+class SeekTable:
+    """Seek points of a gzip file and the sizes of its compressed and uncompressed data."""
+
+    def __init__(self, points, size, compressed_size):
+        self.points = points
+        self.size = size
+        self.compressed_size = compressed_size
+        self._offsets = [point.uncompressed for point in points]
+
+    def find(self, offset):
+        """Return the last seek point at or before the uncompressed `offset`."""
+        return self.points[max(bisect.bisect_right(self._offsets, offset) - 1, 0)]
+
+    def tobytes(self):
+        windows = [zlib.compress(point.window) for point in self.points]
+        return b"".join(
+            [
+                _HEADER.pack(_MAGIC, len(self.points), self.size, self.compressed_size),
+                *(
+                    _POINT.pack(p.uncompressed, p.compressed, p.bits, len(w))
+                    for p, w in zip(self.points, windows)
+                ),
+                *windows,
+            ]
+        )
+
+    @classmethod
+    def frombytes(cls, data):
+        magic, npoints, size, compressed_size = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ValueError("not a gzip seek table")
+        pos = _HEADER.size + npoints * _POINT.size
+        points = []
+        for uncompressed, compressed, bits, length in _POINT.iter_unpack(
+            data[_HEADER.size : pos]
+        ):
+            window = zlib.decompress(data[pos : pos + length])
+            points.append(SeekPoint(uncompressed, compressed, bits, window))
+            pos += length
+        return cls(points, size, compressed_size)
+
+
+def _header_size(f, pos):
+    """Return the size of the gzip member header at `pos` (or `None`)."""
+    f.seek(pos)
+    header = f.read(10)
+    if len(header) < 10 or header[:3] != b"\x1f\x8b\x08":
+        return None
+    flags = header[3]
+    size = 10
+    if flags & 4:  # FEXTRA
+        f.seek(pos + size)
+        size += 2 + int.from_bytes(f.read(2), "little")
+    for flag in (8, 16):  # FNAME, FCOMMENT are zero-terminated
+        if flags & flag:
+            f.seek(pos + size)
+            while (idx := (data := f.read(4096)).find(b"\0")) < 0:
+                if not data:
+                    return None
+                size += len(data)
+            size += idx + 1
+    if flags & 2:  # FHCRC
+        size += 2
+    return size
+
+
+class GzipStream:
+    """Forward-only reader of the uncompressed data of a gzip file.
+
+    Decompression starts at the beginning of the (possibly multi-member) file
+    or at a seek `point`. With `spacing`, seek points are created while
+    reading, see `seek_table`. Starting at the beginning, the checksums of
+    the members are verified.
+    """
+
+    def __init__(self, f, point=None, spacing=None):
+        self.f = f
+        self.spacing = spacing
+        self.points = []
+        self.eof = False
+        self._inflater = _Inflater()
+        self._window = bytearray()
+        self._verify = point is None
+        self._crc = None
+        if point is None:
+            self.pos = 0
+            if not self._start_member(0):
+                raise ValueError("not a gzip file")
+        else:
+            self.pos = point.uncompressed
+            value = 0
+            if point.bits:
+                f.seek(point.compressed - 1)
+                value = f.read(1)[0] >> (8 - point.bits)
+            self._inflater.reset(point.bits, value, point.window)
+            self._next_in = point.compressed
+
+    def _add_point(self, compressed, bits):
+        if self.points and self.pos - self.points[-1].uncompressed < self.spacing:
+            return
+        window = bytes(self._window)
+        self.points.append(SeekPoint(self.pos, compressed, bits, window))
+
+    def _start_member(self, offset):
+        if (size := _header_size(self.f, offset)) is None:
+            if offset > 0:
+                self.f.seek(offset)
+                if self.f.read(1):
+                    logger.warning(f"ignoring trailing data after gzip member at {offset}")
+            self.eof = True
+            return False
+        self._inflater.reset()
+        self._next_in = offset + size
+        self._crc = 0 if self._verify else None
+        self._member_start = self.pos
+        if self.spacing:
+            self._window.clear()
+            self._add_point(self._next_in, 0)
+        return True
+
+    def _end_member(self):
+        end = self._next_in - self._inflater.avail_in
+        self.f.seek(end)
+        trailer = self.f.read(8)
+        if len(trailer) < 8:
+            raise EOFError("gzip member ends without trailer")
+        if self._crc is not None:
+            crc, size = struct.unpack("<II", trailer)
+            if crc != self._crc or size != (self.pos - self._member_start) & 0xFFFFFFFF:
+                raise zlib.error(f"checksum mismatch of gzip member ending at {end}")
+        self._start_member(end + 8)
+
+    def read(self, n):
+        """Read up to `n` bytes, less only at the end of the data."""
+        flush = Z_BLOCK if self.spacing else Z_NO_FLUSH
+        out = bytearray()
+        while len(out) < n and not self.eof:
+            if not self._inflater.avail_in:
+                self.f.seek(self._next_in)
+                data = self.f.read(CHUNKSIZE)
+                if not data:
+                    raise EOFError("compressed file ended before the end of the stream")
+                self._inflater.feed(data)
+                self._next_in += len(data)
+
+            data, end = self._inflater.inflate(n - len(out), flush)
+            out += data
+            self.pos += len(data)
+            if self._crc is not None:
+                self._crc = zlib.crc32(data, self._crc)
+            if self.spacing:
+                self._window += data
+                del self._window[:-WINDOW]
+
+            if end:
+                self._end_member()
+            elif self.spacing and self._inflater.block_boundary:
+                compressed = self._next_in - self._inflater.avail_in
+                self._add_point(compressed, self._inflater.bits)
+        return bytes(out)
+
+    def skip(self, n):
+        while n > 0 and not self.eof:
+            n -= len(self.read(min(n, CHUNKSIZE)))
+
+    def seek_table(self):
+        """Return the table of the seek points created while reading the entire file."""
+        if not self.eof:
+            raise ValueError("the seek table is only complete at the end of the file")
+        self.f.seek(0, 2)
+        return SeekTable(self.points, self.pos, self.f.tell())
+
+
+def seek_table_path(path, table_dir=None):
+    """Return the path of the seek table of the gzip file at `path`."""
+    if table_dir is None:
+        return path + SUFFIX
+    return posixpath.join(table_dir, posixpath.basename(path) + SUFFIX)
+
+
+def scan_gzipfile(filelike, table, spacing=None, fast=True, stats=None, **kwargs):
+    """Scan the GRIB messages of a gzip-compressed file and write its seek table.
+
+    The records contain offsets in uncompressed coordinates. The seek table
+    with seek points every `spacing` (default `SPACING`) bytes is written to
+    the path `table` after all records have been yielded.
+    """
+    from .gribscan import scan_gribstream
+
+    stream = GzipStream(filelike, spacing=spacing or SPACING)
+    yield from scan_gribstream(stream, fast=fast, stats=stats, **kwargs)
+    while stream.read(CHUNKSIZE):
+        pass  # complete the seek table and verify the checksum
+
+    seek_table = stream.seek_table()
+    tmp = f"{table}.{uuid.uuid4().hex}.partial"
+    with open(tmp, "wb") as f:
+        f.write(seek_table.tobytes())
+    os.replace(tmp, table)
+    logger.info(
+        f"wrote {len(seek_table.points)} seek points of {seek_table.size} bytes to {table}"
+    )
+
+
+class GzipSeekFileSystem(AbstractFileSystem):
+    """Read-only access to the uncompressed data of gzip files with seek tables.
+
+    Paths refer to the compressed files on the `target_protocol` filesystem,
+    seek tables are read from `table_dir` or next to the compressed files.
+    """
+
+    protocol = PROTOCOL
+
+    def __init__(self, table_dir=None, target_protocol=None, target_options=None, **kwargs):
+        super().__init__(**kwargs)
+        self.table_dir = table_dir
+        self.fs = fsspec.filesystem(target_protocol or "file", **(target_options or {}))
+        self._tables = {}
+
+    def _table(self, path):
+        if path not in self._tables:
+            table_path = seek_table_path(path, self.table_dir)
+            table = SeekTable.frombytes(self.fs.cat_file(table_path))
+            if table.compressed_size != self.fs.size(path):
+                raise ValueError(f"seek table {table_path} doesn't match {path}")
+            self._tables[path] = table
+        return self._tables[path]
+
+    def info(self, path, **kwargs):
+        path = self._strip_protocol(path)
+        return {"name": path, "size": self._table(path).size, "type": "file"}
+
+    def _range(self, table, start, end):
+        start, end = slice(start, end).indices(table.size)[:2]
+        return start, max(start, end)
+
+    def cat_file(self, path, start=None, end=None, **kwargs):
+        return self.cat_ranges([path], [start], [end], on_error="raise")[0]
+
+    def cat_ranges(self, paths, starts, ends, max_gap=None, on_error="return", **kwargs):
+        """Read the ranges of each file in ascending order.
+
+        Decompression continues from the end of the previous range, unless
+        the next range can be reached faster from a seek point.
+        """
+        paths = [self._strip_protocol(path) for path in paths]
+        results = [None] * len(paths)
+        order = sorted(
+            range(len(paths)), key=lambda i: (paths[i], starts[i] or 0, ends[i] or 0)
+        )
+        for path, group in itertools.groupby(order, key=lambda i: paths[i]):
+            group = list(group)
+            try:
+                table = self._table(path)
+                f = self.fs.open(path, "rb")
+            except Exception as e:
+                if on_error == "raise":
+                    raise
+                for i in group:
+                    results[i] = e
+                continue
+            with f:
+                stream = None
+                for i in group:
+                    try:
+                        start, end = self._range(table, starts[i], ends[i])
+                        point = table.find(start)
+                        if stream is None or not point.uncompressed <= stream.pos <= start:
+                            stream = GzipStream(f, point)
+                        stream.skip(start - stream.pos)
+                        results[i] = stream.read(end - start)
+                    except Exception as e:
+                        if on_error == "raise":
+                            raise
+                        results[i] = e
+                        stream = None
+        return results
+
+    def _open(self, path, mode="rb", block_size="default", **kwargs):
+        if mode != "rb":
+            raise NotImplementedError("gzseek files are read-only")
+        return GzipSeekFile(self, path, mode, block_size, **kwargs)
+
+
+class GzipSeekFile(AbstractBufferedFile):
+    def _fetch_range(self, start, end):
+        return self.fs.cat_file(self.path, start, end)
@@ -5,6 +5,10 @@ from .gridutils import varinfo2coords
 
 
 class MagicianBase:
+    # dimensions which are kept even with a single value, builds for
+    # `grib_magic_append` additionally keep `APPEND_DIMKEYS`
+    extendable_dimkeys = ()
+
     def variable_hook(self, key, info):
         ...
 
@@ -26,6 +30,14 @@ class MagicianBase:
             else "atm2d"
         )
 
+    def m2keys(self, messages):
+        """Return `(dataset, varkey, coords)` for each of a batch of messages.
+
+        This may be overridden to key all messages at once (e.g. using numpy),
+        it has to be consistent with `m2dataset` and `m2key`.
+        """
+        return [(self.m2dataset(meta), *self.m2key(meta)) for meta in messages]
+
     def extra_coords(self, varinfo):
         return {}
 
@@ -0,0 +1,272 @@
+"""Array-backed references to GRIB messages.
+
+The references created by `grib_magic` contain a `[filename, offset, length]`
+list per message, keyed by chunk keys like `"t/3.17.0"`. With millions of
+messages, these entries need hundreds of bytes each. A `ChunkManifest` keeps
+the references of each array in numpy arrays shaped like its chunk grid (file
+id, offset and length, 20 bytes per chunk) and resolves chunk keys by
+indexing these arrays. The `ManifestStore` serves a manifest to zarr:
+
+>>> manifest = ChunkManifest.from_refs("dataset.json")
+>>> ds = xr.open_zarr(ManifestStore(manifest), consolidated=False)
+"""
+import asyncio
+import base64
+import json
+import math
+from collections.abc import Mapping
+
+import fsspec
+import numpy as np
+from zarr.abc.store import (
+    OffsetByteRequest,
+    RangeByteRequest,
+    Store,
+    SuffixByteRequest,
+)
+
+
+class ChunkManifest(Mapping):
+    """Read-only mapping of references with array-backed chunk references.
+
+    `metadata` maps all other keys (e.g. `.zarray` or inlined coordinates) to
+    their references, `files` lists the referenced filenames and `arrays` maps
+    array names to `(file_ids, offsets, lengths)`, where missing chunks have a
+    file id of -1.
+    """
+
+    def __init__(self, metadata, files, arrays, separators=None):
+        self.metadata = metadata
+        self.files = list(files)
+        self.arrays = arrays
+        self.separators = separators or {}
+
+    @classmethod
+    def from_refs(cls, refs):
+        """Create a manifest from references (a dict or the path of a JSON file)."""
+        if not isinstance(refs, Mapping):
+            with fsspec.open(refs, "r") as f:
+                refs = json.load(f)
+
+        grids = {}
+        separators = {}
+        for key, value in refs.items():
+            if key.endswith("/.zarray"):
+                name = key[: -len("/.zarray")]
+                meta = json.loads(value)
+                grids[name] = tuple(
+                    math.ceil(n / c) for n, c in zip(meta["shape"], meta["chunks"])
+                )
+                separators[name] = meta.get("dimension_separator", ".")
+
+        metadata = {}
+        file_ids = {}
+        arrays = {}
+        for key, value in refs.items():
+            name, _, chunk = key.rpartition("/")
+            idx = None
+            if name in grids and isinstance(value, list) and len(value) == 3:
+                idx = _chunk_index(chunk, separators[name], grids[name])
+            if idx is None:
+                metadata[key] = value
+                continue
+
+            if name not in arrays:
+                arrays[name] = (
+                    np.full(grids[name], -1, dtype="i4"),
+                    np.zeros(grids[name], dtype="u8"),
+                    np.zeros(grids[name], dtype="u8"),
+                )
+            ids, offsets, lengths = arrays[name]
+            filename, offset, length = value
+            ids[idx] = file_ids.setdefault(filename, len(file_ids))
+            offsets[idx] = offset
+            lengths[idx] = length
+
+        return cls(metadata, file_ids, arrays, separators)
+
+    def chunk_ref(self, key):
+        """Return `(filename, offset, length)` of a chunk key or `None`."""
+        name, _, chunk = key.rpartition("/")
+        try:
+            ids, offsets, lengths = self.arrays[name]
+            idx = tuple(map(int, chunk.split(self.separators.get(name, "."))))
+            if len(idx) != ids.ndim or min(idx, default=0) < 0:
+                return None
+            file_id = ids.item(idx)
+        except (KeyError, ValueError, IndexError):
+            return None
+        if file_id < 0:
+            return None
+        return self.files[file_id], offsets.item(idx), lengths.item(idx)
+
+    def __getitem__(self, key):
+        if key in self.metadata:
+            return self.metadata[key]
+        if (ref := self.chunk_ref(key)) is None:
+            raise KeyError(key)
+        return list(ref)
+
+    def __contains__(self, key):
+        return key in self.metadata or self.chunk_ref(key) is not None
+
+    def _chunk_keys(self, names=None):
+        for name in self.arrays if names is None else names:
+            ids = self.arrays[name][0]
+            separator = self.separators.get(name, ".")
+            for idx in zip(*np.nonzero(ids >= 0)):
+                yield f"{name}/" + separator.join(map(str, idx))
+
+    def __iter__(self):
+        yield from self.metadata
+        yield from self._chunk_keys()
+
+    def __len__(self):
+        return len(self.metadata) + sum(
+            int(np.count_nonzero(ids >= 0)) for ids, _, _ in self.arrays.values()
+        )
+
+    @property
+    def nbytes(self):
+        """Memory used by the chunk references."""
+        return sum(a.nbytes for arrays in self.arrays.values() for a in arrays)
+
+
+def _chunk_index(chunk, separator, grid):
+    parts = chunk.split(separator)
+    if len(parts) != len(grid) or not all(p.isdigit() for p in parts):
+        return None
+    idx = tuple(map(int, parts))
+    if any(i >= n for i, n in zip(idx, grid)):
+        return None
+    return idx
+
+
+def _byte_range(size, byte_range):
+    """Resolve a zarr byte request into `(start, end)` within `size` bytes."""
+    if byte_range is None:
+        return 0, size
+    elif isinstance(byte_range, RangeByteRequest):
+        return min(byte_range.start, size), min(byte_range.end, size)
+    elif isinstance(byte_range, OffsetByteRequest):
+        return min(byte_range.offset, size), size
+    elif isinstance(byte_range, SuffixByteRequest):
+        return max(size - byte_range.suffix, 0), size
+    raise TypeError(f"unsupported byte range: {byte_range}")
+
+
+def _inline_bytes(value):
+    if isinstance(value, bytes):
+        return value
+    if value.startswith("base64:"):
+        return base64.b64decode(value[len("base64:") :])
+    return value.encode()
+
+
+class ManifestStore(Store):
+    """Read-only zarr store serving a `ChunkManifest`.
+
+    Chunks are read from the referenced files using fsspec.
+    """
+
+    supports_writes = False
+    supports_deletes = False
+    supports_partial_writes = False
+    supports_listing = True
+
+    def __init__(self, manifest, storage_options=None):
+        super().__init__(read_only=True)
+        if not isinstance(manifest, ChunkManifest):
+            manifest = ChunkManifest.from_refs(manifest)
+        self.manifest = manifest
+        self.storage_options = storage_options or {}
+        self._filesystems = {}
+
+    def __eq__(self, other):
+        return isinstance(other, type(self)) and self.manifest is other.manifest
+
+    def __hash__(self):
+        # consistent with `__eq__`, stores serving the same manifest are equal
+        return hash((type(self), id(self.manifest)))
+
+    def _filesystem(self, filename):
+        if filename not in self._filesystems:
+            self._filesystems[filename] = fsspec.core.url_to_fs(
+                filename, **self.storage_options
+            )
+        return self._filesystems[filename]
+
+    async def _read(self, filename, start, end):
+        fs, path = self._filesystem(filename)
+        if fs.async_impl:
+            return await fs._cat_file(path, start=start, end=end)
+        return await asyncio.to_thread(fs.cat_file, path, start=start, end=end)
+
+    async def get(self, key, prototype, byte_range=None):
+        if key in self.manifest.metadata:
+            value = self.manifest.metadata[key]
+            if isinstance(value, list):
+                filename, *ref = value
+                offset, length = ref if ref else (0, None)
+                if length is None:
+                    fs, path = self._filesystem(filename)
+                    length = (await asyncio.to_thread(fs.info, path))["size"]
+                start, end = _byte_range(length, byte_range)
+                data = await self._read(filename, offset + start, offset + end)
+            else:
+                data = _inline_bytes(value)
+                start, end = _byte_range(len(data), byte_range)
+                data = data[start:end]
+            return prototype.buffer.from_bytes(data)
+
+        if (ref := self.manifest.chunk_ref(key)) is None:
+            return None
+        filename, offset, length = ref
+        start, end = _byte_range(length, byte_range)
+        data = await self._read(filename, offset + start, offset + end)
+        return prototype.buffer.from_bytes(data)
+
+    async def get_partial_values(self, prototype, key_ranges):
+        return await asyncio.gather(
+            *(self.get(key, prototype, byte_range) for key, byte_range in key_ranges)
+        )
+
+    async def exists(self, key):
+        return key in self.manifest
+
+    async def set(self, key, value):
+        self._check_writable()
+
+    async def delete(self, key):
+        self._check_writable()
+
+    async def list(self):
+        for key in self.manifest:
+            yield key
+
+    async def list_prefix(self, prefix):
+        for key in self.manifest:
+            if key.startswith(prefix):
+                yield key
+
+    async def list_dir(self, prefix):
+        prefix = prefix.rstrip("/")
+        prefix = prefix + "/" if prefix else ""
+        seen = set()
+        for key in self.manifest.metadata:
+            if key.startswith(prefix):
+                child = key[len(prefix) :].split("/")[0]
+                if child not in seen:
+                    seen.add(child)
+                    yield child
+        name = prefix.rstrip("/")
+        if name in self.manifest.arrays:
+            for key in self.manifest._chunk_keys([name]):
+                yield key[len(prefix) :]
+        else:
+            for array in self.manifest.arrays:
+                if array.startswith(prefix):
+                    child = array[len(prefix) :].split("/")[0]
+                    if child not in seen:
+                        seen.add(child)
+                        yield child
@@ -0,0 +1,226 @@
+"""Multi-resolution overviews of datasets on HEALPix grids.
+
+In the nested ordering of HEALPix, the 4 pixels at Nside which make up a
+pixel at Nside / 2 are stored next to each other, such that coarser levels
+are computed by averaging groups of 4 consecutive values. Each message is
+decoded once and averaged down to all levels. Every level is written to a
+group `nside{Nside}` of a zarr store, which contains the coarsened variables,
+the `lat` and `lon` of the level and the remaining (non-horizontal) arrays of
+the dataset. Thus, global maps can be drawn without decoding the messages at
+full resolution.
+"""
+import functools
+import json
+import multiprocessing as mp
+import pathlib
+
+import eccodes
+import fsspec
+import healpy as hp
+import numcodecs
+import numpy as np
+import zarr
+from zarr.storage import FsspecStore
+
+from .export import PROGRESS_FILE, copy_array
+from .gridutils import HEALPix
+from .rawgribcodec import RawGribCodec
+from .refs import grib_arrays, load_refs, output_chunks, plan_blocks, read_messages
+
+import logging
+
+logger = logging.getLogger("gribscan")
+
+MAX_CHUNKSIZE = 4**9  # pixels per chunk along the horizontal dimension
+
+
+def overview_nsides(nside, min_nside=1):
+    """Return the Nside of all overview levels of a HEALPix grid."""
+    if nside < 1 or nside & (nside - 1):
+        raise ValueError(f"Nside must be a power of 2 for coarsening, got {nside}")
+    nsides = []
+    while nside > max(min_nside, 1):
+        nside //= 2
+        nsides.append(nside)
+    return nsides
+
+
+def level_group(nside):
+    return f"nside{nside}"
+
+
+@functools.lru_cache(maxsize=4)
+def _ring_to_nested(nside):
+    return hp.nest2ring(nside, np.arange(hp.nside2npix(nside)))
+
+
+def coarsen(values, nlevels, fill_value=None):
+    """Average nested HEALPix `values` (along the last axis) to `nlevels` coarser levels.
+
+    Returns one array per level, each of a quarter of the size of the
+    previous one. NaN and `fill_value` are treated as missing, pixels without
+    any valid values become NaN.
+    """
+    valid = ~np.isnan(values)
+    if fill_value is not None:
+        valid &= values != fill_value
+    sums = np.where(valid, values, 0.0)
+    counts = valid.astype(np.int32)
+
+    levels = []
+    for _ in range(nlevels):
+        sums = sums.reshape(*sums.shape[:-1], -1, 4).sum(axis=-1)
+        counts = counts.reshape(*counts.shape[:-1], -1, 4).sum(axis=-1)
+        with np.errstate(invalid="ignore"):
+            levels.append(sums / counts)
+    return levels
+
+
+def _grid_definition(ref):
+    """Return `(Nside, orderingConvention)` of the referenced HEALPix message."""
+    ((_, message),) = read_messages([ref])
+    mid = eccodes.codes_new_from_message(message)
+    try:
+        return (
+            eccodes.codes_get(mid, "Nside"),
+            eccodes.codes_get(mid, "orderingConvention"),
+        )
+    finally:
+        eccodes.codes_release(mid)
+
+
+def _overview_block(task):
+    output, name, block, entries, info, nsides, ordering = task
+    shape, fill_value = info["shape"], info["fill_value"]
+    group = zarr.open_group(output, mode="r+")
+    arrays = [group[f"{level_group(nside)}/{name}"] for nside in nsides]
+    nouter = len(block)
+    out_chunks = arrays[0].chunks[:nouter]
+
+    slices = tuple(
+        slice(b * c, min((b + 1) * c, n))
+        for b, c, n in zip(block, out_chunks, shape)
+    )
+    data = np.full(
+        [s.stop - s.start for s in slices] + list(shape[nouter:]),
+        np.nan if fill_value is None else fill_value,
+        dtype="f8",
+    )
+
+    codec = RawGribCodec()
+    for i, message in read_messages([ref for _, ref in entries]):
+        data[entries[i][0]] = codec.decode(message).reshape(shape[nouter:])
+    if ordering != "nested":
+        data = data[..., _ring_to_nested(nsides[0] * 2)]
+
+    for array, values in zip(arrays, coarsen(data, len(nsides), fill_value)):
+        array[slices] = values
+    return name, list(block)
+
+
+def write_overviews(
+    refs, output, min_nside=1, chunks=None, nprocs=1, compressor=None, dtype="f4"
+):
+    """Write coarser levels of the HEALPix variables of a dataset into a zarr store.
+
+    `refs` is a dataset assembled by `grib_magic`. Levels are written down to
+    `min_nside` as groups named by `level_group`, using the nested ordering.
+    `chunks` maps dimension names to output chunk sizes, by default each
+    message becomes a chunk. An unfinished run with the same `output` is
+    resumed.
+    """
+    refs = load_refs(refs)
+    chunks = chunks or {}
+    compressor = compressor or numcodecs.Blosc("zstd", clevel=5)
+
+    fs = fsspec.filesystem("reference", fo=refs)
+    src = zarr.open_group(
+        FsspecStore.from_mapper(fs.get_mapper(), read_only=True), mode="r"
+    )
+
+    arrays = grib_arrays(refs)
+    variables = {}
+    for name, info in arrays.items():
+        dims = info["attrs"]["_ARRAY_DIMENSIONS"]
+        healpix = info["attrs"].get("gridType") == "healpix"
+        if not healpix or info["nouter"] != len(dims) - 1:
+            logger.info(f"skipping {name}, which isn't on a HEALPix grid")
+            continue
+        out_chunks = output_chunks(dims, info["shape"], info["nouter"], chunks)
+        blocks = plan_blocks(refs, name, info, out_chunks[:-1])
+        if blocks:
+            _, ref = next(iter(blocks.values()))[0]
+            variables[name] = (info, out_chunks, blocks, *_grid_definition(ref))
+
+    grids = {
+        (info["attrs"]["_ARRAY_DIMENSIONS"][-1], nside)
+        for info, _, _, nside, _ in variables.values()
+    }
+    if not grids:
+        raise ValueError("the dataset has no variables on a HEALPix grid")
+    if len(grids) != 1:
+        raise ValueError(f"expected variables on one HEALPix grid, found {len(grids)}")
+    ((hdim, nside),) = grids
+    nsides = overview_nsides(nside, min_nside)
+
+    progress_file = pathlib.Path(output) / PROGRESS_FILE
+    done = set()
+    if progress_file.exists():
+        with open(progress_file) as f:
+            done = {(name, tuple(block)) for name, block in map(json.loads, f)}
+        logger.info(f"resuming overviews, {len(done)} blocks are already done")
+        dst = zarr.open_group(output, mode="r+", zarr_format=2)
+    else:
+        dst = zarr.open_group(output, mode="w", zarr_format=2)
+
+    if not done:
+        for level in nsides:
+            group = dst.create_group(level_group(level), overwrite=True)
+            group.attrs.update(
+                {**src.attrs, "healpix_nside": level, "healpix_order": "nest"}
+            )
+            npix = 12 * level**2
+            hchunks = min(npix, chunks.get(hdim, MAX_CHUNKSIZE))
+
+            coords = HEALPix.compute_coords("nested", level)
+            for coord, variable in coords.variables.items():
+                group.create_array(
+                    coord,
+                    data=variable.values,
+                    chunks=(hchunks,),
+                    compressors=compressor,
+                    fill_value=None,
+                    attributes={**variable.attrs, "_ARRAY_DIMENSIONS": [hdim]},
+                )
+            for name in src.array_keys():
+                dims = src[name].attrs.get("_ARRAY_DIMENSIONS", [hdim])
+                if name not in arrays and hdim not in dims:
+                    copy_array(src, group, name)
+            for name, (info, out_chunks, _, _, _) in variables.items():
+                group.create_array(
+                    name,
+                    shape=[*info["shape"][:-1], npix],
+                    chunks=[*out_chunks[:-1], hchunks],
+                    dtype=dtype,
+                    compressors=compressor,
+                    fill_value=np.nan,
+                    attributes={**info["attrs"], "numberOfPoints": npix},
+                )
+
+    tasks = [
+        (str(output), name, block, entries, info, nsides, ordering)
+        for name, (info, _, blocks, _, ordering) in variables.items()
+        for block, entries in blocks.items()
+        if (name, block) not in done
+    ]
+    # follow the order of messages in the files to read them sequentially
+    tasks.sort(key=lambda task: min((ref[0], ref[1]) for _, ref in task[3]))
+
+    logger.info(f"writing {len(nsides)} overview levels of {len(tasks)} blocks")
+    with open(progress_file, "a") as progress, mp.Pool(nprocs) as pool:
+        for name, block in pool.imap_unordered(_overview_block, tasks):
+            progress.write(json.dumps([name, block]) + "\n")
+            progress.flush()
+
+    progress_file.unlink()
+    zarr.consolidate_metadata(output)
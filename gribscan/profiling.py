@@ -0,0 +1,169 @@
+"""Instrumentation of the gribscan processing stages.
+
+The stages of indexing, building and decoding are wrapped in spans, which
+report their duration and counters (e.g. bytes read) to all registered
+callbacks. Without callbacks, spans do nothing.
+
+A callback is called as `callback(name, start, duration, counters)` with the
+wall clock start time and the duration in seconds. The `Profile` callback
+aggregates spans per stage and can record a Chrome trace:
+
+>>> with Profile(trace=True) as profile:
+...     gribscan.write_index("file.grib2")
+>>> print(profile.summary())
+>>> profile.write_chrome_trace("trace.json")
+"""
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+_callbacks = []
+
+
+def add_callback(callback):
+    _callbacks.append(callback)
+
+
+def remove_callback(callback):
+    _callbacks.remove(callback)
+
+
+class _Span:
+    __slots__ = ("name", "counters", "start", "t0")
+
+    def __init__(self, name, counters):
+        self.name = name
+        self.counters = counters
+
+    def add(self, **counters):
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def __enter__(self):
+        self.start = time.time()
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        duration = time.perf_counter() - self.t0
+        for callback in _callbacks:
+            callback(self.name, self.start, duration, self.counters)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def add(self, **counters):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name, **counters):
+    """Time a stage named `name`, counters can be added using `.add()`."""
+    if _callbacks:
+        return _Span(name, counters)
+    else:
+        return _NULL_SPAN
+
+
+class Profile:
+    """Callback aggregating the duration and counters of spans per stage."""
+
+    def __init__(self, trace=False):
+        self.trace = trace
+        self.stats = defaultdict(lambda: {"calls": 0, "seconds": 0.0, "counters": {}})
+        self.events = []
+        self._lock = threading.Lock()
+
+    def __call__(self, name, start, duration, counters):
+        with self._lock:
+            stats = self.stats[name]
+            stats["calls"] += 1
+            stats["seconds"] += duration
+            for key, value in counters.items():
+                stats["counters"][key] = stats["counters"].get(key, 0) + value
+            if self.trace:
+                self.events.append(
+                    {
+                        "name": name,
+                        "ph": "X",
+                        "ts": start * 1e6,
+                        "dur": duration * 1e6,
+                        "pid": os.getpid(),
+                        "tid": threading.get_native_id(),
+                        "args": counters,
+                    }
+                )
+
+    def __enter__(self):
+        add_callback(self)
+        return self
+
+    def __exit__(self, *args):
+        remove_callback(self)
+
+    def __getstate__(self):
+        return {
+            "trace": self.trace,
+            "stats": dict(self.stats),
+            "events": self.events,
+        }
+
+    def __setstate__(self, state):
+        self.__init__(trace=state["trace"])
+        self.stats.update(state["stats"])
+        self.events = state["events"]
+
+    def merge(self, other):
+        """Add the spans recorded by `other` (e.g. in another process)."""
+        with self._lock:
+            for name, stats in other.stats.items():
+                mine = self.stats[name]
+                mine["calls"] += stats["calls"]
+                mine["seconds"] += stats["seconds"]
+                for key, value in stats["counters"].items():
+                    mine["counters"][key] = mine["counters"].get(key, 0) + value
+            self.events.extend(other.events)
+
+    def summary(self):
+        lines = [f"{'stage':<24}{'calls':>10}{'total [s]':>12}{'mean [ms]':>12}  counters"]
+        for name, stats in sorted(
+            self.stats.items(), key=lambda item: -item[1]["seconds"]
+        ):
+            counters = ", ".join(f"{k}={v}" for k, v in stats["counters"].items())
+            lines.append(
+                f"{name:<24}{stats['calls']:>10}{stats['seconds']:>12.3f}"
+                f"{1e3 * stats['seconds'] / stats['calls']:>12.3f}  {counters}"
+            )
+        return "\n".join(lines)
+
+    def write_chrome_trace(self, path):
+        """Write recorded spans in the Chrome trace event format."""
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+
+
+def run_profiled(func, *args, trace=False, **kwargs):
+    """Run `func` with a fresh `Profile` and return the profile.
+
+    This is meant to be used in worker processes, the returned profile can be
+    sent back and merged into the profile of the main process.
+    """
+    inherited = _callbacks[:]
+    _callbacks.clear()
+    try:
+        with Profile(trace=trace) as profile:
+            func(*args, **kwargs)
+    finally:
+        _callbacks[:] = inherited
+    return profile
@@ -0,0 +1,297 @@
+"""Indexing by many processes sharing a work queue on a shared filesystem.
+
+Any number of workers (e.g. batch jobs on different nodes) can process the
+same queue directory, no other means of communication is needed:
+
+* `todo/` contains one JSON file per work item (a source file or a byte
+  range of it). Workers claim items by renaming them into `claimed/`, which
+  is atomic, so each item is claimed by a single worker.
+* While an item is processed, its worker regularly updates the modification
+  time of the claimed file. Claims which haven't been updated for `timeout`
+  seconds belong to crashed workers and are moved back into `todo/`.
+* The records of each item are written to `parts/`, then the item is moved
+  into `done/`.
+* The worker finishing the last item merges the parts into the index files
+  of the sources. The merge is guarded by creating the `merging` directory
+  and marked as finished by the `merged` file.
+
+Workers exit if there are no items left to claim. Running a worker again
+recovers the items of crashed workers (once their claims are stale) and
+finishes the merge.
+"""
+import json
+import os
+import pathlib
+import threading
+import time
+import uuid
+
+from .gribscan import (
+    _index_path,
+    _write_records,
+    is_gzipfile,
+    is_remote,
+    is_tarfile,
+    scan_byterange,
+    scan_gribfile,
+)
+
+import logging
+
+logger = logging.getLogger("gribscan")
+
+TIMEOUT = 600  # seconds after which claims are considered stale
+
+
+def _items(sources, chunksize=None):
+    """Split the sources into work items of at most `chunksize` bytes."""
+    for source in sources:
+        if chunksize is None or is_remote(source):
+            yield {"source": source}
+            continue
+        size = os.path.getsize(source)
+        with open(source, "rb") as f:
+            if is_tarfile(f) or is_gzipfile(f):
+                yield {"source": source}
+                continue
+        for start in range(0, max(size, 1), chunksize):
+            yield {"source": source, "start": start, "end": start + chunksize}
+
+
+class WorkQueue:
+    """Work queue of index items in `directory`, see the module documentation."""
+
+    def __init__(self, directory, timeout=TIMEOUT):
+        self.directory = pathlib.Path(directory)
+        self.timeout = timeout
+        with open(self.directory / "queue.json") as f:
+            self.config = json.load(f)
+
+    @classmethod
+    def create(cls, directory, sources, chunksize=None, outdir=None, **kwargs):
+        """Create the queue, or open it if it has been created by another worker.
+
+        Sources which are split into byte ranges of `chunksize` bytes can be
+        indexed by several workers. Index files are written to `outdir` (or
+        next to the sources).
+        """
+        directory = pathlib.Path(directory)
+        sources = [os.fspath(source) for source in sources]
+        outdir = None if outdir is None else os.fspath(outdir)
+        if not (directory / "queue.json").exists():
+            if not sources:
+                raise ValueError(f"{directory} is not a queue and no sources given")
+            # build the queue aside and move it into place atomically
+            tmp = directory.with_name(f".{directory.name}.{uuid.uuid4().hex}")
+            for subdir in ("todo", "claimed", "parts", "done"):
+                (tmp / subdir).mkdir(parents=True)
+            items = list(_items(sources, chunksize))
+            for i, item in enumerate(items):
+                with open(tmp / "todo" / f"{i:08d}", "w") as f:
+                    json.dump(item, f)
+            config = {"sources": sources, "items": len(items), "outdir": outdir}
+            with open(tmp / "queue.json", "w") as f:
+                json.dump(config, f)
+            try:
+                os.rename(tmp, directory)
+            except OSError:
+                logger.debug(f"{directory} has been created by another worker")
+                _rmtree(tmp)
+
+        queue = cls(directory, **kwargs)
+        if sources and queue.config["sources"] != sources:
+            raise ValueError(f"{directory} is a queue of different sources")
+        return queue
+
+    def _path(self, state, name):
+        return self.directory / state / name
+
+    def _recover(self):
+        """Move stale claims back into `todo/`.
+
+        Note: modification times are set by the clocks of other nodes, the
+        timeout must be large compared to the clock skew.
+        """
+        recovered = False
+        for path in sorted((self.directory / "claimed").iterdir()):
+            try:
+                age = time.time() - path.stat().st_mtime
+                if age > self.timeout:
+                    os.rename(path, self._path("todo", path.name))
+                    logger.warning(f"recovered item {path.name} after {age:.0f}s")
+                    recovered = True
+            except FileNotFoundError:
+                pass  # finished or recovered by another worker
+        return recovered
+
+    def claim(self):
+        """Claim the next item, returns its name and the item or `None`."""
+        while True:
+            for path in sorted((self.directory / "todo").iterdir()):
+                claimed = self._path("claimed", path.name)
+                try:
+                    os.rename(path, claimed)
+                except FileNotFoundError:
+                    continue  # claimed by another worker
+                os.utime(claimed)
+                with open(claimed) as f:
+                    return path.name, json.load(f)
+            if not self._recover():
+                return None
+
+    def _heartbeat(self, name, stop):
+        while not stop.wait(self.timeout / 4):
+            try:
+                os.utime(self._path("claimed", name))
+            except FileNotFoundError:
+                logger.warning(f"lost the claim of item {name}")
+                return
+
+    def process(
+        self, name, item, fast=True, stats=None, seek_spacing=None, threads=0
+    ):
+        """Write the index records of a claimed item into `parts/`.
+
+        Seek tables of gzip-compressed sources are written next to their
+        index files.
+        """
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(name, stop))
+        heartbeat.start()
+        try:
+            source = item["source"]
+            logger.info(f"indexing item {name} of {source}")
+            kwargs = {"fast": fast, "stats": stats, "filename": source}
+            # recovered items may be processed by several workers at once
+            tmp = self._path("parts", f".{name}.{uuid.uuid4().hex}.index")
+            if is_remote(source):
+                from .remote import scan_remote_gribfile
+
+                _write_records(scan_remote_gribfile(source, **kwargs), tmp, True)
+            else:
+                kwargs["threads"] = threads
+                with open(source, "rb") as f:
+                    if "start" in item:
+                        gen = scan_byterange(f, item["start"], item["end"], **kwargs)
+                    elif is_gzipfile(f):
+                        from .gzseek import PROTOCOL, scan_gzipfile, seek_table_path
+
+                        idxfile = self.index_files(force=True)[source]
+                        gen = scan_gzipfile(
+                            f,
+                            seek_table_path(source, os.fspath(idxfile.parent)),
+                            seek_spacing,
+                            **{**kwargs, "filename": f"{PROTOCOL}://{source}"},
+                        )
+                    else:
+                        gen = scan_gribfile(f, **kwargs)
+                    _write_records(gen, tmp, True)
+            os.replace(tmp, self._path("parts", f"{name}.index"))
+        finally:
+            stop.set()
+            heartbeat.join()
+
+        for state in ("claimed", "todo"):
+            try:
+                os.rename(self._path(state, name), self._path("done", name))
+                return
+            except FileNotFoundError:
+                # recovered by another worker meanwhile, which marks it as done
+                pass
+
+    def is_done(self):
+        return len(os.listdir(self.directory / "done")) == self.config["items"]
+
+    def is_merged(self):
+        return (self.directory / "merged").exists()
+
+    def index_files(self, force=False):
+        """Return the index file of each source."""
+        outdir = self.config["outdir"]
+        return {
+            source: _index_path(source, outdir=outdir, force=force)
+            for source in self.config["sources"]
+        }
+
+    def merge(self):
+        """Merge the parts into the index files, if all items are done.
+
+        Returns `True` if the index files have been written by this or
+        another worker.
+        """
+        lock = self.directory / "merging"
+        if self.is_merged():
+            return True
+        if not self.is_done():
+            return False
+        try:
+            lock.mkdir()
+        except FileExistsError:
+            try:
+                if time.time() - lock.stat().st_mtime < self.timeout:
+                    return self.is_merged()
+            except FileNotFoundError:
+                return self.is_merged()
+            logger.warning("taking over stale merge")
+
+        parts = {}
+        for name in sorted(os.listdir(self.directory / "done")):
+            with open(self._path("done", name)) as f:
+                item = json.load(f)
+            parts.setdefault(item["source"], []).append(
+                (item.get("start", 0), self._path("parts", f"{name}.index"))
+            )
+
+        for source, idxfile in self.index_files(force=True).items():
+            _write_records(_concat(sorted(parts.get(source, []))), idxfile, True)
+        (self.directory / "merged").touch()
+        lock.rmdir()
+        logger.info(f"merged {self.config['items']} items into index files")
+        return True
+
+
+def _concat(parts):
+    for _, path in parts:
+        with open(path) as f:
+            for line in f:
+                yield json.loads(line)
+
+
+def _rmtree(path):
+    for child in path.iterdir():
+        if child.is_dir():
+            _rmtree(child)
+        else:
+            child.unlink()
+    path.rmdir()
+
+
+def run_worker(
+    directory,
+    sources=(),
+    chunksize=None,
+    outdir=None,
+    force=False,
+    timeout=TIMEOUT,
+    fast=True,
+    stats=None,
+    seek_spacing=None,
+    threads=0,
+):
+    """Process items of the queue in `directory` until none are left.
+
+    The queue is created from `sources` if it doesn't exist yet. The worker
+    finishing the last item writes the index files.
+    """
+    queue = WorkQueue.create(directory, sources, chunksize, outdir, timeout=timeout)
+    if not queue.is_merged():
+        queue.index_files(force)  # fail early if index files exist
+    nitems = 0
+    while (claim := queue.claim()) is not None:
+        queue.process(
+            *claim, fast=fast, stats=stats, seek_spacing=seek_spacing, threads=threads
+        )
+        nitems += 1
+    logger.info(f"processed {nitems} items")
+    if not queue.merge():
+        logger.info("other workers are still processing items")
@@ -1,7 +1,84 @@
 import eccodes
 import numcodecs
+import numpy as np
 from numcodecs.compat import ndarray_copy, ensure_contiguous_ndarray
 
+try:
+    # decoding into caller-provided buffers needs the C functions of eccodes
+    import cffi
+    from gribapi.bindings import ffi, lib, library_path
+    from gribapi.gribapi import GRIB_CHECK, get_handle, put_handle
+except ImportError:
+    lib = None
+else:
+    # the bindings only declare the variant which copies the message
+    _ffi = cffi.FFI()
+    _ffi.include(ffi)
+    _ffi.cdef(
+        "grib_handle* grib_handle_new_from_message(grib_context*, const void*, size_t);"
+    )
+    _lib = _ffi.dlopen(library_path)
+
+from .profiling import span
+
+_GET_ARRAY = {
+    np.dtype("f8"): ("grib_get_double_array", "double *"),
+    np.dtype("f4"): ("grib_get_float_array", "float *"),
+}
+
+
+def _as_message(buf):
+    """Return `buf` as a buffer which eccodes reads without copying it in Python."""
+    if isinstance(buf, bytes):
+        return buf
+    return memoryview(ensure_contiguous_ndarray(buf)).cast("B")
+
+
+def _new_handle(message):
+    """Create a handle of `message` without copying it.
+
+    Returns the message id and an object which keeps the message alive, it
+    must not be released before the handle.
+    """
+    if lib is None:
+        return eccodes.codes_new_from_message(message), None
+    data = _ffi.from_buffer(message)
+    handle = _lib.grib_handle_new_from_message(_ffi.NULL, data, len(data))
+    if handle == _ffi.NULL:
+        raise eccodes.MessageInvalidError("new_from_message failed")
+    return put_handle(handle), data
+
+
+def _decode_into(mid, out):
+    """Decode the values of message `mid` directly into `out`.
+
+    Returns the decoded values (a flat view of `out`) or `None` if `out` isn't
+    a contiguous, writeable float32 or float64 buffer of the right size.
+    """
+    if lib is None:
+        return None
+    try:
+        values = ensure_contiguous_ndarray(out)
+    except (TypeError, ValueError):
+        return None
+    if not values.flags.writeable or values.dtype not in _GET_ARRAY:
+        return None
+    size = eccodes.codes_get_size(mid, "values")
+    if values.size != size:
+        return None
+
+    function, ctype = _GET_ARRAY[values.dtype]
+    if not hasattr(lib, function):  # e.g. no float API in older eccodes
+        return None
+    err = getattr(lib, function)(
+        get_handle(mid),
+        b"values",
+        ffi.cast(ctype, values.ctypes.data),
+        ffi.new("size_t*", size),
+    )
+    GRIB_CHECK(err)
+    return values
+
 
 class RawGribCodec(numcodecs.abc.Codec):
     codec_id = "gribscan.rawgrib"
@@ -10,16 +87,25 @@ class RawGribCodec(numcodecs.abc.Codec):
         return buf
 
     def decode(self, buf, out=None):
-        mid = eccodes.codes_new_from_message(bytes(buf))
-        try:
-            data = eccodes.codes_get_array(mid, "values")
-        finally:
-            eccodes.codes_release(mid)
+        with span("decode") as s:
+            mid, message = _new_handle(_as_message(buf))
+            try:
+                if out is not None:
+                    if (values := _decode_into(mid, out)) is not None:
+                        s.add(bytes_in=len(buf), bytes_out=values.nbytes)
+                        return out
+                data = eccodes.codes_get_array(mid, "values")
+            finally:
+                eccodes.codes_release(mid)
+                del message
 
-        if hasattr(data, "build_array"):
-            data = data.build_array()
+            if hasattr(data, "build_array"):
+                data = data.build_array()
+            s.add(bytes_in=len(buf), bytes_out=data.nbytes)
 
         if out is not None:
-            return ndarray_copy(data, out)
+            # e.g. float32 output when decoding into it isn't supported
+            dtype = getattr(out, "dtype", data.dtype)
+            return ndarray_copy(data.astype(dtype, copy=False), out)
         else:
             return data
@@ -0,0 +1,120 @@
+"""Compact in-memory representation of index records.
+
+Assembling datasets keeps the records of all index files in memory. Parsed
+from JSON, each record is a tree of dicts and lists, most of which (e.g.
+`globals`, `attrs` or the grid definition in `extra`) are the same for many
+messages. A `MessageRecord` stores the fields of a record in slots and shares
+each distinct value with all other records created by the same `Interner`.
+"""
+import json
+from collections.abc import Mapping
+
+# top-level fields of the records written by `scan_message`
+FIELDS = (
+    "globals",
+    "attrs",
+    "parameter_code",
+    "posix_time",
+    "domain",
+    "member",
+    "time",
+    "date",
+    "levtype",
+    "level",
+    "type",
+    "referenceTime",
+    "step",
+    "_offset",
+    "_length",
+    "array",
+    "extra",
+    "param",
+    "filename",
+    "stats",
+)
+_FIELDS = frozenset(FIELDS)
+
+
+class Interner:
+    """Return a shared instance for equal strings, lists and dicts.
+
+    Interned values must not be modified.
+    """
+
+    def __init__(self):
+        self._strings = {}
+        self._values = {}
+
+    def __call__(self, value):
+        if isinstance(value, str):
+            return self._strings.setdefault(value, value)
+        elif isinstance(value, dict):
+            items = tuple(value.items())
+            types = tuple(map(type, value.values()))
+        elif isinstance(value, list):
+            items = tuple(value)
+            types = tuple(map(type, value))
+        else:
+            return value
+
+        # JSON distinguishes values which compare equal in Python (e.g. 1 and
+        # 1.0), nested values aren't hashable and are keyed by their JSON
+        key = (type(value), items, types)
+        try:
+            hash(key)
+        except TypeError:
+            key = json.dumps(value)
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+        if isinstance(value, dict):
+            # share members with other (partially) equal dicts
+            value = {self(k): self(v) for k, v in value.items()}
+        return self._values.setdefault(key, value)
+
+
+class MessageRecord(Mapping):
+    """Read-only index record, a drop-in replacement for the parsed JSON dict."""
+
+    __slots__ = FIELDS + ("_other",)
+
+    def __init__(self, meta, interner=None):
+        if interner is None:
+            interner = Interner()
+        other = {}
+        for key, value in meta.items():
+            if key in _FIELDS:
+                setattr(self, key, interner(value))
+            else:
+                other[interner(key)] = interner(value)
+        self._other = other or None
+
+    def __getitem__(self, key):
+        if key in _FIELDS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._other is not None:
+            return self._other[key]
+        raise KeyError(key)
+
+    def __iter__(self):
+        for key in FIELDS:
+            if hasattr(self, key):
+                yield key
+        if self._other is not None:
+            yield from self._other
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"MessageRecord({dict(self)!r})"
+
+    def __getstate__(self):
+        return dict(self)
+
+    def __setstate__(self, state):
+        self.__init__(state)
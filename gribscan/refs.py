@@ -0,0 +1,108 @@
+"""Helpers for the reference filesystems assembled by `grib_magic`.
+
+These don't depend on zarr, such that commands which only read the
+references (e.g. `gribscan verify`) work without the `zarr` extra.
+"""
+import json
+from collections import defaultdict
+
+import fsspec
+
+
+def load_refs(refs):
+    """Return the references (a dict or the path of a JSON file) as a dict."""
+    if isinstance(refs, dict):
+        return refs
+    with fsspec.open(refs, "r") as f:
+        return json.load(f)
+
+
+def grib_arrays(refs):
+    """Return the metadata of the arrays whose chunks are GRIB messages.
+
+    Besides the `.zarray` metadata, the entries contain the `attrs` of each
+    array and the number `nouter` of leading dimensions with one message per
+    chunk.
+    """
+    arrays = {}
+    for key, value in refs.items():
+        if not key.endswith("/.zarray"):
+            continue
+        meta = json.loads(value)
+        if (meta.get("compressor") or {}).get("id") not in ("gribscan.rawgrib", "rawgrib"):
+            continue
+        name = key[: -len("/.zarray")]
+        # each message is a chunk spanning the trailing (horizontal) dimensions
+        chunks = meta["chunks"]
+        nouter = 0
+        while nouter < len(chunks) - 1 and chunks[nouter] == 1:
+            nouter += 1
+        arrays[name] = {
+            **meta,
+            "attrs": json.loads(refs.get(f"{name}/.zattrs", "{}")),
+            "nouter": nouter,
+        }
+    return arrays
+
+
+def coalesce_ranges(ranges, max_gap=2**20):
+    """Merge `(offset, length)` ranges which are at most `max_gap` bytes apart.
+
+    Returns a list of `(offset, length, members)`, where `members` are the
+    indices of the input ranges contained in each merged range.
+    """
+    merged = []
+    for i in sorted(range(len(ranges)), key=lambda i: ranges[i][0]):
+        offset, length = ranges[i]
+        if merged and offset <= merged[-1][0] + merged[-1][1] + max_gap:
+            start, size, members = merged[-1]
+            merged[-1] = (start, max(size, offset + length - start), members + [i])
+        else:
+            merged.append((offset, length, [i]))
+    return merged
+
+
+def read_messages(refs, max_gap=2**20):
+    """Read the `[filename, offset, length]` references in as few requests as possible.
+
+    Yields the index into `refs` and the corresponding bytes.
+    """
+    by_file = defaultdict(list)
+    for i, (filename, offset, length) in enumerate(refs):
+        by_file[filename].append(i)
+
+    for filename, ids in by_file.items():
+        ranges = [tuple(refs[i][1:]) for i in ids]
+        with fsspec.open(filename, "rb") as f:
+            for start, size, members in coalesce_ranges(ranges, max_gap):
+                f.seek(start)
+                data = f.read(size)
+                for member in members:
+                    offset, length = ranges[member]
+                    yield ids[member], data[offset - start : offset - start + length]
+
+
+def output_chunks(dims, shape, nouter, chunks):
+    """Output chunk sizes from a `{dim: size}` mapping (default: 1 per message)."""
+    return [
+        min(chunks.get(dim, 1 if i < nouter else n), n)
+        for i, (dim, n) in enumerate(zip(dims, shape))
+    ]
+
+
+def plan_blocks(refs, name, info, out_chunks):
+    """Group the messages of an array into blocks of output chunks."""
+    nouter = info["nouter"]
+    blocks = defaultdict(list)
+    prefix = name + "/"
+    for key, ref in refs.items():
+        if not key.startswith(prefix) or not isinstance(ref, list):
+            continue
+        chunk = key[len(prefix) :]
+        if "/" in chunk:
+            continue
+        idx = [int(i) for i in chunk.split(".")][:nouter]
+        block = tuple(i // c for i, c in zip(idx, out_chunks))
+        local = tuple(i % c for i, c in zip(idx, out_chunks))
+        blocks[block].append((local, ref))
+    return blocks
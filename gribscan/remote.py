@@ -0,0 +1,217 @@
+"""Scanning of remote GRIB files using concurrent range requests.
+
+Reading a remote file sequentially makes indexing bound by the round trip
+time of the storage. Instead, only the parts of the file which are needed to
+create the index are requested via fsspec:
+
+* the 16 byte indicator of each message, which gives the offset of the next
+  message, together with the end marker of the previous message
+* the metadata sections of each message (section 7, the data, is skipped for
+  GRIB2), which are requested concurrently while the next messages are found
+
+The resulting records are the same as those of `scan_gribfile`.
+"""
+import asyncio
+import io
+
+import fsspec
+import fsspec.asyn
+
+from .gribscan import detect_large_grib1_special_coding, message_scanner
+from .profiling import span
+
+import logging
+
+logger = logging.getLogger("gribscan")
+
+BLOCKSIZE = 64 * 1024  # read ahead for small messages and when searching
+HEADSIZE = 4 * 1024  # usually enough for the metadata sections
+
+
+class _RangeReader:
+    def __init__(self, fs, path, size, max_concurrency):
+        self.fs = fs
+        self.path = path
+        self.size = size
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._window = (0, b"")
+
+    async def read(self, start, end):
+        end = min(end, self.size)
+        if start >= end:
+            return b""
+        async with self._semaphore:
+            with span("read") as s:
+                if self.fs.async_impl:
+                    data = await self.fs._cat_file(self.path, start=start, end=end)
+                else:
+                    data = await asyncio.to_thread(
+                        self.fs.cat_file, self.path, start=start, end=end
+                    )
+                s.add(bytes=len(data))
+        return data
+
+    def cached(self, start, end):
+        """Return the part of `[start, end)` which has been read by `get` before."""
+        wstart, window = self._window
+        if wstart <= start < wstart + len(window):
+            return window[start - wstart : end - wstart]
+        return b""
+
+    async def get(self, start, end, readahead=BLOCKSIZE):
+        """Read `[start, end)`, additionally reading `readahead` bytes."""
+        data = self.cached(start, end)
+        if len(data) == min(end, self.size) - start:
+            return data
+        window = await self.read(start, end + readahead)
+        self._window = (start, window)
+        return window[: end - start]
+
+
+async def _find(reader, start, needle=b"GRIB"):
+    with span("find_stream"):
+        while start < reader.size:
+            buf = await reader.get(start, start + BLOCKSIZE, readahead=0)
+            if (idx := buf.find(needle)) >= 0:
+                return start + idx
+            start += max(len(buf) - len(needle) + 1, 1)
+    return None
+
+
+def _grib2_metadata(data, size):
+    """Strip section 7 from a GRIB2 message.
+
+    Returns the metadata as a valid GRIB message, or the number of bytes which
+    are needed to find section 7 if `data` is too short.
+    """
+    pos = 16
+    while pos + 5 <= len(data):
+        if data[pos : pos + 4] == b"7777":
+            return data
+        length = int.from_bytes(data[pos : pos + 4], "big")
+        if data[pos + 4] == 7:
+            metadata = bytearray(data[:pos])
+            metadata += (5).to_bytes(4, "big") + b"\x07" + b"7777"
+            metadata[8:16] = len(metadata).to_bytes(8, "big")
+            return bytes(metadata)
+        pos += length
+    return min(pos + 5, size)
+
+
+async def _scan(reader, scan, offset, size, grib_edition, data, values, kwargs):
+    """Scan a message of which the first bytes (`data`) may already be known.
+
+    Unless the `values` are needed, section 7 of GRIB2 messages isn't read.
+    """
+    if grib_edition == 2 and not values:
+        if not data:
+            data = await reader.read(offset, offset + min(size, HEADSIZE))
+        while isinstance(metadata := _grib2_metadata(data, size), int):
+            if metadata <= len(data):
+                break
+            data += await reader.read(
+                offset + len(data), offset + max(metadata, 2 * len(data))
+            )
+        else:
+            try:
+                with span("parse"):
+                    return scan(metadata, offset, size, **kwargs)
+            except Exception:
+                logger.debug(f"can't scan metadata at {offset}, reading full message")
+
+    if len(data) < size:
+        data += await reader.read(offset + len(data), offset + size)
+    with span("parse"):
+        return scan(data, offset, size, **kwargs)
+
+
+async def _scan_file(fs, path, max_concurrency, fast, stats, kwargs):
+    if fs.async_impl:
+        size = (await fs._info(path))["size"]
+    else:
+        size = (await asyncio.to_thread(fs.info, path))["size"]
+    reader = _RangeReader(fs, path, size, max_concurrency)
+    scan = message_scanner(fast, stats)
+    logger.debug(f"reading remote GRIB file with size {size}")
+
+    tasks = []
+    start = 0
+    part = 0
+    while start < size:
+        logger.debug(f"extract part {part + 1}")
+        indicator = await reader.get(start, start + 16)
+        if indicator[:4] != b"GRIB":
+            logger.info(f"non-consecutive messages, searching for part {part + 1}")
+            start = await _find(reader, start)
+            if start is None:
+                # Handle non-GRIB data after the last GRIB message in a file
+                break
+            indicator = await reader.get(start, start + 16)
+        if len(indicator) < 16:
+            logger.info(f"couldn't read indicator, assuming end of file at {start}")
+            break
+
+        grib_edition = indicator[7]
+
+        if grib_edition == 1:
+            part_size = int.from_bytes(indicator[4:7], "big")
+            if part_size & 0x800000:
+                part_size = detect_large_grib1_special_coding(
+                    io.BytesIO(await reader.get(start, start + part_size)), part_size
+                )
+        elif grib_edition == 2:
+            part_size = int.from_bytes(indicator[8:16], "big")
+        else:
+            raise ValueError(f"unknown grib edition: {grib_edition}")
+
+        head = reader.cached(start, start + part_size)
+
+        # the end marker, the indicator and probably the metadata of the next
+        # message, many small messages are read at once
+        tail = await reader.get(
+            start + part_size - 4,
+            start + part_size + 16,
+            readahead=BLOCKSIZE if part_size < BLOCKSIZE else HEADSIZE,
+        )
+        if tail[:4] != b"7777":
+            logger.warning(f"part {part + 1} is broken")
+            start += 1
+        else:
+            tasks.append(
+                asyncio.ensure_future(
+                    _scan(
+                        reader,
+                        scan,
+                        start,
+                        part_size,
+                        grib_edition,
+                        head,
+                        stats == "exact",
+                        kwargs,
+                    )
+                )
+            )
+            start += part_size
+
+        part += 1
+
+    return await asyncio.gather(*tasks)
+
+
+def scan_remote_gribfile(
+    url, max_concurrency=32, storage_options=None, fast=True, stats=None, **kwargs
+):
+    """Like `scan_gribfile`, but for files on remote storage (e.g. HTTP or S3).
+
+    Up to `max_concurrency` range requests are in flight at the same time.
+    """
+    fs, path = fsspec.core.url_to_fs(url, **(storage_options or {}))
+    if fs.async_impl:
+        records = fsspec.asyn.sync(
+            fs.loop, _scan_file, fs, path, max_concurrency, fast, stats, kwargs
+        )
+    else:
+        records = asyncio.run(
+            _scan_file(fs, path, max_concurrency, fast, stats, kwargs)
+        )
+    yield from records
@@ -0,0 +1,186 @@
+"""Zarr store reading GRIB messages with concurrent reads and read-ahead.
+
+Reading through fsspec's reference filesystem reads one chunk after another.
+The `ReadAheadStore` serves the references created by `grib_magic` (see
+`ManifestStore`) and
+
+* reads from local files with `os.pread` in a thread pool, such that all
+  chunks requested by zarr are read concurrently, using a pool of open file
+  handles,
+* detects sequential access along a dimension (e.g. reading a time series
+  message by message) and reads the next messages ahead.
+
+>>> ds = xr.open_zarr(ReadAheadStore("dataset.json"), consolidated=False)
+"""
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from fsspec.implementations.local import LocalFileSystem
+
+from .manifest import ManifestStore
+
+import logging
+
+logger = logging.getLogger("gribscan")
+
+
+class FileHandlePool:
+    """Pool of up to `maxsize` open file descriptors, shared by threads.
+
+    Descriptors in use are never closed, so the pool may temporarily exceed
+    `maxsize`.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._fds = OrderedDict()
+        self._users = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, path):
+        with self._lock:
+            if path not in self._fds:
+                self._fds[path] = os.open(path, os.O_RDONLY)
+                self._users[path] = 0
+            self._fds.move_to_end(path)
+            self._users[path] += 1
+            fd = self._fds[path]
+            self._evict()
+            return fd
+
+    def release(self, path):
+        with self._lock:
+            self._users[path] -= 1
+            self._evict()
+
+    def _evict(self):
+        for path in list(self._fds):
+            if len(self._fds) <= self.maxsize:
+                break
+            if self._users[path] == 0:
+                os.close(self._fds.pop(path))
+                del self._users[path]
+
+    def pread(self, path, start, end):
+        fd = self.acquire(path)
+        try:
+            chunks = []
+            while start < end:
+                data = os.pread(fd, end - start, start)
+                if not data:
+                    break
+                chunks.append(data)
+                start += len(data)
+            return b"".join(chunks)
+        finally:
+            self.release(path)
+
+    def close(self):
+        with self._lock:
+            for fd in self._fds.values():
+                os.close(fd)
+            self._fds.clear()
+            self._users.clear()
+
+
+def _discard_result(task):
+    # errors of chunks which are read ahead but never used are ignored
+    if not task.cancelled():
+        task.exception()
+
+
+class ReadAheadStore(ManifestStore):
+    """Read-only zarr store with concurrent reads and sequential read-ahead.
+
+    Local files are read by up to `max_workers` threads, keeping up to
+    `max_open_files` files open. Once two consecutive chunks along a
+    dimension of an array have been read, the next `readahead` chunks along
+    this dimension are read ahead.
+    """
+
+    def __init__(
+        self,
+        manifest,
+        storage_options=None,
+        max_workers=16,
+        max_open_files=128,
+        readahead=4,
+    ):
+        super().__init__(manifest, storage_options)
+        self.readahead = readahead
+        self._executor = ThreadPoolExecutor(max_workers)
+        self._handles = FileHandlePool(max_open_files)
+        self._last = {}
+        self._prefetched = OrderedDict()
+
+    async def _read(self, filename, start, end):
+        fs, path = self._filesystem(filename)
+        if isinstance(fs, LocalFileSystem):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, self._handles.pread, path, start, end
+            )
+        return await super()._read(filename, start, end)
+
+    def _chunk_index(self, key):
+        name, _, chunk = key.rpartition("/")
+        if name not in self.manifest.arrays:
+            return None, None
+        separator = self.manifest.separators.get(name, ".")
+        try:
+            return name, tuple(map(int, chunk.split(separator)))
+        except ValueError:
+            return None, None
+
+    def _read_ahead(self, name, idx):
+        """Detect sequential access and start reading the next chunks."""
+        last, self._last[name] = self._last.get(name), idx
+        if last is None or len(last) != len(idx):
+            return
+        steps = [i - j for i, j in zip(idx, last)]
+        if sorted(steps) != [0] * (len(steps) - 1) + [1]:
+            return
+        dim = steps.index(1)
+
+        separator = self.manifest.separators.get(name, ".")
+        for n in range(1, self.readahead + 1):
+            ahead = list(idx)
+            ahead[dim] += n
+            key = f"{name}/" + separator.join(map(str, ahead))
+            if key in self._prefetched:
+                continue
+            if (ref := self.manifest.chunk_ref(key)) is None:
+                break
+            filename, offset, length = ref
+            task = asyncio.ensure_future(self._read(filename, offset, offset + length))
+            task.add_done_callback(_discard_result)
+            self._prefetched[key] = task
+
+        # keep a bounded number of chunks which have been read ahead
+        while len(self._prefetched) > 4 * max(self.readahead, 1):
+            _, task = self._prefetched.popitem(last=False)
+            task.cancel()
+
+    async def get(self, key, prototype, byte_range=None):
+        name, idx = self._chunk_index(key)
+        if idx is None or byte_range is not None:
+            return await super().get(key, prototype, byte_range)
+
+        task = self._prefetched.pop(key, None)
+        if self.readahead:
+            self._read_ahead(name, idx)
+        # tasks are bound to the event loop they have been created in
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            return prototype.buffer.from_bytes(await task)
+        return await super().get(key, prototype, byte_range)
+
+    def close(self):
+        for task in self._prefetched.values():
+            task.cancel()
+        self._prefetched.clear()
+        self._executor.shutdown(wait=True)
+        self._handles.close()
+        super().close()
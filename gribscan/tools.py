@@ -10,19 +10,49 @@ import click
 
 import gribscan
 from .magician import MAGICIANS
+from .profiling import Profile, run_profiled
+
+
+class SourcePath(click.Path):
+    """A local path which has to exist, a remote URL or '-' for stdin."""
+
+    def convert(self, value, param, ctx):
+        if gribscan.is_remote(value):
+            return value
+        return super().convert(value, param, ctx)
 
 
 @click.group()
 @click.option("-v", "--verbose", is_flag=True, help="Increase the logging level.")
-def cli(verbose):
+@click.option(
+    "--profile", is_flag=True, help="Print the time spent in each processing stage."
+)
+@click.option(
+    "--trace",
+    type=click.Path(dir_okay=False, writable=True),
+    default=None,
+    help="Write processing stages to a Chrome trace file (JSON).",
+)
+@click.pass_context
+def cli(ctx, verbose, profile, trace):
     """gribscan: Index and build GRIB datasets."""
     logging.basicConfig()
     if verbose:
         logging.getLogger().setLevel(logging.DEBUG)
 
+    if profile or trace:
+        ctx.obj = ctx.with_resource(Profile(trace=trace is not None))
+
+        @ctx.call_on_close
+        def report():
+            if profile:
+                click.echo(ctx.obj.summary(), err=True)
+            if trace:
+                ctx.obj.write_chrome_trace(trace)
+
 
 @cli.command("index")
-@click.argument("sources", nargs=-1, type=click.Path(exists=True))
+@click.argument("sources", nargs=-1, type=SourcePath(exists=True, allow_dash=True))
 @click.option(
     "-o",
     "--outdir",
@@ -39,11 +69,170 @@ def cli(verbose):
     show_default=True,
     help="Number of parallel processes.",
 )
-def create_index(sources, outdir, force, nprocs):
-    """Create index files from GRIB sources."""
-    mapfunc = partial(gribscan.write_index, outdir=outdir, force=force)
+@click.option(
+    "--max-concurrency",
+    type=int,
+    default=32,
+    show_default=True,
+    help="Number of concurrent range requests per remote source (e.g. https://).",
+)
+@click.option(
+    "--tee",
+    type=click.Path(dir_okay=False, writable=True),
+    default=None,
+    help=textwrap.dedent(
+        """\
+        Copy GRIB data from a single source (or stdin if no source or '-'
+        is given) to this file and index it while copying. The source may be
+        a pipe.
+        """
+    ),
+)
+@click.option(
+    "--eccodes",
+    "use_eccodes",
+    is_flag=True,
+    help="Scan all messages with eccodes instead of parsing common GRIB2 messages.",
+)
+@click.option(
+    "--stats",
+    type=click.Choice(["bounds", "exact"]),
+    default=None,
+    help=textwrap.dedent(
+        """\
+        Record the minimum and maximum (and with 'exact' the mean) of each
+        message. 'bounds' derives bounds from the packing without decoding,
+        'exact' decodes the values.
+        """
+    ),
+)
+@click.option(
+    "--threads",
+    type=int,
+    default=0,
+    show_default=True,
+    help=textwrap.dedent(
+        """\
+        Scan the messages of each local source in this many threads, while
+        a background thread reads the next messages. With 0, messages are
+        read and scanned one after another.
+        """
+    ),
+)
+@click.option(
+    "--seek-spacing",
+    type=int,
+    default=4,
+    show_default=True,
+    help=textwrap.dedent(
+        """\
+        MiB of uncompressed data between the seek points of gzip-compressed
+        sources. Reading a message decompresses up to this much additional
+        data, each seek point takes up to 32 KiB.
+        """
+    ),
+)
+@click.option(
+    "--queue",
+    type=click.Path(file_okay=False),
+    default=None,
+    help=textwrap.dedent(
+        """\
+        Share the work with other processes (e.g. on other nodes) using a
+        work queue in this directory on a shared filesystem. The queue is
+        created by the first process, all processes running with the same
+        queue take items until none are left. Run again to recover the
+        items of crashed processes.
+        """
+    ),
+)
+@click.option(
+    "--chunk-size",
+    type=int,
+    default=None,
+    help="Split sources into work items of this many MiB (with --queue).",
+)
+@click.option(
+    "--timeout",
+    type=int,
+    default=600,
+    show_default=True,
+    help="Seconds after which items of unresponsive processes are recovered.",
+)
+@click.pass_obj
+def create_index(
+    profile,
+    sources,
+    outdir,
+    force,
+    nprocs,
+    max_concurrency,
+    tee,
+    use_eccodes,
+    stats,
+    threads,
+    seek_spacing,
+    queue,
+    chunk_size,
+    timeout,
+):
+    """Create index files from GRIB sources (local paths or URLs)."""
+    if tee is not None:
+        if len(sources) > 1:
+            raise click.UsageError("--tee accepts at most one source.")
+        with click.open_file(sources[0] if sources else "-", "rb") as stream:
+            gribscan.tee_index(
+                stream,
+                tee,
+                outdir=outdir,
+                force=force,
+                fast=not use_eccodes,
+                stats=stats,
+                threads=threads,
+            )
+        return
+
+    if queue is not None:
+        # each process takes items from the queue, the argument is unused
+        mapfunc = partial(
+            _queue_worker,
+            directory=queue,
+            sources=sources,
+            chunksize=chunk_size * 2**20 if chunk_size else None,
+            outdir=outdir,
+            force=force,
+            timeout=timeout,
+            fast=not use_eccodes,
+            stats=stats,
+            seek_spacing=seek_spacing * 2**20,
+            threads=threads,
+        )
+        sources = range(nprocs)
+    else:
+        mapfunc = partial(
+            gribscan.write_index,
+            outdir=outdir,
+            force=force,
+            max_concurrency=max_concurrency,
+            fast=not use_eccodes,
+            stats=stats,
+            seek_spacing=seek_spacing * 2**20,
+            threads=threads,
+        )
+    if profile is not None:
+        # workers report their profiles back to be merged
+        mapfunc = partial(run_profiled, mapfunc, trace=profile.trace)
     with mp.Pool(nprocs) as pool:
-        pool.map(mapfunc, sources)
+        results = pool.map(mapfunc, sources)
+    if profile is not None:
+        for worker_profile in results:
+            profile.merge(worker_profile)
+
+
+def _queue_worker(worker, **kwargs):
+    from .queue import run_worker
+
+    run_worker(**kwargs)
 
 
 @cli.command("build")
@@ -89,7 +278,38 @@ def create_index(sources, outdir, force, nprocs):
     type=click.Choice(MAGICIANS.keys()),
     help="Magician to use for dataset assembly.",
 )
-def build_dataset(indices, glob_pattern, output, prefix, magician):
+@click.option(
+    "--filter",
+    "filter_expr",
+    type=str,
+    default=None,
+    help=textwrap.dedent(
+        """\
+        Only use messages matching the filter expression, e.g.
+        'param=t,u levtype=isobaricInhPa date>=20200101'.
+        """
+    ),
+)
+@click.option(
+    "-a",
+    "--append",
+    is_flag=True,
+    help=textwrap.dedent(
+        """\
+        Extend the reference filesystems in the output directory with records
+        added to the index files since the previous build. Falls back to a
+        full rebuild if the existing coordinates can't be extended.
+        """
+    ),
+)
+@click.option(
+    "--lazy-coords",
+    is_flag=True,
+    help="Compute grid coordinates on read instead of storing them.",
+)
+def build_dataset(
+    indices, glob_pattern, output, prefix, magician, filter_expr, append, lazy_coords
+):
     """Build dataset references from index files."""
     if not glob_pattern and not indices:
         raise click.UsageError("You must provide either a glob pattern or a file list.")
@@ -100,9 +320,29 @@ def build_dataset(indices, glob_pattern, output, prefix, magician):
         indices = list(glob.iglob(glob_pattern))
 
     magician_instance = MAGICIANS[magician]()
-    refs = gribscan.grib_magic(
-        indices, magician=magician_instance, global_prefix=prefix
-    )
+    if append:
+        existing = {}
+        for path in Path(output).glob("*.json"):
+            with open(path) as f:
+                ref = json.load(f)
+            if gribscan.get_state(ref) is not None:
+                existing[path.stem] = ref
+        refs = gribscan.grib_magic_append(
+            indices,
+            existing,
+            magician=magician_instance,
+            global_prefix=prefix,
+            filter_expr=filter_expr,
+            lazy_coords=lazy_coords,
+        )
+    else:
+        refs = gribscan.grib_magic(
+            indices,
+            magician=magician_instance,
+            global_prefix=prefix,
+            filter_expr=filter_expr,
+            lazy_coords=lazy_coords,
+        )
 
     Path(output).mkdir(parents=True, exist_ok=True)
     for dataset, ref in refs.items():
@@ -110,5 +350,134 @@ def build_dataset(indices, glob_pattern, output, prefix, magician):
             json.dump(ref, f, indent=2)
 
 
+@cli.command("catalog")
+@click.argument("catalog", type=click.Path(dir_okay=False))
+@click.argument("indices", nargs=-1, type=click.Path(exists=True))
+@click.option(
+    "-g",
+    "--glob",
+    "glob_pattern",
+    type=str,
+    help="Glob pattern to create list of index files (JSONLines).",
+)
+@click.option("-f", "--force", is_flag=True, help="Re-ingest unchanged index files.")
+def create_catalog(catalog, indices, glob_pattern, force):
+    """Add index files to a queryable catalogue."""
+    if glob_pattern:
+        indices = list(indices) + list(glob.iglob(glob_pattern))
+
+    with gribscan.Catalog(catalog) as cat:
+        for indexfile in indices:
+            cat.ingest(indexfile, force=force)
+
+
+def parse_chunks(ctx, param, value):
+    try:
+        return {dim: int(size) for dim, size in (v.split("=") for v in value)}
+    except ValueError:
+        raise click.BadParameter("chunks must be given as DIM=SIZE")
+
+
+@cli.command("export")
+@click.argument("refs", type=click.Path(exists=True, dir_okay=False))
+@click.argument("output", type=click.Path(file_okay=False, writable=True))
+@click.option(
+    "-c",
+    "--chunks",
+    multiple=True,
+    callback=parse_chunks,
+    help="Output chunk size along a dimension as DIM=SIZE (repeatable).",
+)
+@click.option(
+    "-n",
+    "--nprocs",
+    type=int,
+    default=1,
+    show_default=True,
+    help="Number of parallel processes.",
+)
+def export(refs, output, chunks, nprocs):
+    """Decode a reference filesystem (JSON) into a native zarr store.
+
+    Interrupted exports are resumed when running the command again.
+    """
+    from .export import export_zarr
+
+    export_zarr(refs, output, chunks=chunks, nprocs=nprocs)
+
+
+@cli.command("overview")
+@click.argument("refs", type=click.Path(exists=True, dir_okay=False))
+@click.argument("output", type=click.Path(file_okay=False, writable=True))
+@click.option(
+    "--min-nside",
+    type=int,
+    default=1,
+    show_default=True,
+    help="Nside of the coarsest level.",
+)
+@click.option(
+    "-c",
+    "--chunks",
+    multiple=True,
+    callback=parse_chunks,
+    help="Output chunk size along a dimension as DIM=SIZE (repeatable).",
+)
+@click.option(
+    "-n",
+    "--nprocs",
+    type=int,
+    default=1,
+    show_default=True,
+    help="Number of parallel processes.",
+)
+def overview(refs, output, min_nside, chunks, nprocs):
+    """Write coarser levels of a HEALPix dataset (JSON) into a zarr store.
+
+    Each level (Nside / 2, Nside / 4, ...) is a group `nside<Nside>` of the
+    store. Interrupted runs are resumed when running the command again.
+    """
+    try:
+        from .overview import write_overviews
+    except ImportError as e:
+        raise click.ClickException(
+            f"overviews require the `overview` extra "
+            f'(`pip install "gribscan[overview]"`): {e}'
+        )
+
+    write_overviews(refs, output, min_nside=min_nside, chunks=chunks, nprocs=nprocs)
+
+
+@cli.command("verify")
+@click.argument("refs", nargs=-1, type=click.Path(dir_okay=False))
+@click.option(
+    "-n",
+    "--nthreads",
+    type=int,
+    default=16,
+    show_default=True,
+    help="Number of parallel reads.",
+)
+def verify(refs, nthreads):
+    """Check that reference filesystems (JSON) point to valid GRIB messages.
+
+    Only the indicator and the end marker of each message are read. Broken
+    references are printed and the exit status is 1 if there are any.
+    """
+    from .verify import verify_refs
+
+    nproblems = 0
+    for path in refs:
+        nmessages, problems = verify_refs(path, nthreads=nthreads)
+        for key, filename, offset, length, problem in problems:
+            click.echo(f"{path}: {key} -> {filename} [{offset}, {length}]: {problem}")
+        click.echo(
+            f"{path}: {len(problems)} of {nmessages} references broken", err=True
+        )
+        nproblems += len(problems)
+    if nproblems:
+        raise SystemExit(1)
+
+
 if __name__ == "__main__":
     cli()
@@ -0,0 +1,132 @@
+"""Verification of the references to GRIB messages without decoding them.
+
+After moving or re-syncing GRIB files, the references of a dataset may no
+longer point to the messages they were created for. Instead of reading and
+decoding all messages, only the indicator (the first 16 bytes) and the end
+marker (the last 4 bytes) of each message are read and checked against the
+reference. The probes of neighbouring messages are coalesced into a single
+read and all reads are issued in parallel.
+"""
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import fsspec
+
+from .refs import coalesce_ranges, grib_arrays, load_refs
+
+import logging
+
+logger = logging.getLogger("gribscan")
+
+BATCHSIZE = 1024  # coalesced reads per task
+
+
+def check_message(head, tail, length):
+    """Check the indicator and end marker of a message of `length` bytes.
+
+    Returns a description of the problem or `None`.
+    """
+    if len(head) < 16 or len(tail) < 4:
+        return "message extends beyond the end of the file"
+    if head[:4] != b"GRIB":
+        return "no GRIB indicator at offset"
+    edition = head[7]
+    if edition == 1:
+        size = int.from_bytes(head[4:7], "big")
+        if size & 0x800000:
+            # large GRIB1 messages only store an upper bound of their length
+            if length > (size & 0x7FFFFF) * 120:
+                return f"length exceeds GRIB1 message size of {size}"
+        elif size != length:
+            return f"length differs from GRIB1 message size of {size}"
+    elif edition == 2:
+        size = int.from_bytes(head[8:16], "big")
+        if size != length:
+            return f"length differs from GRIB2 message size of {size}"
+    else:
+        return f"unknown GRIB edition {edition}"
+    if tail != b"7777":
+        return "no end marker at end of message"
+    return None
+
+
+def message_refs(refs):
+    """Yield `(key, filename, offset, length)` of all references to GRIB messages."""
+    arrays = grib_arrays(refs)
+    for key, value in refs.items():
+        name, _, _ = key.rpartition("/")
+        if name in arrays and isinstance(value, list) and len(value) == 3:
+            yield (key, *value)
+
+
+def _probe_ranges(messages):
+    """Ranges of the indicator and end marker of each message."""
+    ranges = []
+    for _, _, offset, length in messages:
+        ranges.append((offset, min(16, length)))
+        ranges.append((offset + max(length - 4, 0), min(4, length)))
+    return ranges
+
+
+def _read_batch(fs, path, batch):
+    starts = [start for start, size, _ in batch]
+    ends = [start + size for start, size, _ in batch]
+    return fs.cat_ranges([path] * len(batch), starts, ends, on_error="return")
+
+
+def verify_refs(refs, max_gap=4096, nthreads=16, storage_options=None):
+    """Check that the references point to GRIB messages of the referenced length.
+
+    `refs` is a reference filesystem (a dict or the path of a JSON file).
+    Probes of messages which are at most `max_gap` bytes apart are read at
+    once. Returns the number of checked messages and a list of
+    `(key, filename, offset, length, problem)` for all broken references.
+    """
+    refs = load_refs(refs)
+    by_file = defaultdict(list)
+    for ref in message_refs(refs):
+        by_file[ref[1]].append(ref)
+
+    probes = {}
+    with ThreadPoolExecutor(nthreads) as pool:
+        tasks = []
+        for filename, messages in by_file.items():
+            fs, path = fsspec.core.url_to_fs(filename, **(storage_options or {}))
+            ranges = _probe_ranges(messages)
+            merged = coalesce_ranges(ranges, max_gap=max_gap)
+            for i in range(0, len(merged), BATCHSIZE):
+                batch = merged[i : i + BATCHSIZE]
+                future = pool.submit(_read_batch, fs, path, batch)
+                tasks.append((filename, ranges, batch, future))
+            probes[filename] = [None] * len(ranges)
+
+        for filename, ranges, batch, future in tasks:
+            try:
+                results = future.result()
+            except Exception as e:
+                results = [e] * len(batch)
+            for (start, size, members), result in zip(batch, results):
+                for member in members:
+                    if isinstance(result, Exception):
+                        probes[filename][member] = result
+                    else:
+                        offset, length = ranges[member]
+                        probes[filename][member] = result[
+                            offset - start : offset - start + length
+                        ]
+
+    problems = []
+    for filename, messages in by_file.items():
+        for i, (key, _, offset, length) in enumerate(messages):
+            head, tail = probes[filename][2 * i : 2 * i + 2]
+            errors = [p for p in (head, tail) if isinstance(p, Exception)]
+            if errors:
+                problem = f"can't read file: {errors[0]}"
+            else:
+                problem = check_message(head, tail, length)
+            if problem is not None:
+                problems.append((key, filename, offset, length, problem))
+
+    nmessages = sum(map(len, by_file.values()))
+    logger.info(f"checked {nmessages} messages in {len(by_file)} files")
+    return nmessages, problems
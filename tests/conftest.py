@@ -0,0 +1,65 @@
+import eccodes
+import numpy as np
+import pytest
+
+
+def grib_message(sample="GRIB2", values=None, **keys):
+    """Create a GRIB message from an eccodes sample, setting `keys` in order."""
+    h = eccodes.codes_grib_new_from_samples(sample)
+    try:
+        for key, value in keys.items():
+            eccodes.codes_set(h, key, value)
+        if values is not None:
+            eccodes.codes_set_values(h, values)
+        return eccodes.codes_get_message(h)
+    finally:
+        eccodes.codes_release(h)
+
+
+def isobaric_message(shortName="t", level=850, date=20200101, step=0, **keys):
+    npoints = 16 * 31  # size of the GRIB2 sample grid
+    values = np.linspace(0, 1, npoints) + level / 1000 + step
+    return grib_message(
+        discipline=0,
+        shortName=shortName,
+        typeOfLevel="isobaricInhPa",
+        level=level,
+        dataDate=date,
+        dataTime=0,
+        stepUnits="h",
+        forecastTime=step,
+        values=values,
+        **keys,
+    )
+
+
+def dataset_messages(steps=(0, 6, 12), levels=(850, 500), params=("t", "u")):
+    return [
+        isobaric_message(param, level, step=step)
+        for step in steps
+        for param in params
+        for level in levels
+    ]
+
+
+@pytest.fixture
+def gribfile(tmp_path):
+    path = tmp_path / "data.grib2"
+    path.write_bytes(b"".join(dataset_messages()))
+    return path
+
+
+def healpix_message(nside=4, ordering="nested", values=None, **keys):
+    if values is None:
+        values = np.arange(12 * nside**2, dtype="f8")
+    return grib_message(
+        gridDefinitionTemplateNumber=150,
+        Nside=nside,
+        orderingConvention=ordering,
+        discipline=0,
+        shortName="t",
+        typeOfLevel="isobaricInhPa",
+        level=850,
+        values=values,
+        **keys,
+    )
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+import gribscan
+from gribscan.gribscan import get_state, grib_magic_append
+
+from conftest import dataset_messages
+
+
+def write_indexed(path, messages):
+    path.write_bytes(b"".join(messages))
+    indexfile = path.with_suffix(".index")
+    gribscan.write_index(str(path), indexfile)
+    return indexfile
+
+
+@pytest.fixture
+def indexfiles(tmp_path):
+    first = write_indexed(tmp_path / "a.grib2", dataset_messages(steps=[0]))
+    later = write_indexed(tmp_path / "b.grib2", dataset_messages(steps=[6, 12]))
+    return first, later
+
+
+def test_plain_build_drops_single_time_step(indexfiles):
+    first, _ = indexfiles
+    zattrs = json.loads(gribscan.grib_magic([first])["atm2d"]["t/.zattrs"])
+    assert "time" not in zattrs["_ARRAY_DIMENSIONS"]
+
+
+@pytest.mark.parametrize("append_first", [True, False])
+def test_append_single_time_step(indexfiles, append_first):
+    first, later = indexfiles
+    if append_first:
+        refs = grib_magic_append([first], {})
+        assert json.loads(refs["atm2d"]["t/.zarray"])["shape"][0] == 1
+    else:
+        # appending to a plain build requires a rebuild
+        refs = gribscan.grib_magic([first])
+
+    appended = grib_magic_append([first, later], refs)
+    expected = gribscan.grib_magic([first, later])
+    assert appended.keys() == expected.keys()
+    for dataset, refs in expected.items():
+        assert appended[dataset] == refs
+
+
+def test_append_resumes_after_complete_records(indexfiles):
+    first, later = indexfiles
+    lines = later.read_bytes().splitlines(keepends=True)
+    # the last record is still being written
+    later.write_bytes(b"".join(lines[:-1]) + lines[-1][:20])
+    refs = gribscan.grib_magic([first, later])
+    position = get_state(refs["atm2d"])["indexfiles"][str(later)]
+    assert position == len(b"".join(lines[:-1]))
+
+    later.write_bytes(b"".join(lines))
+    appended = grib_magic_append([first, later], refs)
+    assert appended == gribscan.grib_magic([first, later])
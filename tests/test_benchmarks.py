@@ -0,0 +1,29 @@
+import json
+import pathlib
+import sys
+
+import pytest
+
+import gribscan
+
+sys.path.insert(0, str(pathlib.Path(__file__).parents[1] / "benchmarks"))
+corpus = pytest.importorskip("corpus")
+
+
+@pytest.mark.parametrize("grid", corpus.GRIDS)
+def test_corpus_is_indexed_completely(tmp_path, grid):
+    gribfile = tmp_path / f"{grid}.grib"
+    count = corpus.write_corpus(gribfile, grid)
+    gribscan.write_index(str(gribfile), tmp_path / "corpus.index")
+    with open(tmp_path / "corpus.index") as f:
+        records = [json.loads(line) for line in f]
+    assert len(records) == count
+
+    # the fast scanner creates the same records as eccodes
+    gribscan.write_index(str(gribfile), tmp_path / "eccodes.index", fast=False)
+    with open(tmp_path / "eccodes.index") as f:
+        assert [json.loads(line) for line in f] == records
+
+    # corpora are reproducible
+    corpus.write_corpus(tmp_path / "again.grib", grid)
+    assert (tmp_path / "again.grib").read_bytes() == gribfile.read_bytes()
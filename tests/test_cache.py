@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+import pytest
+
+import gribscan
+
+from conftest import dataset_messages
+
+pytest.importorskip("zarr", minversion="3")
+xr = pytest.importorskip("xarray")
+
+from gribscan.cache import CachingStore, ChunkCache  # noqa: E402
+
+
+def build(tmp_path, messages):
+    gribfile = tmp_path / "data.grib2"
+    gribfile.write_bytes(b"".join(messages))
+    gribscan.write_index(str(gribfile), tmp_path / "data.index", force=True)
+    return gribfile, gribscan.grib_magic([tmp_path / "data.index"])["atm2d"]
+
+
+def open_references(refs):
+    return xr.open_zarr(
+        "reference://", storage_options={"fo": refs}, consolidated=False
+    ).load()
+
+
+def test_cached_values_match_references(tmp_path):
+    _, refs = build(tmp_path, dataset_messages())
+    cache = ChunkCache(cache_dir=tmp_path / "cache")
+    expected = open_references(refs)
+    for _ in range(2):  # decoded, then read from the cache
+        ds = xr.open_zarr(CachingStore(refs, cache), consolidated=False).load()
+        xr.testing.assert_equal(ds, expected)
+
+    # a new cache with the same directory reads from disk
+    ds = xr.open_zarr(
+        CachingStore(refs, ChunkCache(cache_dir=tmp_path / "cache")),
+        consolidated=False,
+    )
+    xr.testing.assert_equal(ds.load(), expected)
+
+
+@pytest.mark.parametrize("ttl, reread", [(0, True), (3600, False)])
+def test_modified_files_are_read_again(tmp_path, ttl, reread):
+    gribfile, refs = build(tmp_path, dataset_messages())
+    store = CachingStore(refs, ChunkCache(), fingerprint_ttl=ttl)
+    before = xr.open_zarr(store, consolidated=False).t.load()
+
+    # messages of the same size with other values
+    stat = os.stat(gribfile)
+    gribfile.write_bytes(b"".join(dataset_messages(steps=(1, 7, 13))))
+    assert os.path.getsize(gribfile) == stat.st_size
+    os.utime(gribfile, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    after = xr.open_zarr(store, consolidated=False).t.load()
+    assert np.array_equal(before.values, after.values) != reread
+
+
+def test_overwriting_keeps_disk_size(tmp_path):
+    rng = np.random.default_rng(0)
+    chunks = [rng.bytes(1000) for _ in range(2)]  # incompressible
+    cache = ChunkCache(maxsize=0, cache_dir=tmp_path / "cache", disk_budget=4000)
+    cache.put("a", chunks[0])
+    cache.put("b", chunks[1])
+    for _ in range(3):
+        cache.put("a", chunks[0])
+
+    sizes = [path.stat().st_size for path in (tmp_path / "cache").iterdir()]
+    assert len(sizes) == 2
+    assert cache._disk_size == sum(sizes)
+    assert cache.get("b") == chunks[1]
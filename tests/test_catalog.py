@@ -0,0 +1,74 @@
+import pytest
+
+import gribscan
+from gribscan.catalog import Catalog
+from gribscan.gribscan import iter_index
+
+from conftest import dataset_messages, isobaric_message
+
+EXPRESSIONS = [
+    None,
+    "param=t",
+    "param=t,u level>=500",
+    "levtype=isobaricInhPa level<850",
+    "member=1",
+    "member!=1",
+    "member=1,2",
+    "member=null,2",
+    "member=null",
+    "member!=null",
+    "member>=1",
+    "param!=u member!=2",
+]
+
+
+@pytest.fixture
+def indexfile(tmp_path):
+    members = [
+        isobaric_message(
+            param,
+            500,
+            productDefinitionTemplateNumber=1,
+            perturbationNumber=member,
+            numberOfForecastsInEnsemble=10,
+        )
+        for member in (1, 2, 3)
+        for param in ("t", "u")
+    ]
+    gribfile = tmp_path / "data.grib2"
+    gribfile.write_bytes(b"".join(dataset_messages() + members))
+    indexfile = tmp_path / "data.index"
+    gribscan.write_index(str(gribfile), indexfile)
+    return indexfile
+
+
+@pytest.fixture
+def catalog(indexfile, tmp_path):
+    with Catalog(tmp_path / "catalog.sqlite") as catalog:
+        catalog.ingest(indexfile)
+        yield catalog
+
+
+@pytest.mark.parametrize("expr", EXPRESSIONS)
+def test_catalog_matches_index(indexfile, catalog, expr):
+    expected = list(iter_index(indexfile, expr))
+    assert list(catalog.query(expr)) == expected
+    assert catalog.count(expr) == len(expected)
+    assert list(iter_index(catalog.path, expr)) == expected
+
+
+def test_missing_values_match_not_equal(indexfile):
+    records = list(iter_index(indexfile, "member!=1"))
+    assert {r["member"] for r in records} == {None, 2, 3}
+
+
+def test_build_from_catalog(indexfile, catalog):
+    expr = "param=t level=500"
+    from_index = gribscan.grib_magic([indexfile], filter_expr=expr)
+    from_catalog = gribscan.grib_magic([catalog.path], filter_expr=expr)
+    assert from_index.keys() == from_catalog.keys()
+    for dataset, refs in from_index.items():
+        refs = {k: v for k, v in refs.items() if k != ".zmetadata"}
+        assert refs == {
+            k: v for k, v in from_catalog[dataset].items() if k != ".zmetadata"
+        }
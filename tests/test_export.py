@@ -0,0 +1,29 @@
+import pytest
+
+import gribscan
+
+pytest.importorskip("zarr", minversion="3")
+xr = pytest.importorskip("xarray")
+
+from gribscan.export import export_zarr  # noqa: E402
+from gribscan.refs import coalesce_ranges  # noqa: E402
+
+
+def test_coalesce_ranges():
+    ranges = [(0, 10), (10, 5), (100, 10), (15, 5)]
+    assert coalesce_ranges(ranges, max_gap=0) == [(0, 20, [0, 1, 3]), (100, 10, [2])]
+
+
+@pytest.mark.parametrize("chunks", [None, {"time": 2}, {"time": 3, "level": 2}])
+def test_export_matches_references(gribfile, tmp_path, chunks):
+    gribscan.write_index(str(gribfile), tmp_path / "data.index")
+    (refs,) = gribscan.grib_magic([tmp_path / "data.index"]).values()
+
+    export_zarr(refs, tmp_path / "data.zarr", chunks=chunks, nprocs=2)
+
+    expected = xr.open_zarr(
+        "reference://", storage_options={"fo": refs}, consolidated=False
+    )
+    ds = xr.open_zarr(tmp_path / "data.zarr")
+    xr.testing.assert_identical(ds.load(), expected.load())
+    assert ds.t.encoding["chunks"][0] == (chunks or {}).get("time", 1)
@@ -0,0 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import eccodes
+import pytest
+
+from gribscan.grib2 import Grib2Scanner
+from gribscan.gribscan import scan_message
+
+from conftest import dataset_messages, grib_message
+
+
+def pressure_message(pascal, step=0):
+    return grib_message(
+        discipline=0,
+        shortName="t",
+        typeOfFirstFixedSurface=100,
+        scaleFactorOfFirstFixedSurface=0,
+        scaledValueOfFirstFixedSurface=pascal,
+        forecastTime=step,
+    )
+
+
+def scan_all(messages):
+    scanner = Grib2Scanner()
+    offset = 0
+    records = []
+    for message in messages:
+        records.append(scanner.scan(message, offset, len(message)))
+        offset += len(message)
+    return scanner, records
+
+
+def expected_records(messages):
+    offset = 0
+    records = []
+    for message in messages:
+        records.append(scan_message(message, offset, len(message)))
+        offset += len(message)
+    return records
+
+
+@pytest.mark.parametrize("pascal", [50, 250, 85000])
+def test_isobaric_levels_match_eccodes(pascal):
+    # validated templates of whole hPa levels must not be reused for other levels
+    messages = [pressure_message(p) for p in (100000, 92500, 70000, pascal)]
+    _, records = scan_all(messages)
+    assert records == expected_records(messages)
+
+
+def test_similar_messages_are_parsed():
+    messages = dataset_messages(steps=range(0, 48, 6))
+    scanner, records = scan_all(messages)
+    assert records == expected_records(messages)
+    assert scanner.stats["parsed"] > scanner.stats["eccodes"]
+
+
+def with_seconds(message, second):
+    h = eccodes.codes_new_from_message(message)
+    try:
+        eccodes.codes_set(h, "second", second)
+        return eccodes.codes_get_message(h)
+    finally:
+        eccodes.codes_release(h)
+
+
+def test_reference_time_seconds_match_eccodes():
+    # validated with a message without seconds, reused for later messages
+    messages = [
+        with_seconds(message, 30 if i > 2 else 0)
+        for i, message in enumerate(dataset_messages(steps=range(0, 24, 6)))
+    ]
+    scanner, records = scan_all(messages)
+    assert records == expected_records(messages)
+    assert scanner.stats["parsed"] > 0
+
+
+def test_shared_scanner():
+    messages = dataset_messages(steps=range(0, 96, 6))
+    offsets = [sum(map(len, messages[:i])) for i in range(len(messages))]
+    scanner = Grib2Scanner()
+
+    def scan(i):
+        return scanner.scan(messages[i], offsets[i], len(messages[i]))
+
+    with ThreadPoolExecutor(8) as pool:
+        records = list(pool.map(scan, range(len(messages))))
+    assert records == expected_records(messages)
+    assert sum(scanner.stats.values()) == len(messages)
+    assert scanner.stats["parsed"] > 0
+    assert not scanner._validating
+    assert not scanner._validated & scanner._rejected
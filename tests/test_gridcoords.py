@@ -0,0 +1,45 @@
+import json
+
+import pytest
+import xarray as xr
+
+import gribscan
+
+from conftest import grib_message, healpix_message
+
+GRIDS = {
+    "healpix_nested": lambda step: healpix_message(4, forecastTime=step),
+    "healpix_ring": lambda step: healpix_message(4, "ring", forecastTime=step),
+    "reduced_gg": lambda step: grib_message(
+        "reduced_gg_pl_32_grib2", stepUnits="h", forecastTime=step
+    ),
+    "regular_ll": lambda step: grib_message(
+        "regular_ll_pl_grib2", stepUnits="h", forecastTime=step
+    ),
+}
+
+
+def open_references(refs):
+    return xr.open_zarr(
+        "reference://", storage_options={"fo": refs}, consolidated=False
+    )
+
+
+@pytest.mark.parametrize("grid", GRIDS)
+def test_lazy_coords_match_stored_coords(tmp_path, grid):
+    gribfile = tmp_path / "data.grib2"
+    gribfile.write_bytes(b"".join(GRIDS[grid](step) for step in (0, 6)))
+    gribscan.write_index(str(gribfile), tmp_path / "data.index")
+
+    (stored,) = gribscan.grib_magic([tmp_path / "data.index"]).values()
+    (lazy,) = gribscan.grib_magic([tmp_path / "data.index"], lazy_coords=True).values()
+
+    expected = open_references(stored)
+    ds = open_references(lazy)
+    xr.testing.assert_identical(ds.load(), expected.load())
+    for coord in ("lat", "lon"):
+        if coord in ds.dims:
+            continue  # regular grids have 1-dimensional coordinates
+        meta = json.loads(lazy[f"{coord}/.zarray"])
+        assert meta["compressor"]["id"] == "gribscan.gridcoords"
+        assert len(lazy[f"{coord}/0"]) < 100
@@ -0,0 +1,112 @@
+import gzip
+import random
+import zlib
+
+import pytest
+
+import gribscan
+from gribscan.gribscan import iter_index
+
+fsspec = pytest.importorskip("fsspec")
+
+from gribscan.gzseek import (  # noqa: E402
+    GzipSeekFileSystem,
+    GzipStream,
+    SeekTable,
+    seek_table_path,
+)
+
+
+# like the entry point of installed packages
+fsspec.register_implementation("gzseek", GzipSeekFileSystem, clobber=True)
+
+
+def compress(data, flush_every):
+    """Compress into a gzip member with a deflate block every `flush_every` bytes."""
+    compressor = zlib.compressobj(wbits=31)
+    parts = []
+    for start in range(0, len(data), flush_every):
+        parts.append(compressor.compress(data[start : start + flush_every]))
+        parts.append(compressor.flush(zlib.Z_SYNC_FLUSH))
+    parts.append(compressor.flush())
+    return b"".join(parts)
+
+
+@pytest.fixture
+def gzfile(gribfile, tmp_path):
+    # a multi-member file, like concatenated outputs of gzip
+    data = gribfile.read_bytes()
+    path = tmp_path / "data.grib2.gz"
+    path.write_bytes(compress(data[:7000], 500) + gzip.compress(data[7000:]))
+    return path
+
+
+def test_seek_table_round_trip(gzfile, gribfile):
+    with open(gzfile, "rb") as f:
+        stream = GzipStream(f, spacing=1000)
+        assert stream.read(10**6) == gribfile.read_bytes()
+        table = stream.seek_table()
+    assert len(table.points) > 2
+    assert table.size == gribfile.stat().st_size
+    assert table.compressed_size == gzfile.stat().st_size
+
+    copy = SeekTable.frombytes(table.tobytes())
+    assert copy.points == table.points
+    assert (copy.size, copy.compressed_size) == (table.size, table.compressed_size)
+
+
+def test_corrupted_file(gzfile):
+    data = bytearray(gzfile.read_bytes())
+    data[-6] ^= 0xFF  # size of the last member
+    gzfile.write_bytes(data)
+    with open(gzfile, "rb") as f:
+        with pytest.raises(zlib.error):
+            GzipStream(f).read(10**6)
+
+
+def test_random_access(gzfile, gribfile, tmp_path):
+    gribscan.write_index(str(gzfile), tmp_path / "data.index", seek_spacing=1000)
+    plain = gribfile.read_bytes()
+    fs = GzipSeekFileSystem(table_dir=str(tmp_path))
+    assert fs.size(str(gzfile)) == len(plain)
+
+    rng = random.Random(0)
+    starts = [rng.randrange(len(plain)) for _ in range(50)]
+    ends = [start + rng.randrange(5000) for start in starts]
+    paths = [str(gzfile)] * len(starts)
+    for start, end, data in zip(starts, ends, fs.cat_ranges(paths, starts, ends)):
+        assert data == plain[start:end]
+    assert fs.cat_file(str(gzfile), -100) == plain[-100:]
+    with fs.open(str(gzfile)) as f:
+        f.seek(12345)
+        assert f.read(100) == plain[12345:12445]
+
+
+def test_gzip_index_matches_plain_file(gzfile, gribfile, tmp_path):
+    gribscan.write_index(str(gzfile), tmp_path / "gz.index", seek_spacing=1000)
+    gribscan.write_index(str(gribfile), tmp_path / "plain.index")
+    assert (tmp_path / seek_table_path("data.grib2.gz")).exists()
+
+    records = list(iter_index(tmp_path / "gz.index"))
+    expected = list(iter_index(tmp_path / "plain.index"))
+    assert [r["filename"] for r in records] == [f"gzseek://{gzfile}"] * 12
+    for record in records + expected:
+        del record["filename"]
+    assert records == expected
+
+
+def test_gzip_dataset(gzfile, gribfile, tmp_path):
+    pytest.importorskip("zarr", minversion="3")
+    xr = pytest.importorskip("xarray")
+    gribscan.write_index(str(gzfile), tmp_path / "gz.index", seek_spacing=1000)
+    gribscan.write_index(str(gribfile), tmp_path / "plain.index")
+
+    def open_dataset(indexfile):
+        (refs,) = gribscan.grib_magic([indexfile]).values()
+        return xr.open_zarr(
+            "reference://", storage_options={"fo": refs}, consolidated=False
+        ).load()
+
+    xr.testing.assert_identical(
+        open_dataset(tmp_path / "gz.index"), open_dataset(tmp_path / "plain.index")
+    )
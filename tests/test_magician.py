@@ -0,0 +1,57 @@
+import gribscan
+from gribscan.gribscan import _dataset_refs, get_state, iter_index
+from gribscan.magician import Magician
+
+
+class CountingMagician(Magician):
+    def __init__(self):
+        self.calls = 0
+
+    def m2key(self, meta):
+        self.calls += 1
+        return super().m2key(meta)
+
+
+class BatchMagician(Magician):
+    """Keys all messages at once instead of calling `m2key` per message."""
+
+    def m2key(self, meta):
+        raise AssertionError("m2key shouldn't be called")
+
+    def m2keys(self, messages):
+        return [
+            (
+                self.m2dataset(meta),
+                (meta["param"], meta["levtype"]),
+                (meta["posix_time"], meta["level"]),
+            )
+            for meta in messages
+        ]
+
+
+class PerMessageMagician(Magician):
+    m2keys = property()  # magicians predating `m2keys`
+
+
+def test_keys_are_computed_once(gribfile, tmp_path):
+    indexfile = tmp_path / "data.index"
+    gribscan.write_index(str(gribfile), indexfile)
+    magician = CountingMagician()
+    gribscan.grib_magic([indexfile], magician)
+    assert magician.calls == 12
+
+
+def test_keys_match_per_message_refs(gribfile, tmp_path):
+    indexfile = tmp_path / "data.index"
+    gribscan.write_index(str(gribfile), indexfile)
+
+    # the per-message path of `inspect_grib_indices` and `build_refs`
+    messages = list(iter_index(indexfile))
+    expected = _dataset_refs(messages, Magician(), None)
+
+    for magician in (Magician(), BatchMagician(), PerMessageMagician()):
+        refs = gribscan.grib_magic([indexfile], magician)["atm2d"]
+        # the build state additionally records the index files
+        assert get_state(refs)["variables"] == get_state(expected)["variables"]
+        refs.pop(".zmetadata")
+        assert refs == {k: v for k, v in expected.items() if k != ".zmetadata"}
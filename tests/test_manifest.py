@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+import gribscan
+
+pytest.importorskip("zarr", minversion="3")
+xr = pytest.importorskip("xarray")
+
+from gribscan.manifest import ChunkManifest, ManifestStore  # noqa: E402
+
+
+@pytest.fixture
+def refs(gribfile, tmp_path):
+    gribscan.write_index(str(gribfile), tmp_path / "data.index")
+    (refs,) = gribscan.grib_magic([tmp_path / "data.index"]).values()
+    return refs
+
+
+def test_manifest_mapping(refs, tmp_path):
+    path = tmp_path / "refs.json"
+    path.write_text(json.dumps(refs))
+    manifest = ChunkManifest.from_refs(str(path))
+
+    assert dict(manifest) == refs
+    assert len(manifest) == len(refs)
+    assert "t/0.0.0.0" in manifest
+    assert "t/99.0.0.0" not in manifest
+    assert "t/0.0.0" not in manifest
+    with pytest.raises(KeyError):
+        manifest["t/-1.0.0.0"]
+
+
+def test_manifest_store_matches_references(refs):
+    expected = xr.open_zarr(
+        "reference://", storage_options={"fo": refs}, consolidated=False
+    )
+    ds = xr.open_zarr(ManifestStore(refs), consolidated=False)
+    xr.testing.assert_identical(ds.load(), expected.load())
+
+
+def test_manifest_store_is_hashable(refs):
+    manifest = ChunkManifest.from_refs(refs)
+    store = ManifestStore(manifest)
+    assert ManifestStore(manifest) == store
+    assert ManifestStore(refs) != store
+    assert {store: 1}[ManifestStore(manifest)] == 1
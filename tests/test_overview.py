@@ -0,0 +1,104 @@
+import subprocess
+import sys
+
+import eccodes
+import numpy as np
+import pytest
+
+import gribscan
+
+from conftest import dataset_messages, healpix_message
+
+pytest.importorskip("zarr", minversion="3")
+hp = pytest.importorskip("healpy")
+
+import zarr  # noqa: E402
+
+from gribscan.overview import coarsen, overview_nsides, write_overviews  # noqa: E402
+
+NSIDE = 8
+
+
+def test_overview_nsides():
+    assert overview_nsides(8) == [4, 2, 1]
+    assert overview_nsides(8, min_nside=2) == [4, 2]
+    with pytest.raises(ValueError):
+        overview_nsides(6)
+
+
+def test_coarsen_missing_values():
+    values = np.array([1.0, 2.0, np.nan, 3.0, 9.0, 9.0, 9.0, 9.0])
+    (level,) = coarsen(values, 1, fill_value=9.0)
+    np.testing.assert_array_equal(level, [2.0, np.nan])
+
+
+def decode(message):
+    mid = eccodes.codes_new_from_message(message)
+    try:
+        return eccodes.codes_get_values(mid)
+    finally:
+        eccodes.codes_release(mid)
+
+
+@pytest.mark.parametrize("ordering", ["nested", "ring"])
+def test_overviews_match_full_resolution(tmp_path, ordering):
+    rng = np.random.default_rng(0)
+    messages = [
+        healpix_message(
+            NSIDE,
+            ordering,
+            values=rng.normal(size=12 * NSIDE**2),
+            dataDate=20200101,
+            stepUnits="h",
+            forecastTime=step,
+        )
+        for step in (0, 6, 12)
+    ]
+    path = tmp_path / "data.grib2"
+    path.write_bytes(b"".join(messages))
+    gribscan.write_index(str(path), tmp_path / "data.index")
+    (refs,) = gribscan.grib_magic([tmp_path / "data.index"]).values()
+
+    write_overviews(refs, tmp_path / "overviews.zarr", chunks={"time": 2}, nprocs=2)
+
+    group = zarr.open_group(tmp_path / "overviews.zarr", mode="r")
+    for step, message in enumerate(messages):
+        # the baseline: decode with eccodes and average groups of nested pixels
+        values = decode(message)
+        if ordering == "ring":
+            values = values[hp.nest2ring(NSIDE, np.arange(values.size))]
+        for nside in (4, 2, 1):
+            values = values.reshape(-1, 4).mean(axis=-1)
+            t = group[f"nside{nside}/t"]
+            assert t.shape[-1] == 12 * nside**2
+            np.testing.assert_allclose(
+                t[step].reshape(-1), values, rtol=1e-5, atol=1e-5
+            )
+    assert group["nside1/lat"].shape == (12,)
+    assert group["nside4"].attrs["healpix_order"] == "nest"
+
+
+def test_dataset_without_healpix_grid(tmp_path):
+    path = tmp_path / "data.grib2"
+    path.write_bytes(b"".join(dataset_messages()))
+    gribscan.write_index(str(path), tmp_path / "data.index")
+    (refs,) = gribscan.grib_magic([tmp_path / "data.index"]).values()
+
+    with pytest.raises(ValueError, match="no variables on a HEALPix grid"):
+        write_overviews(refs, tmp_path / "overviews.zarr")
+    assert not (tmp_path / "overviews.zarr").exists()
+
+
+def test_overview_command_without_healpy(tmp_path):
+    refs = tmp_path / "refs.json"
+    refs.write_text("{}")
+    script = f"""
+import sys
+sys.modules["healpy"] = None  # not installed
+from click.testing import CliRunner
+from gribscan.tools import cli
+result = CliRunner().invoke(cli, ["overview", {str(refs)!r}, "out.zarr"])
+assert result.exit_code == 1, result.output
+assert "gribscan[overview]" in result.output, result.output
+"""
+    subprocess.run([sys.executable, "-c", script], check=True, cwd=tmp_path)
@@ -0,0 +1,101 @@
+import functools
+import io
+import threading
+
+import pytest
+
+import gribscan.gribscan
+
+from gribscan.gribscan import pipelined, scan_gribfile, scan_gribstream
+
+
+def count(item):
+    return 1
+
+
+def test_pipelined_keeps_order():
+    items = [(i,) for i in range(100)]
+    results = pipelined(items, lambda i: i * i, count, nworkers=4)
+    assert list(results) == [i * i for i in range(100)]
+
+
+def test_pipelined_bounds_bytes_in_flight():
+    produced = []
+    release = threading.Event()
+
+    def items():
+        for i in range(100):
+            produced.append(i)
+            yield (b"x" * 1000,)
+
+    def func(data):
+        release.wait()
+        return len(data)
+
+    results = pipelined(items(), func, lambda item: len(item[0]), max_bytes=10_000)
+    consumer = threading.Thread(target=next, args=(results,))
+    consumer.start()
+    try:
+        consumer.join(timeout=0.5)
+        # 10 items fit into the budget, the reader may hold one more
+        assert len(produced) <= 11
+    finally:
+        release.set()
+        consumer.join()
+    assert list(results) == [1000] * 99
+
+
+def test_pipelined_propagates_errors():
+    def items():
+        yield (1,)
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError, match="boom"):
+        list(pipelined(items(), lambda i: i, count))
+
+
+def test_pipelined_closes_items_on_error():
+    closed = []
+
+    def items():
+        try:
+            for i in range(100):
+                yield (i,)
+        finally:
+            closed.append(threading.current_thread())
+
+    def func(i):
+        if i == 3:
+            raise ValueError(i)
+        return i
+
+    with pytest.raises(ValueError):
+        try:
+            # the reader is blocked by the budget when the consumer stops
+            list(pipelined(items(), func, count, nworkers=2, max_bytes=2))
+        finally:
+            # the traceback still refers to the pipeline and its items
+            assert closed and closed[0] is not threading.current_thread()
+
+
+def test_stop_threaded_tee_scan(gribfile, tmp_path, monkeypatch):
+    # read ahead at most one message
+    small = functools.partial(pipelined, max_bytes=1)
+    monkeypatch.setattr(gribscan.gribscan, "pipelined", small)
+    data = gribfile.read_bytes()
+    tee_path = tmp_path / "copy.grib2"
+    with pytest.raises(RuntimeError):
+        with open(tee_path, "wb") as tee:
+            for record in scan_gribstream(io.BytesIO(data), tee=tee, threads=2):
+                raise RuntimeError("stop after the first record")
+    assert tee.closed
+    assert tee_path.read_bytes() == data
+
+
+@pytest.mark.parametrize("fast", [True, False])
+def test_threaded_scan_matches_sequential(gribfile, fast):
+    with open(gribfile, "rb") as f:
+        expected = list(scan_gribfile(f, fast=fast, filename="data.grib2"))
+    with open(gribfile, "rb") as f:
+        records = list(scan_gribfile(f, fast=fast, threads=2, filename="data.grib2"))
+    assert records == expected
@@ -0,0 +1,50 @@
+import json
+import pickle
+
+from click.testing import CliRunner
+
+import gribscan
+from gribscan.profiling import Profile, run_profiled, span
+from gribscan.tools import cli
+
+
+def test_profile_records_stages(gribfile, tmp_path):
+    with Profile(trace=True) as profile:
+        gribscan.write_index(str(gribfile), tmp_path / "data.index")
+    assert profile.stats["parse"]["calls"] == 12
+    assert profile.stats["read"]["counters"]["bytes"] == gribfile.stat().st_size
+    assert profile.stats["json_encode"]["calls"] == 12
+    assert len(profile.events) == sum(s["calls"] for s in profile.stats.values())
+
+    profile.write_chrome_trace(tmp_path / "trace.json")
+    with open(tmp_path / "trace.json") as f:
+        assert len(json.load(f)["traceEvents"]) == len(profile.events)
+
+    # spans are only recorded while the profile is active
+    with span("parse"):
+        pass
+    assert profile.stats["parse"]["calls"] == 12
+
+
+def test_worker_profiles_are_merged(gribfile, tmp_path):
+    def stage(n):
+        for _ in range(n):
+            with span("stage", items=1):
+                pass
+
+    with Profile() as profile:
+        for n in (2, 3):
+            worker = pickle.loads(pickle.dumps(run_profiled(stage, n)))
+            profile.merge(worker)
+    assert profile.stats["stage"]["calls"] == 5
+    assert profile.stats["stage"]["counters"] == {"items": 5}
+
+
+def test_profile_option(gribfile, tmp_path):
+    trace = tmp_path / "trace.json"
+    result = CliRunner().invoke(
+        cli, ["--profile", "--trace", str(trace), "index", str(gribfile), "-n", "2"]
+    )
+    assert result.exit_code == 0, result.output
+    assert "parse" in result.output
+    assert trace.exists()
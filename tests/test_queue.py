@@ -0,0 +1,52 @@
+import os
+import threading
+import time
+
+import pytest
+
+import gribscan
+from gribscan.queue import WorkQueue, run_worker
+
+
+@pytest.fixture
+def expected(gribfile, tmp_path):
+    indexfile = tmp_path / "expected.index"
+    gribscan.write_index(str(gribfile), indexfile)
+    return indexfile.read_text()
+
+
+@pytest.mark.parametrize("chunksize", [None, 1000, 1667, 4000, 10**6])
+def test_worker_matches_write_index(gribfile, tmp_path, expected, chunksize):
+    outdir = tmp_path / "out"
+    outdir.mkdir()
+    run_worker(tmp_path / "queue", [str(gribfile)], chunksize, outdir)
+    assert (outdir / "data.index").read_text() == expected
+
+
+def test_concurrent_workers(gribfile, tmp_path, expected):
+    outdir = tmp_path / "out"
+    outdir.mkdir()
+    queue = tmp_path / "queue"
+    WorkQueue.create(queue, [str(gribfile)], chunksize=500, outdir=outdir)
+    workers = [threading.Thread(target=run_worker, args=(queue,)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert (outdir / "data.index").read_text() == expected
+
+
+def test_stale_claims_are_recovered(gribfile, tmp_path, expected):
+    outdir = tmp_path / "out"
+    outdir.mkdir()
+    queue = WorkQueue.create(
+        tmp_path / "queue", [str(gribfile)], chunksize=4000, outdir=outdir, timeout=1
+    )
+    # a crashed worker leaves its claim behind
+    name, _ = queue.claim()
+    stale = time.time() - 10
+    os.utime(queue.directory / "claimed" / name, (stale, stale))
+
+    run_worker(queue.directory, timeout=1)
+    assert queue.is_merged()
+    assert (outdir / "data.index").read_text() == expected
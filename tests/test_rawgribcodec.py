@@ -0,0 +1,63 @@
+import tracemalloc
+
+import eccodes
+import numpy as np
+import pytest
+
+from gribscan import rawgribcodec
+from gribscan.rawgribcodec import RawGribCodec
+
+from conftest import grib_message
+
+NI, NJ = 1000, 500
+
+
+@pytest.fixture(scope="module")
+def large_message():
+    values = np.linspace(200, 300, NI * NJ)
+    return grib_message(Ni=NI, Nj=NJ, bitsPerValue=16, values=values)
+
+
+def eccodes_values(message):
+    mid = eccodes.codes_new_from_message(message)
+    try:
+        return eccodes.codes_get_array(mid, "values")
+    finally:
+        eccodes.codes_release(mid)
+
+
+def test_decode_matches_eccodes(large_message):
+    expected = eccodes_values(large_message)
+    np.testing.assert_array_equal(RawGribCodec().decode(large_message), expected)
+    # buffers other than bytes, e.g. numpy arrays as read by zarr
+    buf = np.frombuffer(large_message, dtype="u1").copy()
+    np.testing.assert_array_equal(RawGribCodec().decode(buf), expected)
+
+
+@pytest.mark.parametrize("dtype", ["f8", "f4"])
+def test_decode_into_out(large_message, dtype):
+    expected = eccodes_values(large_message).astype(dtype)
+    out = np.empty((NJ, NI), dtype=dtype)
+    codec = RawGribCodec()
+    codec.decode(large_message, out=out)  # warm up eccodes
+
+    tracemalloc.start()
+    try:
+        result = codec.decode(large_message, out=out)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert result is out
+    np.testing.assert_array_equal(out.ravel(), expected)
+    assert peak < out.nbytes / 20
+
+
+def test_decode_without_float_api(large_message, monkeypatch):
+    monkeypatch.setitem(
+        rawgribcodec._GET_ARRAY, np.dtype("f4"), ("grib_get_no_such_array", "float *")
+    )
+    expected = eccodes_values(large_message).astype("f4")
+    out = np.empty(NI * NJ, dtype="f4")
+    RawGribCodec().decode(large_message, out=out)
+    np.testing.assert_array_equal(out, expected)
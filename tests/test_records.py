@@ -0,0 +1,41 @@
+import json
+import pickle
+
+from gribscan.gribscan import scan_message
+from gribscan.records import Interner, MessageRecord
+
+from conftest import dataset_messages
+
+
+def index_records():
+    records = []
+    for message in dataset_messages():
+        record = scan_message(message, 0, len(message), filename="data.grib2")
+        records.append(json.loads(json.dumps(record)))
+    return records
+
+
+def test_records_equal_parsed_json():
+    interner = Interner()
+    for meta in index_records():
+        record = MessageRecord(meta, interner)
+        assert dict(record) == meta
+        assert json.loads(json.dumps(dict(record))) == meta
+        assert pickle.loads(pickle.dumps(record)) == record
+
+
+def test_equal_values_are_shared():
+    interner = Interner()
+    a, b = (MessageRecord(meta, interner) for meta in index_records()[:2])
+    assert a["globals"] is b["globals"]
+    assert a["extra"] is b["extra"]
+    assert a["attrs"]["typeOfLevel"] is b["attrs"]["typeOfLevel"]
+
+
+def test_values_differing_in_json_are_not_shared():
+    interner = Interner()
+    values = [[1], [1.0], [True], {"a": 1}, {"a": 1.0}, {"a": [1]}, {"a": [1.0]}]
+    interned = [interner(json.loads(json.dumps(v))) for v in values]
+    for value, result in zip(values, interned):
+        assert json.dumps(result) == json.dumps(value)
+    assert interner({"a": [1.0]}) is interned[-1]
@@ -0,0 +1,91 @@
+import functools
+import http.server
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import gribscan
+
+from conftest import dataset_messages
+
+
+class RangeRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """Serve files with support for single byte range requests."""
+
+    def log_message(self, *args):
+        pass
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            return super().send_head()
+        size = os.path.getsize(path)
+        f = open(path, "rb")
+        if match := re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", "")):
+            start = int(match[1])
+            end = min(int(match[2] or size - 1), size - 1)
+            f.seek(start)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            self._length = end - start + 1
+        else:
+            self.send_response(200)
+            self._length = size
+        self.send_header("Content-Length", str(self._length))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        return f
+
+    def copyfile(self, source, outputfile):
+        outputfile.write(source.read(self._length))
+
+
+@pytest.fixture
+def http_server(tmp_path):
+    handler = functools.partial(RangeRequestHandler, directory=str(tmp_path))
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    thread.join()
+
+
+def read_records(indexfile):
+    with open(indexfile) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_remote_index_matches_local(http_server, tmp_path):
+    pytest.importorskip("aiohttp")
+    # junk between messages has to be skipped by the range requests as well
+    gribfile = tmp_path / "data.grib2"
+    gribfile.write_bytes(b"junk" + (b"\0" * 100).join(dataset_messages()))
+
+    gribscan.write_index(str(gribfile), tmp_path / "local.index")
+    url = f"{http_server}/{gribfile.name}"
+    gribscan.write_index(url, tmp_path / "remote.index", max_concurrency=4)
+
+    local = read_records(tmp_path / "local.index")
+    remote = read_records(tmp_path / "remote.index")
+    assert len(remote) == len(local) > 0
+    for a, b in zip(local, remote):
+        assert b.pop("filename") == url
+        a.pop("filename")
+        assert a == b
+
+
+def test_local_index_without_fsspec(gribfile, tmp_path):
+    script = f"""
+import sys
+sys.modules["fsspec"] = None  # not installed
+import gribscan
+gribscan.write_index({str(gribfile)!r}, {str(tmp_path / "data.index")!r})
+"""
+    subprocess.run([sys.executable, "-c", script], check=True)
+    assert len(read_records(tmp_path / "data.index")) == 12
@@ -0,0 +1,63 @@
+import eccodes
+import numpy as np
+import pytest
+
+from gribscan.gribscan import message_stats
+
+from conftest import grib_message
+
+NPOINTS = 16 * 31
+
+
+def eccodes_bounds(message):
+    mid = eccodes.codes_new_from_message(message)
+    try:
+        packing = eccodes.codes_get(mid, "packingType")
+        bitmap = bool(eccodes.codes_get(mid, "bitmapPresent"))
+        if packing not in ("grid_simple", "grid_jpeg", "grid_png", "grid_ccsds"):
+            return None, None, bitmap
+        reference = eccodes.codes_get(mid, "referenceValue")
+        binary_scale = eccodes.codes_get(mid, "binaryScaleFactor")
+        decimal_scale = 10.0 ** -eccodes.codes_get(mid, "decimalScaleFactor")
+        nbits = eccodes.codes_get(mid, "bitsPerValue")
+        maximum = reference + (2**nbits - 1) * 2.0**binary_scale
+        return reference * decimal_scale, maximum * decimal_scale, bitmap
+    finally:
+        eccodes.codes_release(mid)
+
+
+def values(scale=1.0, offset=0.0):
+    return offset + scale * np.sin(np.linspace(0, 10, NPOINTS))
+
+
+MESSAGES = {
+    "simple": dict(values=values(300, 1000)),
+    "negative": dict(values=values(1e-4, -5e-3)),
+    "decimal": dict(decimalScaleFactor=2, values=values(3, -50)),
+    "negative decimal": dict(decimalScaleFactor=-2, values=values(3e4, 1e5)),
+    "constant": dict(values=np.full(NPOINTS, 273.15)),
+    "bitmap": dict(
+        bitmapPresent=1,
+        missingValue=9999,
+        values=np.where(np.arange(NPOINTS) % 7, values(10), 9999),
+    ),
+    "grib1": dict(sample="GRIB1", values=values(10, 280)),
+}
+for packing in ["grid_ccsds", "grid_jpeg", "grid_png", "grid_complex"]:
+    MESSAGES[packing] = {"packingType": packing, **MESSAGES["simple"]}
+
+
+@pytest.mark.parametrize("keys", MESSAGES.values(), ids=MESSAGES.keys())
+def test_bounds_match_eccodes(keys):
+    try:
+        message = grib_message(**keys)
+    except eccodes.GribInternalError:
+        pytest.skip("packing not supported by this eccodes build")
+    stats = message_stats(message)
+    assert (stats["min"], stats["max"], stats["bitmap"]) == eccodes_bounds(message)
+    assert stats["mean"] is None
+
+    exact = message_stats(message, exact=True)
+    if stats["min"] is not None:
+        assert stats["min"] <= exact["min"] <= exact["mean"] <= exact["max"]
+        assert exact["max"] <= stats["max"]
@@ -0,0 +1,85 @@
+import pytest
+
+import gribscan
+
+from conftest import dataset_messages
+
+pytest.importorskip("zarr", minversion="3")
+xr = pytest.importorskip("xarray")
+
+import zarr  # noqa: E402
+
+from gribscan.store import FileHandlePool, ReadAheadStore  # noqa: E402
+
+
+@pytest.fixture
+def refs(tmp_path):
+    # a dataset spread over several files
+    indexfiles = []
+    for step in (0, 6, 12):
+        path = tmp_path / f"data{step}.grib2"
+        path.write_bytes(b"".join(dataset_messages(steps=[step])))
+        indexfiles.append(tmp_path / f"data{step}.index")
+        gribscan.write_index(str(path), indexfiles[-1])
+    (refs,) = gribscan.grib_magic(indexfiles).values()
+    return refs
+
+
+@pytest.mark.parametrize("readahead", [0, 1, 4])
+def test_store_matches_references(refs, readahead):
+    expected = xr.open_zarr(
+        "reference://", storage_options={"fo": refs}, consolidated=False
+    )
+    store = ReadAheadStore(refs, max_workers=2, max_open_files=1, readahead=readahead)
+    try:
+        ds = xr.open_zarr(store, consolidated=False)
+        xr.testing.assert_identical(ds.load(), expected.load())
+        # time series are read message by message
+        for i in range(ds.sizes["time"]):
+            xr.testing.assert_identical(
+                ds.t.isel(time=i).load(), expected.t.isel(time=i).load()
+            )
+    finally:
+        store.close()
+
+
+def test_sequential_reads_are_read_ahead(refs):
+    store = ReadAheadStore(refs, readahead=4)
+    try:
+        t = zarr.open_array(store, path="t", mode="r")
+        expected = zarr.open_array(
+            zarr.storage.FsspecStore.from_url(
+                "reference://", storage_options={"fo": refs}, read_only=True
+            ),
+            path="t",
+            mode="r",
+        )
+        # a time series on a single level
+        assert (t[0, 0] == expected[0, 0]).all()
+        assert not store._prefetched
+        assert (t[1, 0] == expected[1, 0]).all()
+        assert list(store._prefetched) == ["t/2.0.0.0"]
+        assert (t[2, 0] == expected[2, 0]).all()
+        assert not store._prefetched
+    finally:
+        store.close()
+
+
+def test_file_handle_pool(tmp_path):
+    paths = []
+    for i in range(3):
+        paths.append(tmp_path / f"{i}.bin")
+        paths[-1].write_bytes(bytes(range(i, i + 10)))
+
+    pool = FileHandlePool(maxsize=2)
+    try:
+        fd = pool.acquire(paths[0])
+        for path in paths[1:]:
+            assert pool.pread(path, 2, 5) == path.read_bytes()[2:5]
+        # descriptors in use are kept open
+        assert len(pool._fds) == 2 and paths[0] in pool._fds
+        pool.release(paths[0])
+        assert pool.pread(paths[0], 8, 20) == paths[0].read_bytes()[8:]
+    finally:
+        pool.close()
+    assert fd not in pool._fds.values()
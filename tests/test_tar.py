@@ -0,0 +1,64 @@
+import io
+import tarfile
+
+import pytest
+
+import gribscan
+from gribscan.gribscan import iter_index
+
+from conftest import dataset_messages
+
+
+def add_member(tar, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tar.addfile(info, io.BytesIO(data))
+
+
+@pytest.fixture
+def archive(tmp_path):
+    path = tmp_path / "data.tar"
+    with tarfile.open(path, "w", format=tarfile.PAX_FORMAT) as tar:
+        add_member(tar, "a.grib2", b"".join(dataset_messages(steps=[0])))
+        add_member(tar, "README", b"not GRIB data")
+        add_member(tar, "b.grib2", b"".join(dataset_messages(steps=[6, 12])))
+    return path
+
+
+@pytest.mark.parametrize("threads", [0, 2])
+def test_tar_matches_plain_file(archive, gribfile, tmp_path, threads):
+    gribscan.write_index(str(archive), tmp_path / "tar.index", threads=threads)
+    gribscan.write_index(str(gribfile), tmp_path / "plain.index")
+    records = list(iter_index(tmp_path / "tar.index"))
+    expected = list(iter_index(tmp_path / "plain.index"))
+
+    data = archive.read_bytes()
+    plain = gribfile.read_bytes()
+    assert len(records) == len(expected) == 12
+    for record, other in zip(records, expected):
+        assert record["filename"] == str(archive)
+        # offsets point at the messages within the archive
+        start, size = record["_offset"], record["_length"]
+        assert data[start : start + size] == plain[
+            other["_offset"] : other["_offset"] + other["_length"]
+        ]
+        ignored = ("filename", "_offset")
+        assert {k: v for k, v in record.items() if k not in ignored} == {
+            k: v for k, v in other.items() if k not in ignored
+        }
+
+
+def test_tar_dataset(archive, gribfile, tmp_path):
+    xr = pytest.importorskip("xarray")
+    gribscan.write_index(str(archive), tmp_path / "tar.index")
+    gribscan.write_index(str(gribfile), tmp_path / "plain.index")
+
+    def open_dataset(indexfile):
+        (refs,) = gribscan.grib_magic([indexfile]).values()
+        return xr.open_zarr(
+            "reference://", storage_options={"fo": refs}, consolidated=False
+        ).load()
+
+    xr.testing.assert_identical(
+        open_dataset(tmp_path / "tar.index"), open_dataset(tmp_path / "plain.index")
+    )
@@ -0,0 +1,34 @@
+import json
+
+from click.testing import CliRunner
+
+import gribscan
+from gribscan.tools import cli
+
+
+def read_records(indexfile):
+    with open(indexfile) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_index_requires_existing_sources(tmp_path):
+    result = CliRunner().invoke(cli, ["index", str(tmp_path / "missing.grib2")])
+    assert result.exit_code == 2
+    assert "does not exist" in result.output
+
+
+def test_index_tee_from_stdin(gribfile, tmp_path):
+    copy = tmp_path / "copy.grib2"
+    result = CliRunner().invoke(
+        cli, ["index", "--tee", str(copy), "-"], input=gribfile.read_bytes()
+    )
+    assert result.exit_code == 0, result.output
+    assert copy.read_bytes() == gribfile.read_bytes()
+
+    gribscan.write_index(str(gribfile), tmp_path / "expected.index")
+    records = read_records(copy.with_suffix(".index"))
+    for record, expected in zip(records, read_records(tmp_path / "expected.index")):
+        assert record.pop("filename") == str(copy)
+        expected.pop("filename")
+        assert record == expected
+    assert len(records) == 12
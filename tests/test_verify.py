@@ -0,0 +1,71 @@
+import json
+import subprocess
+import sys
+
+import pytest
+from click.testing import CliRunner
+
+import gribscan
+from gribscan.tools import cli
+
+from gribscan.verify import verify_refs
+
+
+@pytest.fixture
+def refs(gribfile, tmp_path):
+    gribscan.write_index(str(gribfile), tmp_path / "data.index")
+    (refs,) = gribscan.grib_magic([tmp_path / "data.index"]).values()
+    return refs
+
+
+def test_verify_valid_refs(refs):
+    assert verify_refs(refs, max_gap=0) == (12, [])
+    assert verify_refs(refs) == (12, [])
+
+
+def test_verify_moved_messages(refs, gribfile):
+    data = gribfile.read_bytes()
+    gribfile.write_bytes(b"\0" + data)
+
+    nmessages, problems = verify_refs(refs)
+    assert nmessages == 12
+    assert len(problems) == 12
+    assert all(problem == "no GRIB indicator at offset" for *_, problem in problems)
+
+
+def test_verify_truncated_and_missing_files(refs, gribfile):
+    size = gribfile.stat().st_size
+    gribfile.write_bytes(gribfile.read_bytes()[: size - 10])
+    _, problems = verify_refs(refs)
+    ((key, _, offset, length, problem),) = problems
+    assert offset + length == size
+    assert problem == "message extends beyond the end of the file"
+
+    gribfile.unlink()
+    _, problems = verify_refs(refs)
+    assert len(problems) == 12
+    assert all(problem.startswith("can't read file") for *_, problem in problems)
+
+
+def test_verify_command(refs, gribfile, tmp_path):
+    path = tmp_path / "refs.json"
+    path.write_text(json.dumps(refs))
+    runner = CliRunner()
+    assert runner.invoke(cli, ["verify", str(path)]).exit_code == 0
+
+    gribfile.write_bytes(b"\0" + gribfile.read_bytes())
+    result = runner.invoke(cli, ["verify", str(path)])
+    assert result.exit_code == 1
+    assert "no GRIB indicator" in result.output
+
+
+def test_verify_without_zarr(refs, tmp_path):
+    path = tmp_path / "refs.json"
+    path.write_text(json.dumps(refs))
+    script = f"""
+import sys
+sys.modules["zarr"] = None  # not installed
+from gribscan.verify import verify_refs
+assert verify_refs({str(path)!r}) == (12, [])
+"""
+    subprocess.run([sys.executable, "-c", script], check=True)